@@ -25,7 +25,8 @@ from apps.util.cmd_utils import DefaultShell, HistorySavingDefaultShell
 from munge.util.iter_utils import flatten
 from munge.util.err_utils import warn, info, msg, err
 from munge.util.list_utils import list_preview
-from munge.proc.tgrep.tgrep import Tgrep, SmallSentenceThreshold, SmallSubtreeThreshold
+from munge.proc.tgrep.tgrep import Tgrep, SmallSentenceThreshold, SmallSubtreeThreshold, parse_query
+from munge.proc.tgrep.nodes import explain, estimated_cost
 import munge.proc.trace as T
 
 from munge.util.config import config
@@ -358,6 +359,18 @@ a pager program.'''
         self.redirecting_stdout(action, 'Tgrep', (args, ))
 
     do_tg = do_tgrep
+    
+    def do_explain(self, args):
+        '''Shows the order in which a tgrep query evaluates its constraints, and their estimated costs.'''
+        if not args.strip(): return
+        
+        query = parse_query(args)
+        # The parser has already reported a syntax error
+        if query is None: return
+        
+        msg("%s (cost %g)", query, estimated_cost(query))
+        for line in explain(query, indent=1):
+            msg("%s", line)
 
     def default(self, args):
         self.do_run(args)
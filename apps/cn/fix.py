@@ -8,12 +8,147 @@
 # notify the maintainer Daniel Tse <cncandc@gmail.com>.
 
 from munge.proc.filter import Filter
-from munge.proc.tgrep.tgrep import tgrep, multi_tgrep
+from munge.proc.tgrep.tgrep import tgrep, multi_tgrep, parse_query, compile_expression
+from munge.proc.tgrep.nodes import Context, compile_query, label_anchor, reads_only_subtree, reads_categories
+from munge.trees.index import TreeIndex
 from munge.util.dict_utils import smash_key_case
 from munge.util.err_utils import debug
+from munge.util.exceptions import TgrepException
 
 from apps.cn.output import OutputPrefacedPTBDerivation
 
+class PatternScan(object):
+    '''Records, for each of an ordered list of tgrep expressions, the nodes of a derivation at which the
+expression might match, so that an expression which cannot match need not be run at all. Every
+expression is tested against every node in a single walk over the derivation.
+
+An expression with a label anchor (see munge.proc.tgrep.nodes.label_anchor) is recorded by the nodes
+which match its anchor, and only those nodes are tested against the whole expression once its turn
+comes. Otherwise, an expression which only reads the subtree of the node it matches (see
+munge.proc.tgrep.nodes.reads_only_subtree) is recorded by the nodes it matches. An expression with
+neither is always run.
+
+Once the derivation has been changed, update() brings the records up to date for the expressions yet
+to run. Each node has a _signature_ of everything a query can read from the node itself, and a node
+whose signature is new or has changed is re-tested against the label anchors; that node and every node
+above it have a changed subtree, so they are re-tested against the other expressions which only read
+subtrees.
+
+So that categories are not rendered again on every walk, a node which is still the same object, with the
+same category object, keeps the category string it was given by the last walk. A callback which changes the
+category of a node must therefore assign it a new category rather than edit the old one in place, as the
+fixes whose expressions read categories do.'''
+    # expression -> (matcher, whether it only reads subtrees, label anchor matcher, whether it reads categories)
+    analyses = {}
+    
+    @classmethod
+    def analyse(C, expression):
+        analysis = C.analyses.get(expression, None)
+        if analysis is None:
+            query = parse_query(expression)
+            anchor = label_anchor(query)
+            
+            analysis = C.analyses[expression] = (compile_expression(expression), reads_only_subtree(query),
+                                                 anchor and compile_query(anchor), reads_categories(query))
+        return analysis
+        
+    def __init__(self, root, expressions):
+        self.matchers, self.subtree_only, self.anchors, with_categories = zip(*map(self.analyse, expressions))
+        self.with_categories = any(with_categories)
+        
+        # id(node) -> (node, signature, category) for each node of the derivation when last walked
+        self.signatures = {}
+        # for each expression, the ids of the nodes which it (or its label anchor) matched when last tested
+        self.matches = [ set() for _ in expressions ]
+        
+        self.context = Context()
+        self.update(root, xrange(len(expressions)))
+        
+    def category_string(self, node, index, old):
+        category = getattr(node, 'category', None)
+        # The node and its category object are as they were, so its category string is too
+        if old is not None and old[2] is category:
+            index.cat_strings[id(category)] = category, old[1][-1]
+            return old[1][-1]
+        return index.cat_string(category)
+        
+    def signature(self, node, index, old):
+        if node.is_leaf():
+            sig = (index.cat_string(node.cat), node.lex)
+        else:
+            sig = (index.cat_string(node.cat), getattr(node, 'head_index', None), tuple(id(kid) for kid in node))
+        if self.with_categories:
+            sig += (self.category_string(node, index, old),)
+        return sig
+        
+    def walk(self, node, index, path, signatures, relabelled, changed):
+        old = self.signatures.get(id(node), None)
+        sig = self.signature(node, index, old)
+        signatures[id(node)] = node, sig, getattr(node, 'category', None)
+        
+        if old is None or old[1] != sig:
+            relabelled.append(node)
+            changed.add(node)
+            changed.update(path)
+            
+        if not node.is_leaf():
+            path.append(node)
+            for kid in node:
+                self.walk(kid, index, path, signatures, relabelled, changed)
+            path.pop()
+            
+    def test(self, matcher, nodes, matches):
+        context = self.context
+        for node in nodes:
+            context.clear()
+            try:
+                if matcher(node, context): matches.add(id(node))
+            except TgrepException:
+                # Leaves it to tgrep to raise, if it still does once the expression is run
+                matches.add(None)
+            
+    def may_match(self, i):
+        '''Returns whether expression _i_ may match some node of the derivation as of the last update.'''
+        if self.anchors[i] is None:
+            return not self.subtree_only[i] or bool(self.matches[i])
+        if None in self.matches[i]: return True
+        
+        matcher, context = self.matchers[i], self.context
+        for node_id in self.matches[i]:
+            context.clear()
+            try:
+                if matcher(self.signatures[node_id][0], context): return True
+            except TgrepException:
+                return True
+        return False
+            
+    def update(self, root, indices):
+        '''Walks the derivation rooted at _root_, and re-tests the expressions numbered _indices_ wherever
+the derivation has changed since the last walk.'''
+        # The categories rendered for the signatures are shared with the queries through the index
+        index = TreeIndex(root)
+        signatures, relabelled, changed = {}, [], set()
+        self.walk(root, index, [], signatures, relabelled, changed)
+        
+        removed = set(self.signatures.iterkeys()).difference(signatures.iterkeys())
+        self.signatures = signatures
+        if not (changed or removed): return
+        
+        self.context = Context(index)
+        relabelled_ids = set(id(node) for node in relabelled)
+        changed_ids = set(id(node) for node in changed)
+        
+        for i in indices:
+            matches = self.matches[i]
+            matches -= removed
+            
+            if self.anchors[i] is not None:
+                matches -= relabelled_ids
+                self.test(self.anchors[i], relabelled, matches)
+            elif self.subtree_only[i]:
+                matches -= changed_ids
+                self.test(self.matchers[i], changed, matches)
+            
 class Fix(Filter, OutputPrefacedPTBDerivation):
     '''An abstract filter which matches against particular node configurations and dispatches to
 a specified fix function to operate on that node. In addition, the output() method of this filter
@@ -37,8 +172,15 @@ writes the modified derivations out in the prefaced PTB style.'''
         
     @staticmethod
     def do_tgrep_with_callback(root, pattern, callback, **kwargs):
-        new_root = None
+        return Fix.count_tgrep_with_callback(root, pattern, callback, **kwargs)[0]
+        
+    @staticmethod
+    def count_tgrep_with_callback(root, pattern, callback, **kwargs):
+        '''Runs _callback_ on each match of _pattern_ as do_tgrep_with_callback does, returning the root
+and the number of matches.'''
+        new_root, nmatches = None, 0
         for match_node, context in tgrep(root, pattern, with_context=True, **kwargs):
+            nmatches += 1
             debug("Callback %s matched", callback.__name__)
             if context: # only supply a context if the expression binds variables
                 # smash the case, variables in tgrep expressions are case insensitive
@@ -49,7 +191,25 @@ writes the modified derivations out in the prefaced PTB style.'''
             # a new root will be returned if one has been installed
             if result: new_root = result
         
-        return new_root or root
+        return new_root or root, nmatches
+    
+    @staticmethod
+    def do_ordered_tgrep_with_callbacks(root, patterns):
+        '''Runs each (pattern, callback, kwargs) triple in _patterns_ in turn as do_tgrep_with_callback
+would, but skips the patterns which a PatternScan shows cannot match.'''
+        if not patterns: return root
+        scan = PatternScan(root, [ pattern for pattern, _, _ in patterns ])
+        
+        for i, (pattern, callback, kwargs) in enumerate(patterns):
+            # The scan tests every node, whereas a nonrecursive tgrep only tests the root
+            if not (scan.may_match(i) or kwargs.get('nonrecursive', False)): continue
+            
+            root, nmatches = Fix.count_tgrep_with_callback(root, pattern, callback, **kwargs)
+            # Only a callback can change the derivation
+            if nmatches and i+1 < len(patterns):
+                scan.update(root, xrange(i+1, len(patterns)))
+            
+        return root
     
     @staticmethod
     def is_valid_pattern_and_callback_tuple(v):
@@ -66,6 +226,7 @@ writes the modified derivations out in the prefaced PTB style.'''
         # Ordered actions    
         # [ (pattern1, action1), ... ]
         elif isinstance(pattern, list):
+            patterns = []
             for pattern_and_callback in pattern:
                 if Fix.is_valid_pattern_and_callback_tuple(pattern_and_callback):
                     if len(pattern_and_callback) == 2:
@@ -74,7 +235,9 @@ writes the modified derivations out in the prefaced PTB style.'''
                     elif len(pattern_and_callback) == 3:
                         pattern, callback, kwargs = pattern_and_callback
                         
-                    bundle.derivation = Fix.do_tgrep_with_callback(bundle.derivation, pattern, callback, **kwargs)
+                    patterns.append( (pattern, callback, kwargs) )
+                    
+            bundle.derivation = Fix.do_ordered_tgrep_with_callbacks(bundle.derivation, patterns)
         
         # A string tgrep expression            
         # "pattern": fix
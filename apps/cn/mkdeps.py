@@ -13,6 +13,7 @@ from munge.util.config import config
 #config.set(show_vars=True, debug=True) # override show_vars. must come before cats.nodes import
 
 from itertools import chain
+from collections import defaultdict
 import traceback
 
 from munge.proc.filter import Filter
@@ -60,12 +61,16 @@ def make_set_head_from(l, r, p):
             unify(rr,pp,ignore=True)
             copy_vars(rr,pp)
             
-unanalysed = set()
 Sdcl = parse_category('S[dcl]')
 
 IndexSeparator = '`'
 IndexSeparatorTemplate = IndexSeparator + '%d'
-def mkdeps(root, postprocessor=identity):
+def mkdeps(root, postprocessor=identity, context=None):
+    '''Returns the set of dependencies in the derivation _root_, whose leaves have already been
+labelled by naive_label_derivation, applying _postprocessor_ to each lexical item. Fresh variables are
+named, and unanalysed combinators recorded, in the DerivationContext _context_.'''
+    if context is None: context = DerivationContext()
+    
     for i, leaf in enumerate(leaves(root)):
         # Uniquify each leaf with an index
         leaf.lex += IndexSeparatorTemplate % i
@@ -78,8 +83,6 @@ def mkdeps(root, postprocessor=identity):
     for (l, r, p) in pairs_postorder(root):
         _label_result(l, r, p)
             
-    global unanalysed
-    
     unaries = []
 
     for l, r, p in pairs_postorder(root):
@@ -113,7 +116,7 @@ def mkdeps(root, postprocessor=identity):
             else:
                 P.slot = R.slot # lexical head comes from R (Y/Z)
 
-            P.slot.var = fresh_var(prefix='K')
+            P.slot.var = context.fresh_var(prefix='K')
 
             unifier = unify(L.right, R.left)
             p.cat._left = L.left
@@ -126,7 +129,7 @@ def mkdeps(root, postprocessor=identity):
             else:
                 P.slot = L.slot # lexical head comes from L (Y\Z)
 
-            P.slot.var = fresh_var(prefix='K')
+            P.slot.var = context.fresh_var(prefix='K')
             
             unifier = unify(R.right, L.left)
             p.cat._left = R.left
@@ -139,7 +142,7 @@ def mkdeps(root, postprocessor=identity):
         # NP NP -> N/N
         elif comb == 'np_np_to_nfn_apposition':
             # do the same as NP NP -> NP, except fill in the vars Ny/Ny
-            P.right.slot.var = fresh_var(prefix='N')
+            P.right.slot.var = context.fresh_var(prefix='N')
             P.left.slot = P.right.slot
 
             register_unary(unaries, p, L.slot.head.lex)
@@ -157,14 +160,14 @@ def mkdeps(root, postprocessor=identity):
         
         elif comb == 'nongap_topicalisation': # {N, NP, S[dcl], QP}x -> [Sy/Sy]x
             P.slot = L.slot
-            P.right.slot.var = fresh_var()
+            P.right.slot.var = context.fresh_var()
             P.left.slot = P.right.slot
             
             register_unary(unaries, p, L.slot.head.lex)
             
         elif comb in ('np_gap_topicalisation', 's_gap_topicalisation', 'qp_gap_topicalisation'): # NPx -> [ Sy/(Sy/NPx)y ]y
             P.right.right.slot = L.slot
-            P.slot.var = fresh_var()
+            P.slot.var = context.fresh_var()
             P.left.slot = P.right.left.slot = P.right.slot = P.slot
             
         elif comb == 'subject_prodrop': # (S[dcl]y\NPx)y -> S[dcl]y | [(S[dcl]y\NPx)y/NPz]y -> (S[dcl]y/NPz)y
@@ -182,7 +185,7 @@ def mkdeps(root, postprocessor=identity):
             else:
                 P.slot = R.slot # lexical head comes from R (Y/Z)
                 
-            P.slot.var = fresh_var(prefix='K')
+            P.slot.var = context.fresh_var(prefix='K')
             
             unifier = unify(L.right, R.left)
             p.cat._left = L.left
@@ -195,7 +198,7 @@ def mkdeps(root, postprocessor=identity):
                 P.slot = L.slot # lexical head comes from L (Y\Z)
         
             # P.slot = L.slot
-            P.slot.var = fresh_var(prefix='K')
+            P.slot.var = context.fresh_var(prefix='K')
             
             unifier = unify(R.right, L.left)
             p.cat._left = R.left
@@ -212,8 +215,8 @@ def mkdeps(root, postprocessor=identity):
         elif comb in ('fwd_raise', 'bwd_raise'): # Xx -> [ Tf|(Tf|Xx)f ]f
             if P == parse_category(r'(S[dcl]\NP)\((S[dcl]\NP)/(S[dcl]\NP))'):
                 # (S[dcl]y\NPz)y -> [ (S[dcl]f\NPg)f/((S[dcl]f\NPg)f\(S[dcl]y\NPz)y)f ]f
-                P.left.slot.var = P.left.left.slot.var = P.right.slot.var = P.slot.var = fresh_var() # f 
-                P.left.right.slot.var = fresh_var() # g
+                P.left.slot.var = P.left.left.slot.var = P.right.slot.var = P.slot.var = context.fresh_var() # f 
+                P.left.right.slot.var = context.fresh_var() # g
                 
                 copy_vars(frm=P.left, to=P.right.left)
                 copy_vars(frm=L,      to=P.right.right)
@@ -221,32 +224,32 @@ def mkdeps(root, postprocessor=identity):
                 unifier = unify(L, P.right.right)
             elif P == parse_category(r'((S[dcl]\NP)/QP)\(((S[dcl]\NP)/QP)/NP)'):
                 # NPy -> [ ((S[dcl]v\NPw)v/QPz)v \ ( ((S[dcl]v\NPw)v/QPz)v/NPy )v ]v
-                P.slot.var = fresh_var()
+                P.slot.var = context.fresh_var()
                 P.left.slot = P.right.slot = \
                     P.left. left.slot = P.left. left.left.slot = \
                     P.right.left.slot = P.right.left.left.slot = \
                     P.right.left.left.left.slot = P.slot # v
-#                P.right.right.slot = fresh_var() # y
+#                P.right.right.slot = context.fresh_var() # y
                 P.right.right.slot = L.slot
-                P.left.right.slot.var = fresh_var('Z')
+                P.left.right.slot.var = context.fresh_var('Z')
                 P.right.left.right.slot = P.left.right.slot # z
-                P.left.left.right.slot.var = fresh_var('W')
+                P.left.left.right.slot.var = context.fresh_var('W')
                 P.right.left.left.right.slot = P.left.left.right.slot # w
                 
                 unifier = unify(L, P.right.right)
             elif P == parse_category(r'(S[dcl]\NP)\((S[dcl]\NP)/QP)'):
                 # QPy -> [ (S[dcl]v\NPz)v \ ((S[dcl]v\NPz)v/QPy)v ]v
-                P.slot.var = fresh_var()
+                P.slot.var = context.fresh_var()
                 P.left.slot = P.left.left.slot = \
                     P.right.slot = P.right.left.slot = P.right.left.left.slot = P.slot # v
-#                P.right.right.slot = fresh_var() # y
+#                P.right.right.slot = context.fresh_var() # y
                 P.right.right.slot = L.slot
-                P.left.right.slot.var = fresh_var('Z')
+                P.left.right.slot.var = context.fresh_var('Z')
                 P.right.left.right.slot = P.left.right.slot # z
                 
                 unifier = unify(L, P.right.right)
             else:
-                P.slot.var = fresh_var()
+                P.slot.var = context.fresh_var()
 
                 P.right.left.slot = P.left.slot = P.right.slot = P.slot
                 P.right.right.slot = L.slot
@@ -262,7 +265,7 @@ def mkdeps(root, postprocessor=identity):
             unifier = unify(P, L)
             
         elif comb in ('lcp_sfs_typechange', 'lcp_nfn_typechange'):
-            P.left.slot.var = fresh_var()
+            P.left.slot.var = context.fresh_var()
             P.right.slot = P.left.slot
             
             P.slot = L.slot
@@ -271,7 +274,7 @@ def mkdeps(root, postprocessor=identity):
             
         elif comb == 'lcp_sbnpfsbnp_typechange':
             # [(Sy\NPz)y/(Sy\NPz)y]_
-            P.left.slot.var = fresh_var()
+            P.left.slot.var = context.fresh_var()
             P.left.left.slot = P.right.left.slot = P.right.slot = P.left.slot
             
             register_unary(unaries, p, L.slot.head.lex)
@@ -280,15 +283,15 @@ def mkdeps(root, postprocessor=identity):
             P.slot = L.slot
             
             if P == _NfN:
-                P.left.slot.var = fresh_var()
+                P.left.slot.var = context.fresh_var()
                 
                 P.right.slot = P.left.slot
                 
                 register_unary(unaries, p, L.slot.head.lex)
                 
             elif P == _NfNfNfN:
-                P.left.slot.var = fresh_var()
-                P.left.left.slot.var = fresh_var(prefix="G")
+                P.left.slot.var = context.fresh_var()
+                P.left.left.slot.var = context.fresh_var(prefix="G")
                 
                 P.left.right.slot = P.left.left.slot
                 P.right.slot = P.left.slot
@@ -307,7 +310,7 @@ def mkdeps(root, postprocessor=identity):
         elif comb == 'measure_word_number_elision':
             P.slot = L.slot
             
-            P.left.slot.var = fresh_var()
+            P.left.slot.var = context.fresh_var()
             P.right.slot = P.left.slot
             
             register_unary(unaries, p, L.slot.head.lex)
@@ -324,7 +327,7 @@ def mkdeps(root, postprocessor=identity):
 
         else:
             debug('Unhandled combinator %s (%s %s -> %s)', comb, L, R, P)
-            unanalysed.add(comb)
+            context.unanalysed.add(comb)
             
             P.slot = R.slot if R else L.slot
             
@@ -393,16 +396,23 @@ def write_parg(bundle, deps):
     
     return '\n'.join(bits)
 
+def dep_sort_key(dep):
+    l, r, head_cat, head_label = dep
+    # Slots hash by identity, so the iteration order of a set of deps varies from run to run: the key
+    # must order every dep, not just those with distinct heads
+    return (int(split_indexed_lex(l)[1]), int(split_indexed_lex(r)[1]), head_label, str(head_cat))
+    
 def write_deps(deps):
     bits = []
-    for l, r, head_cat, head_label in sorted(deps, key=lambda v: int(split_indexed_lex(v[0])[1])):
+    for l, r, head_cat, head_label in sorted(deps, key=dep_sort_key):
         l, li = split_indexed_lex(l)
         r, ri = split_indexed_lex(r)
         bits.append(Template % tuple(str(e) for e in (ri, li, head_cat, head_label, r, l)))
     return bits
     
-def get_deps(root):
-    return mkdeps(naive_label_derivation(root))
+def get_deps(root, context=None):
+    if context is None: context = DerivationContext()
+    return mkdeps(naive_label_derivation(root, context), context=context)
     
 class MakeDependencies(Filter, OutputDerivation):
     def __init__(self, outdir):
@@ -411,21 +421,42 @@ class MakeDependencies(Filter, OutputDerivation):
             fn_template=lambda bundle: "chtb_%02d%02d.parg" % (bundle.sec_no, bundle.doc_no),
             outdir_template=lambda outdir, bundle: "%s/%02d" % (outdir, bundle.sec_no))
         
+        # combinator -> number of derivations in which mkdeps could not analyse it
+        self.unanalysed = defaultdict(int)
+        
     def accept_derivation(self, bundle):
         self.write_derivation(bundle)
 
-    @staticmethod
-    def process(bundle):
+    def process(self, bundle):
+        # Each derivation is labelled in its own context, so the PARG entry for a derivation is the
+        # same however the corpus is divided between worker processes (-j)
+        context = DerivationContext()
         try:
-            deps = get_deps(bundle.derivation)
+            deps = get_deps(bundle.derivation, context)
         # Squelch! We need an empty PARG entry even if the process fails, otherwise AUTO and PARG are out of sync
         except Exception, e: 
             err("Processing failed on derivation %s:", bundle.label())
             sys.stderr.flush()
             traceback.print_exc()
             deps = []
+            
+        for comb in context.unanalysed:
+            self.unanalysed[comb] += 1
 
         return write_parg(bundle, deps)
+        
+    def merge(self, other):
+        for comb, freq in other.unanalysed.iteritems():
+            self.unanalysed[comb] += freq
+            
+    def __getstate__(self):
+        # Worker instances are only sent back to be merged; the templates passed to OutputDerivation
+        # cannot be pickled
+        return { 'unanalysed': self.unanalysed }
+        
+    def output(self):
+        for comb, freq in sorted(self.unanalysed.iteritems(), key=lambda e: e[1], reverse=True):
+            warn("Unanalysed combinator %s in %d derivation(s).", comb, freq)
 
     opt = '9'
     long_opt = 'mkdeps'
@@ -441,12 +472,13 @@ if __name__ == '__main__':
     from munge.ccg.parse import *
 
     file = "final/%s" % sys.argv[1]
-    t=naive_label_derivation(parse_tree(open(file).readlines()[2*int(sys.argv[2])+1]))
+    context = DerivationContext()
+    t=naive_label_derivation(parse_tree(open(file).readlines()[2*int(sys.argv[2])+1]), context)
     print t
     print "sent:"
     print "-----"
     print ' '.join(t.text())
-    deps = mkdeps(t)
+    deps = mkdeps(t, context=context)
     
     print "deps:"
     print "-----"
@@ -459,7 +491,7 @@ if __name__ == '__main__':
         
     print "unhandled combs:"
     print "----------------"
-    for comb in unanalysed:
+    for comb in context.unanalysed:
         print comb
         
     print "finished:"
@@ -19,6 +19,7 @@ from munge.util.err_utils import *
 from munge.trees.traverse import leaves
 
 from apps.util.echo import echo
+from apps.util.mkdeps_utils import DerivationContext
 
 def variables():
     '''Returns an iterator over variable names. The first variable name returned is _,
@@ -129,35 +130,48 @@ for (frm, to) in Exceptions:
         assert subcat.slot.var != AtomicCategory.NoVariableSentinel, \
             "Markedup for category %s contains unspecified var" % to
 
+def exception_key(cat):
+    '''Returns a key which two categories share exactly when they are
+equal_respecting_features_and_alias: their atoms, features and slashes, but not their modes or
+variables, and their outermost alias.'''
+    return structure_key(cat), cat.alias
+
+def structure_key(cat):
+    if cat.is_leaf(): return cat.cat, tuple(cat.features)
+    return structure_key(cat._left), cat.direction, structure_key(cat._right), tuple(cat.features)
+
+# Maps the key of each category in Exceptions to the template (see munge.cats.headed.parse) of its
+# markedup, so that each cached category is built fresh rather than deep-copied. The first mapping
+# for a category takes precedence.
+ExceptionTemplates = {}
+for (frm, to) in Exceptions:
+    ExceptionTemplates.setdefault(exception_key(frm), make_template(to))
+
 def get_cached_category_for(cat, lex, vars):
     '''If _cat_ matches one of the mappings defined in Exceptions, returns a copy of
 the cached category, filling in its outermost variable's lex with _lex_.'''
-    for frm, to in Exceptions:
-        if cat.equal_respecting_features_and_alias(frm):
-            result = copy.deepcopy(to)
-            for subcat in result.nested_compound_categories():
-                # rewrite a variable name beginning with % with an available
-                # variable (if the markedup has been parsed correctly, all
-                # mentions of that variable will be updated)
-                if subcat.slot.var.startswith('%'):
-                    subcat.slot.var = vars.next()
-            return result
-    return None
-
-n = 1
-def label(cat, vars=None, lex=None):
+    # Every category in Exceptions is complex
+    if not cat.is_complex(): return None
+    
+    template = ExceptionTemplates.get(exception_key(cat), None)
+    if template is None: return None
+    
+    # rewrite a variable name beginning with % with an available variable (all mentions of that
+    # variable share its slot, so are updated too)
+    return instantiate(template, lambda var: vars.next() if var.startswith('%') else var)
+
+def label(cat, vars=None, lex=None, context=None):
     '''Labels the category _cat_ using the markedup labelling algorithm, with
-available variable labels _vars_ and lexical item _lex_.'''
-    global n
+available variable labels _vars_ and lexical item _lex_, in the DerivationContext _context_.'''
+    if context is None: context = DerivationContext()
         
     available = vars or variables()
     cached = get_cached_category_for(cat, lex, vars=available)
-    if cached: 
-        cp = copy.deepcopy(cached)
-        return cp
+    # get_cached_category_for returns a fresh category, so it need not be copied again
+    if cached: return cached
     
     if cat.slot.var == AtomicCategory.NoVariableSentinel:
-        suffix = str(n) if config.debug_vars else ''
+        suffix = str(context.label_id) if config.debug_vars else ''
         cat.slot.var = (available.next() + suffix)
 
     if cat.is_complex():
@@ -167,18 +181,18 @@ available variable labels _vars_ and lexical item _lex_.'''
             c = c.left
 
         if is_modifier(cat):
-            cat._left = label(cat.left, available, lex)
+            cat._left = label(cat.left, available, lex, context)
             cat._right = copy.copy(cat._left)
 
         elif is_np_n(cat):
-            cat._left = label(cat.left, available, lex)
+            cat._left = label(cat.left, available, lex, context)
             cat._right.slot = cat._left.slot
 
         else:
-            cat._left = label(cat.left, available, lex)
-            cat._right = label(cat.right, available, lex)
+            cat._left = label(cat.left, available, lex, context)
+            cat._right = label(cat.right, available, lex, context)
 
-    n += 1
+    context.label_id += 1
     return cat
 
 PREFACE = "# this file was generated by the following command(s):"
@@ -191,10 +205,13 @@ def write_markedup(cats, file):
         print >>file, "\t", 0, cat.__repr__(suppress_alias=True)
         print >>file
 
-def naive_label_derivation(root):
-    '''Applies the markedup labelling algorithm to each leaf under _root_.'''
+def naive_label_derivation(root, context=None):
+    '''Applies the markedup labelling algorithm to each leaf under _root_, in the DerivationContext
+_context_ (by default, a fresh one).'''
+    if context is None: context = DerivationContext()
+    
     for leaf in leaves(root):
-        leaf.cat = label(leaf.cat, lex=leaf.lex)
+        leaf.cat = label(leaf.cat, lex=leaf.lex, context=context)
         # pre-populate the outermost slot with the lexical item
         leaf.cat.slot.head.lex = leaf.lex
         
@@ -9,12 +9,16 @@
 
 from __future__ import with_statement
 from munge.proc.filter import Filter
+from munge.proc.cache import record_output
 import os, re
 
 IdRegex = re.compile(r'(\d+):(\d+)\((\d+)\)')
 
 class OutputDerivation(object):
     '''Writes out a derivation to disk.'''
+    # Every write goes through record_output, so results can be replayed from the stage cache
+    cacheable = True
+    
     def __init__(self, outdir, transformer=None, fn_template=None, outdir_template=None):
         '''_transformer_ is a function which receives each derivation bundle and
 returns the string to write, _fn_template_ is a function accepting the bundle and returning
@@ -26,18 +30,29 @@ name and the bundle, and returning the directory name for that derivation.'''
         self.outdir_template = outdir_template or (lambda outdir, _: outdir)
         self.fn_template = fn_template or (lambda bundle: "chtb_%02d%02d.fid" % (bundle.sec_no, bundle.doc_no))
         
-    def write_derivation(self, bundle, subdir=None):
-        outdir = self.outdir
-        if subdir:
-            outdir = os.path.join(outdir, subdir)
+        # If set, a function which receives each written bundle (see apps.cn.pipeline)
+        self.next_stage = None
         
-        outdir_path = self.outdir_template(outdir, bundle)
+    def write_derivation(self, bundle, subdir=None):
+        '''Writes the bundle under _outdir_ (unless _outdir_ is None), then hands it to the next stage
+if one has been installed.'''
+        if self.outdir is not None:
+            outdir = self.outdir
+            if subdir:
+                outdir = os.path.join(outdir, subdir)
+            
+            outdir_path = self.outdir_template(outdir, bundle)
 
-        if not os.path.exists(outdir_path): os.makedirs(outdir_path)
-        output_filename = os.path.join(outdir_path, self.fn_template(bundle))
+            if not os.path.exists(outdir_path): os.makedirs(outdir_path)
+            output_filename = os.path.join(outdir_path, self.fn_template(bundle))
 
-        with file(output_filename, 'a') as f:
-            print >>f, self.transformer(bundle)
+            text = self.transformer(bundle)
+            with file(output_filename, 'a') as f:
+                print >>f, text
+            record_output(output_filename, str(text) + '\n')
+                
+        if self.next_stage is not None:
+            self.next_stage(bundle)
             
 class OutputPTBDerivation(OutputDerivation):
     def __init__(self, outdir):
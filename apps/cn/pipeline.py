@@ -0,0 +1,105 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+from munge.proc.filter import Filter
+import munge.penn.aug_nodes as A
+from munge.util.config import config
+
+if config.headed_cats:
+    from munge.cats.headed.parse import parse_category
+else:
+    from munge.cats.parse import parse_category
+
+# Import the stage modules rather than the filter classes, so that loading this module does not
+# make each stage available a second time.
+import apps.cn.clean as clean
+import apps.cn.tag as tag
+import apps.cn.binarise as binarise
+import apps.cn.catlab as catlab
+import apps.cn.fix_rc as fix_rc
+import apps.cn.fix_adverbs as fix_adverbs
+import apps.cn.fix_np as fix_np
+import apps.cn.output as output
+
+# The stages of make_all.sh, in order, named after the directory each one writes to.
+Stages = (
+    ('filtered', clean.Clean),
+    ('tagged', tag.TagStructures),
+    ('binarised', binarise.Binariser),
+    ('labelled', catlab.LabelNodes),
+    ('fixed_rc', fix_rc.FixExtraction),
+    ('fixed_adverbs', fix_adverbs.FixAdverbs),
+    ('fixed_np', fix_np.FixNP),
+)
+
+def as_if_reparsed(node, parent=None):
+    '''Re-establishes the invariants which writing out _node_ in the prefaced PTB format and reading it
+back in with AugmentedPennParser would: every node is an augmented node, each parent pointer refers to
+the node containing it, and no two nodes share a category object.'''
+    if node.is_leaf():
+        if not isinstance(node, A.Leaf):
+            node = A.Leaf(node.tag, node.lex)
+    else:
+        if not isinstance(node, A.Node):
+            node = A.Node(node.tag, node.kids)
+        node.kids = [as_if_reparsed(kid, node) for kid in node.kids]
+
+    node.parent = parent
+    if node.category is not None:
+        node.category = parse_category(str(node.category))
+
+    return node
+
+def parse_write_spec(write_spec):
+    '''Given a comma-separated list of stage names, each optionally followed by :DIR, returns a dict
+mapping stage names to the directory to write that stage's output to. '-' denotes no stages.'''
+    if write_spec == '-': return {}
+
+    result = {}
+    for spec in write_spec.split(','):
+        stage_name, _, outdir = spec.partition(':')
+        if stage_name not in dict(Stages):
+            raise RuntimeError("No conversion stage named %s." % stage_name)
+        result[stage_name] = outdir or stage_name
+    return result
+
+class ConversionPipeline(Filter):
+    '''Passes each derivation through every conversion stage in memory, writing CCGbank-style output
+to OUTDIR. WRITE is a comma-separated list of intermediate stages to also write out (for instance
+tagged,labelled:labelled_test), or - for none.'''
+    def __init__(self, outdir, write):
+        Filter.__init__(self)
+
+        intermediate_dirs = parse_write_spec(write)
+        self.stages = [ stage_class(intermediate_dirs.get(stage_name, None))
+                        for (stage_name, stage_class) in Stages ]
+        self.stages.append(output.CCGbankStyleOutput(outdir))
+
+        # Each stage hands every derivation it writes to the stage after it. A derivation
+        # which a stage declines to write (as Clean may) goes no further.
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = self.make_handoff(next_stage)
+
+    @staticmethod
+    def make_handoff(next_stage):
+        def handoff(bundle):
+            bundle.derivation = as_if_reparsed(bundle.derivation)
+            next_stage.accept_derivation(bundle)
+        return handoff
+
+    def accept_derivation(self, bundle):
+        self.stages[0].accept_derivation(bundle)
+        
+    # The stages write only through OutputDerivation
+    cacheable = True
+
+    opt = '8'
+    long_opt = 'convert'
+
+    arg_names = 'OUTDIR WRITE'
@@ -8,11 +8,16 @@
 # notify the maintainer Daniel Tse <cncandc@gmail.com>.
 
 import unittest
+import os, shutil, tempfile
+from glob import glob
 
 from itertools import imap
-from apps.cn.mkdeps import mkdeps, UnificationException, IndexSeparator
+from apps.cn.mkdeps import mkdeps, get_deps, write_deps, MakeDependencies, UnificationException, IndexSeparator
 from apps.cn.mkmarked import naive_label_derivation
+from apps.util.mkdeps_utils import DerivationContext
 from munge.ccg.parse import parse_tree
+from munge.proc.trace_core import TraceCore
+from munge.trees.traverse import leaves
 
 def parse_gsdeps(line):
     return set(tuple(dep.split('|')) for dep in line.split())
@@ -58,6 +63,45 @@ class DepTests(unittest.TestCase):
         self.check('apps/cn/tests/passives.ccg', 'apps/cn/tests/passives.gs')
         self.check('apps/cn/tests/vnv.ccg', 'apps/cn/tests/vnv.gs')
 #        self.check('final/chtb_9992.fid', 'apps/cn/tests/blah.gs')
+        
+    def testDerivationContext(self):
+        derivs = [ deriv for deriv in open('apps/cn/tests/test1.ccg').readlines()[1::2] if not deriv.startswith('#') ]
+        
+        def label_and_write(deriv):
+            context = DerivationContext()
+            t = parse_tree(deriv)
+            deps = get_deps(t, context)
+            return [ repr(leaf.cat) for leaf in leaves(t) ], write_deps(deps), context.fresh_var()
+            
+        # Variable names, and so the output, do not depend on what was processed beforehand
+        forward = map(label_and_write, derivs)
+        self.assertEqual(list(reversed(forward)), map(label_and_write, reversed(derivs)))
+        
+    def testParallelMakeDependencies(self):
+        dir = tempfile.mkdtemp()
+        try:
+            section_dir = os.path.join(dir, 'in', '00')
+            os.makedirs(section_dir)
+            for fn in ('munge/tests/wsj_0003.auto', 'munge/tests/wsj_0087.auto'):
+                shutil.copy(fn, section_dir)
+                
+            outputs, unanalysed = [], []
+            for jobs in (1, 2):
+                outdir = os.path.join(dir, 'out%d' % jobs)
+                filter = MakeDependencies(outdir)
+                
+                tracer = TraceCore(libraries=[], verbose=False, jobs=jobs)
+                tracer.run_filters([filter], [os.path.join(dir, 'in')], [(MakeDependencies, (outdir,))])
+                
+                outputs.append(dict( (os.path.basename(fn), open(fn).read())
+                                     for fn in glob(os.path.join(outdir, '*', '*')) ))
+                unanalysed.append(dict(filter.unanalysed))
+                
+            self.assertEqual(len(outputs[0]), 2)
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(unanalysed[0], unanalysed[1])
+        finally:
+            shutil.rmtree(dir)
                     
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
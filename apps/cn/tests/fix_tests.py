@@ -0,0 +1,108 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+import unittest
+
+from apps.cn.fix import Fix, PatternScan
+from munge.penn.parse import parse_tree, PennParser, AugmentedPennParser
+from munge.penn.nodes import Node
+from munge.cats.cat_defs import NP
+from munge.cats.parse import parse_category
+from munge.trees.traverse import nodes
+
+Tree = '( (IP (NP (NN x)) (VP (VV y) (NP (NN z)))) )'
+Categories = { 'IP': 'S[dcl]', 'NP': 'NP', 'NN': 'N', 'VP': r'S[dcl]\NP', 'VV': r'(S[dcl]\NP)/NP' }
+
+class FixTests(unittest.TestCase):
+    def run_patterns(self, patterns, ordered, parse=parse_tree):
+        tree = parse(Tree, PennParser)[0]
+        fired = []
+        def record(name, action=None):
+            def callback(node, **context):
+                fired.append((name, node.tag))
+                if action: return action(node)
+            callback.__name__ = name
+            return callback
+
+        triples = [ (pattern, record(name, action), {}) for pattern, name, action in patterns ]
+        if ordered:
+            tree = Fix.do_ordered_tgrep_with_callbacks(tree, triples)
+        else:
+            for pattern, callback, kwargs in triples:
+                tree = Fix.do_tgrep_with_callback(tree, pattern, callback, **kwargs)
+        return fired, repr(tree)
+
+    def testOrderedPatternsMatchSequentialRun(self):
+        rename_nn = lambda node: setattr(node, 'tag', 'NR')
+        def wrap_vv(node):
+            vp = node.parent
+            vp[0] = Node('VRD', [node], vp)
+
+        patterns = [
+            # matches nothing until the NNs are renamed
+            (r'NP < NR', 'before', None),
+            (r'NN', 'rename', rename_nn),
+            (r'NP < NR', 'after', None),
+            # reads outside the subtree of the node it matches
+            (r'VV $ NP', 'sibling', wrap_vv),
+            (r'VRD < VV', 'wrapped', None),
+            (r'VP < VV', 'unwrapped', None),
+            (r'* < /V/ . ^z', 'precedes', None),
+        ]
+        self.assertEqual(self.run_patterns(patterns, ordered=True),
+                         self.run_patterns(patterns, ordered=False))
+
+        fired, _ = self.run_patterns(patterns, ordered=True)
+        self.assertTrue(('after', 'NP') in fired)
+        self.assertTrue(('wrapped', 'VRD') in fired)
+        self.assertFalse(any(name in ('before', 'unwrapped') for name, _ in fired))
+
+    def testOrderedCategoryPatterns(self):
+        def categorised_tree(tree, _):
+            # Plain categories, whose strings do not depend on whether headed categories show their variables
+            tree = parse_tree(tree, AugmentedPennParser)[0]
+            for node in nodes(tree):
+                node.category = parse_category(Categories[node.tag])
+            return [tree]
+        def promote(node): node.category = NP
+
+        patterns = [
+            (r'NP < @"NP"', 'before', None),
+            (r'@"N"', 'promote', promote),
+            (r'NP < @"NP"', 'after', None),
+            (r'@"S[dcl]\NP" < VV', 'untouched', None),
+        ]
+        self.assertEqual(self.run_patterns(patterns, True, parse=categorised_tree),
+                         self.run_patterns(patterns, False, parse=categorised_tree))
+
+        fired, _ = self.run_patterns(patterns, True, parse=categorised_tree)
+        self.assertEqual(fired, [('promote', 'NN'), ('promote', 'NN'), ('after', 'NP'), ('after', 'NP'),
+                                 ('untouched', 'VP')])
+
+        # A new category is noticed by the scan, while unchanged nodes keep their category strings
+        tree = categorised_tree(Tree, None)[0]
+        scan = PatternScan(tree, [r'@"NP" !< *'])
+        self.assertEqual(scan.may_match(0), False)
+
+        promote(tree[0][0])
+        scan.update(tree, xrange(1))
+        self.assertEqual(scan.may_match(0), True)
+
+    def testScanSkipsUnmatchablePatterns(self):
+        tree = parse_tree(Tree, PennParser)[0]
+        scan = PatternScan(tree, [r'NP < NR', r'/V/ < VV', r'* < VV', r'VV $ *', r'IP << ^z'])
+
+        self.assertEqual(map(scan.may_match, xrange(5)), [False, True, True, True, True])
+
+        tree[0][0].tag = 'NR'
+        scan.update(tree, xrange(5))
+        self.assertEqual(scan.may_match(0), True)
+
+if __name__ == '__main__':
+    unittest.main()
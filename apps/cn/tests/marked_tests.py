@@ -25,6 +25,16 @@ class MarkedTests(unittest.TestCase):
             ('(S[dcl]\NP)/(S[dcl]\NP)','((S[dcl]{_}\NP{Y}){_}/(S[dcl]{Z}\NP{Y}){Z}){_}'),
         ):
             self.assertEqual(repr(label(parse_category(before))), after)
+            
+    def testExceptionTemplates(self):
+        a, b = (label(parse_category(r'(S[dcl]\NP)/(S[dcl]\NP)')) for _ in xrange(2))
+        # Each labelled category has its own slots, shared where the markedup shares a variable
+        self.assert_(a.left.right.slot is a.right.right.slot)
+        self.assert_(a.left.right.slot is not b.left.right.slot)
+        
+        # Exceptions are distinguished by their outermost alias
+        self.assertEqual(repr(label(parse_category(r'(S[dcl]\NP)/(S[dcl]\NP)~SB'))),
+                         r'((S[dcl]{_}\NP{Y}){_}/(S[dcl]{Z}\NP{W}){Z}){_}~SB')
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+import unittest
+import os, shutil, tempfile
+from glob import glob
+
+from munge.proc.trace_core import TraceCore
+from apps.cn.pipeline import Stages, ConversionPipeline
+from apps.cn.output import CCGbankStyleOutput
+from munge.cats.headed.nodes import AtomicCategory, ComplexCategory
+
+class PipelineTests(unittest.TestCase):
+    def setUp(self):
+        # Headed categories pick their repr from the config when first imported, and importing
+        # mkmarked turns on show_vars; pin the repr make_all.sh's stages would write with
+        self.reprs = [ (cls, cls.__dict__['__repr__']) for cls in (AtomicCategory, ComplexCategory) ]
+        for cls, _ in self.reprs:
+            cls.__repr__ = cls.__dict__['repr_without_vars']
+            
+        self.dir = tempfile.mkdtemp()
+
+        section_dir = os.path.join(self.dir, 'in', '00')
+        os.makedirs(section_dir)
+        shutil.copy('apps/cn/tests/test1.fid', os.path.join(section_dir, 'chtb_0001.fid'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        for cls, old_repr in self.reprs:
+            cls.__repr__ = old_repr
+
+    def run_filter(self, filter_class, args, indir):
+        tracer = TraceCore(libraries=[], verbose=False)
+        tracer.run_filters([filter_class(*args)], [indir], [(filter_class, args)])
+
+    def read_outputs(self, outdir):
+        return dict( (os.path.relpath(fn, outdir), open(fn).read())
+                     for fn in glob(os.path.join(outdir, '*')) + glob(os.path.join(outdir, '*', '*'))
+                     if os.path.isfile(fn) )
+
+    def testFusedMatchesStaged(self):
+        # Each stage reads what the stage before it wrote, as make_all.sh does
+        indir = os.path.join(self.dir, 'in')
+        for stage_name, stage_class in Stages:
+            outdir = os.path.join(self.dir, 'staged', stage_name)
+            self.run_filter(stage_class, (outdir,), indir)
+            indir = outdir
+        self.run_filter(CCGbankStyleOutput, (os.path.join(self.dir, 'staged', 'final'),), indir)
+
+        self.run_filter(ConversionPipeline, (os.path.join(self.dir, 'fused', 'final'),
+                                             'fixed_np:' + os.path.join(self.dir, 'fused', 'fixed_np')),
+                        os.path.join(self.dir, 'in'))
+
+        for outdir in ('final', 'fixed_np'):
+            staged = self.read_outputs(os.path.join(self.dir, 'staged', outdir))
+            fused = self.read_outputs(os.path.join(self.dir, 'fused', outdir))
+
+            self.assertEqual(len(staged), 1)
+            self.assertEqual(staged, fused)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -34,7 +34,7 @@ class PunctuationCount(Filter):
     def accept_derivation(self, bundle):
         self.total += 1
         
-        toks = bundle.derivation.text()
+        toks = bundle.tokens()
         for tok in toks:
             if tok in self.puncts:
                 self.n += 1
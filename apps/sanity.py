@@ -58,6 +58,14 @@ class SanityChecks(Filter):
                 self.tokens.add(leaf.lex)
         # self.ecs += len([ leaf for leaf in leaves(bundle.derivation) if self.is_trace(leaf) ])
 
+    def merge(self, other):
+        self.nderivs += other.nderivs
+        self.nwords += other.nwords
+        self.tokens.update(other.tokens)
+        self.ecs += other.ecs
+        for kind, freq in other.ec_types.iteritems():
+            self.ec_types[kind] += freq
+
     def output(self):
         print "nderivs: %d, nwords: %d, ecs: %d" % (self.nderivs, self.nwords, self.ecs)
         print "avg words/sent: %.2f, ecs/sent: %.2f" % (
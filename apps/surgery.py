@@ -19,6 +19,7 @@ from apps.proxy_io import *
 from munge.io.guess_ptb import PTBGuesser
 from munge.io.guess import GuessReader
 from munge.trees.traverse import *
+from munge.trees.index import TreeIndex
 
 from munge.util.iter_utils import flatten
 
@@ -203,8 +204,9 @@ def get_locator_sequence_to(leaf):
         cur = cur.parent
     return list(reversed(ret))
     
-def desugar(value, last_locator_bits, deriv):
-    '''Lets the user use "l" or "r" in the locator path to mean children 0 or 1 (of a CCGbank derivation).'''
+def desugar(value, last_locator_bits, deriv, index=None):
+    '''Lets the user use "l" or "r" in the locator path to mean children 0 or 1 (of a CCGbank derivation).
+Leaves named by "$n" are found through the TreeIndex _index_ of the derivation, if one is given.'''
     if value == 'l': return 0
     elif value == 'r': return 1
     elif value == '_': 
@@ -225,7 +227,7 @@ def desugar(value, last_locator_bits, deriv):
         return insert_locator
     elif value.startswith('$'): # return _parent_ of requested leaf
         leaf_index = int(value[1:])
-        requested_leaf = get_leaf(deriv, leaf_index)
+        requested_leaf = get_leaf(deriv, leaf_index, index=index)
         locator_to_requested_leaf = get_locator_sequence_to(requested_leaf)
         # return all but the last element, since we want the parent of requested leaf
         return locator_to_requested_leaf[:-1]
@@ -264,10 +266,12 @@ for (sec, doc), commands in group_by_derivation(parse_instruction_lines(sys.stdi
         cur_bundle = cur_trees[deriv]
 
         locator, instr = command.split(' ', 2)
+        # Each command may change the derivation, so leaf positions are only shared within a command
+        index = TreeIndex(cur_bundle.derivation)
         locator_bits = list(flatten(map(
             compose(maybe_int, 
                     lambda value: 
-                       desugar(value, last_locator_bits, cur_bundle.derivation)), 
+                       desugar(value, last_locator_bits, cur_bundle.derivation, index)), 
             locator.split(';'))))
 
         cur_bundle.derivation = process(cur_bundle.derivation, locator_bits, instr)
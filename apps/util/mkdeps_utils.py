@@ -31,13 +31,22 @@ def no_unassigned_variables(cat):
         if subcat.slot.var == '?': return False
     return True
     
-fresh_var_id = 1
-def fresh_var(prefix='F'):
-    '''Returns a unique variable name with a given _prefix_.'''
-    global fresh_var_id
-    ret = prefix + str(fresh_var_id)
-    fresh_var_id += 1
-    return ret
+class DerivationContext(object):
+    '''Holds the state of labelling a single derivation and generating its dependencies: the counters
+from which fresh variable names are drawn, and the combinators which mkdeps could not analyse. Each
+derivation gets its own context, so the names it is given do not depend on which derivations were
+processed before it, or in which process.'''
+    def __init__(self):
+        self.fresh_var_id = 1
+        # Appended to variable names by mkmarked.label when config.debug_vars is set
+        self.label_id = 1
+        self.unanalysed = set()
+
+    def fresh_var(self, prefix='F'):
+        '''Returns a variable name with a given _prefix_, unique within this derivation.'''
+        ret = prefix + str(self.fresh_var_id)
+        self.fresh_var_id += 1
+        return ret
     
 class UnificationException(Exception): pass
 def unify(L, R, ignore=False, copy_vars=True):
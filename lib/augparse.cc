@@ -15,6 +15,17 @@ static PyObject* _parse(std::deque<std::string>& toks, PyObject* parent=NULL);
 static PyObject* parse_category_f = NULL;
 static PyObject* Leaf_f = NULL;
 static PyObject* Node_f = NULL;
+static PyObject* intern_string_f = NULL;
+
+// Returns a new reference to the interned copy of _s_ (see munge.util.intern_utils)
+static PyObject* intern_string(const std::string& s) {
+    PyObject* str = PyString_FromString(s.c_str());
+    if (str == NULL || intern_string_f == NULL) return str;
+    
+    PyObject* result = PyObject_CallFunctionObjArgs(intern_string_f, str, NULL);
+    Py_DECREF(str);
+    return result;
+}
 
 static void shift_and_check(std::string must_match, std::deque<std::string>& toks) {
     std::string next = toks.front(); toks.pop_front();
@@ -89,9 +100,13 @@ static PyObject* _parse(std::deque<std::string>& toks, PyObject* parent) {
     }
     
     if (PyList_Size(kids) == 0 && lex.length() != 0) {
-        PyObject* args = Py_BuildValue("(ssOO)", tag.c_str(), lex.c_str(), category, parent);
+        PyObject* tag_string = intern_string(tag);
+        PyObject* lex_string = intern_string(lex);
+        PyObject* args = Py_BuildValue("(OOOO)", tag_string, lex_string, category, parent);
         PyObject* result = PyObject_CallObject(Leaf_f, args);
         Py_XDECREF(args);
+        Py_XDECREF(tag_string);
+        Py_XDECREF(lex_string);
                     
         shift_and_check(")", toks);
         
@@ -99,8 +114,10 @@ static PyObject* _parse(std::deque<std::string>& toks, PyObject* parent) {
         Py_XDECREF(category);
         return result;
     } else {
-        PyObject* args = Py_BuildValue("(sOOOi)", tag.c_str(), kids, category, parent, head_index);
+        PyObject* tag_string = intern_string(tag);
+        PyObject* args = Py_BuildValue("(OOOOi)", tag_string, kids, category, parent, head_index);
         PyObject* result = PyObject_CallObject(Node_f, args);
+        Py_XDECREF(tag_string);
         if (result == NULL) {
             Py_RETURN_NONE;
         }
@@ -221,5 +238,13 @@ extern "C" void initaugparse(void) {
         Py_XDECREF(module_dict);
     Py_XDECREF(module);
     
+    module = PyImport_ImportModule("munge.util.intern_utils");
+        if (module == NULL) {
+            PyErr_SetString(PyExc_ImportError, "Could not load munge.util.intern_utils");
+            return;
+        }
+        intern_string_f = PyObject_GetAttrString(module, "intern_string");
+    Py_XDECREF(module);
+    
     Py_InitModule("augparse", augparse_methods);
 }
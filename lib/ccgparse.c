@@ -0,0 +1,178 @@
+#include "Python.h"
+
+/* Parses CCGbank AUTO bracketings directly into munge.ccg.nodes objects, mirroring
+   munge.ccg.parse.CCGParser. The category parser and node classes are supplied by the caller,
+   so that the parser respects the category representation chosen in the config. */
+
+#define MAX_FIELDS 5
+
+static PyObject* CCGbankParseException = NULL;
+
+typedef struct {
+    const char* p;
+    PyObject* parse_category;
+    PyObject* node_class;
+    PyObject* leaf_class;
+    /* If not NULL, applied to each field but the category (see munge.util.intern_utils) */
+    PyObject* intern;
+} parser_t;
+
+static void skip_space(parser_t* parser) {
+    while (*parser->p == ' ' || *parser->p == '\t' || *parser->p == '\r' || *parser->p == '\n')
+        ++parser->p;
+}
+
+static int shift_and_check(parser_t* parser, char expected) {
+    skip_space(parser);
+    if (*parser->p != expected) {
+        PyErr_Format(CCGbankParseException, "Expected %c, got %.20s", expected, parser->p);
+        return 0;
+    }
+    ++parser->p;
+    return 1;
+}
+
+/* Reads the whitespace-separated fields up to the closing '>' of a node, returning them as new
+   string objects in _fields_ and their number, or -1 on error. */
+static int read_fields(parser_t* parser, PyObject** fields) {
+    int nfields = 0;
+    for (;;) {
+        const char* start;
+
+        skip_space(parser);
+        if (*parser->p == '>') {
+            ++parser->p;
+            return nfields;
+        }
+        if (*parser->p == '\0' || nfields == MAX_FIELDS) break;
+
+        start = parser->p;
+        while (*parser->p && *parser->p != '>' &&
+               *parser->p != ' ' && *parser->p != '\t' && *parser->p != '\r' && *parser->p != '\n')
+            ++parser->p;
+
+        fields[nfields] = PyString_FromStringAndSize(start, parser->p - start);
+        if (!fields[nfields]) break;
+
+        if (nfields > 0 && parser->intern) {
+            PyObject* interned = PyObject_CallFunctionObjArgs(parser->intern, fields[nfields], NULL);
+            Py_DECREF(fields[nfields]);
+            if (!interned) break;
+            fields[nfields] = interned;
+        }
+        ++nfields;
+    }
+
+    while (nfields > 0) {
+        --nfields;
+        Py_DECREF(fields[nfields]);
+    }
+    if (!PyErr_Occurred())
+        PyErr_SetString(CCGbankParseException, "Malformed node in CCGbank bracketing.");
+    return -1;
+}
+
+static PyObject* read_paren(parser_t* parser, PyObject* parent) {
+    PyObject* fields[MAX_FIELDS];
+    PyObject* cat = NULL;
+    PyObject* result = NULL;
+    char node_type;
+    int nfields, i;
+
+    if (!shift_and_check(parser, '(') || !shift_and_check(parser, '<')) return NULL;
+
+    skip_space(parser);
+    node_type = *parser->p;
+    if (node_type != 'T' && node_type != 'L') {
+        PyErr_SetString(CCGbankParseException, "Node type (T, L) expected here.");
+        return NULL;
+    }
+    ++parser->p;
+
+    nfields = read_fields(parser, fields);
+    if (nfields == -1) return NULL;
+
+    if (nfields != (node_type == 'T' ? 3 : 5)) {
+        PyErr_Format(CCGbankParseException, "Wrong number of fields in %c node.", node_type);
+        goto done;
+    }
+
+    cat = PyObject_CallFunctionObjArgs(parser->parse_category, fields[0], NULL);
+    if (!cat) goto done;
+
+    if (node_type == 'T') {
+        PyObject *lch, *rch = NULL;
+
+        result = PyObject_CallFunctionObjArgs(parser->node_class, cat, fields[1], fields[2], parent, NULL);
+        if (!result) goto done;
+
+        lch = read_paren(parser, result);
+        if (!lch) { Py_CLEAR(result); goto done; }
+
+        skip_space(parser);
+        if (*parser->p == '(') {
+            rch = read_paren(parser, result);
+            if (!rch) { Py_DECREF(lch); Py_CLEAR(result); goto done; }
+        }
+
+        if (PyObject_SetAttrString(result, "lch", lch) == -1 ||
+            (rch && PyObject_SetAttrString(result, "rch", rch) == -1)) {
+            Py_CLEAR(result);
+        }
+        Py_DECREF(lch);
+        Py_XDECREF(rch);
+        if (!result) goto done;
+    } else {
+        result = PyObject_CallFunctionObjArgs(parser->leaf_class,
+            cat, fields[1], fields[2], fields[3], fields[4], parent, NULL);
+        if (!result) goto done;
+    }
+
+    if (!shift_and_check(parser, ')')) Py_CLEAR(result);
+
+done:
+    Py_XDECREF(cat);
+    for (i = 0; i < nfields; ++i) Py_DECREF(fields[i]);
+    return result;
+}
+
+static PyObject* ccgparse_parse_tree(PyObject* self, PyObject* args) {
+    parser_t parser;
+    PyObject* result;
+
+    parser.intern = NULL;
+    if (!PyArg_ParseTuple(args, "sOOO|O", &parser.p,
+                          &parser.parse_category, &parser.node_class, &parser.leaf_class, &parser.intern)) {
+        return NULL;
+    }
+
+    result = read_paren(&parser, Py_None);
+    if (!result) return NULL;
+
+    skip_space(&parser);
+    if (*parser.p != '\0') {
+        Py_DECREF(result);
+        PyErr_Format(CCGbankParseException, "ccg.parse_tree: Tokens remain in stream: %.20s", parser.p);
+        return NULL;
+    }
+
+    return result;
+}
+
+static PyMethodDef ccgparse_methods[] = {
+    /* name    ptr to function               flags         doc */
+    { "parse_tree", (PyCFunction)ccgparse_parse_tree, METH_VARARGS,
+      "parse_tree(tree_string, parse_category, node_class, leaf_class[, intern])" },
+    { NULL, NULL, 0, NULL }
+};
+
+PyMODINIT_FUNC initccgparse(void) {
+    PyObject* module = PyImport_ImportModule("munge.util.exceptions");
+    if (module == NULL) return;
+
+    CCGbankParseException = PyObject_GetAttrString(module, "CCGbankParseException");
+    Py_DECREF(module);
+    if (CCGbankParseException == NULL) return;
+
+    Py_InitModule("ccgparse", ccgparse_methods);
+}
@@ -11,6 +11,7 @@ from distutils.core import setup, Extension
 
 setup(name='pressplit', ext_modules=[ Extension('pressplit', sources=['pressplit.c']) ])
 setup(name='augparse', ext_modules=[ Extension('augparse', sources=['augparse.cc']) ])
+setup(name='ccgparse', ext_modules=[ Extension('ccgparse', sources=['ccgparse.c']) ])
 setup(name='cleaves', ext_modules=[ Extension('cleaves', sources=['cleaves.cc']) ])
 #setup(name='exthash', ext_modules=[ Extension('exthash', sources=['hash.c']) ])
 
@@ -18,18 +18,20 @@ dir_suffix_arg=
 config_file_arg=
 undo_topicalisation_arg=
 undo_np_internal_structure_arg=
+jobs_arg=
 
 final_dir=data
-while getopts 'c:s:o:C:TNh' OPTION
+while getopts 'c:s:o:C:j:TNh' OPTION
 do
     case $OPTION in
         C) config_file_arg="-C $OPTARG" ;;
         c) corpus_dir_arg="-c $OPTARG" ;;
         s) dir_suffix_arg="-s $OPTARG" ;;
+        j) jobs_arg="-j $OPTARG" ;;
         T) undo_topicalisation_arg="-T" ;;
         N) undo_np_internal_structure_arg="-N" ;;
         o) final_dir="$OPTARG" ;;
-        h) echo "$0 [-s dir-suffix] [-o output-dir] [-c corpus-dir] [-C config-file]"
+        h) echo "$0 [-s dir-suffix] [-o output-dir] [-c corpus-dir] [-C config-file] [-j jobs]"
            exit 1
         ;;
     esac
@@ -38,7 +40,7 @@ shift $(($OPTIND - 1))
 
 started=`date +%c`
 ./make_clean.sh
-time ./make_all.sh $corpus_dir_arg $dir_suffix_arg $config_file_arg $undo_topicalisation_arg $undo_np_internal_structure_arg all
+time ./make_all.sh $corpus_dir_arg $dir_suffix_arg $config_file_arg $jobs_arg $undo_topicalisation_arg $undo_np_internal_structure_arg all
 mkdir -p $final_dir
 filtered_corpus="${final_dir}/filtered_corpus"
 unanalysed="${final_dir}/unanalysed"
@@ -15,17 +15,23 @@ config_file_arg=
 corpus_dir=corpora/cptb/bracketed
 dir_suffix=
 config_file=config.yml
+jobs=1
+cache_arg=
+fused=false
 undo_topicalisation=false
 undo_np_internal_structure=false
-while getopts 'c:s:C:hTN' OPTION
+while getopts 'c:s:C:j:K:hTNF' OPTION
 do
     case $OPTION in
         C) config_file_arg="-C $OPTARG" ; config_file="$OPTARG" ;;
         c) corpus_dir_arg="-c $OPTARG" ; corpus_dir="$OPTARG" ;;
         s) dir_suffix_arg="-s $OPTARG" ; dir_suffix="$OPTARG" ;;
+        j) jobs="$OPTARG" ;;
+        K) cache_arg="-K $OPTARG" ;;
         T) undo_topicalisation=true ;;
         N) undo_np_internal_structure=true ;;
-        h) echo "$0 [-c corpus_dir] [-s work_dir_suffix] [-C config_file] [SEC|all]"
+        F) fused=true ;;
+        h) echo "$0 [-c corpus_dir] [-s work_dir_suffix] [-C config_file] [-j jobs] [-K cache_dir] [-F] [SEC|all]"
            exit 1 ;;
     esac
 done
@@ -56,13 +62,25 @@ apply() {
 
     msg "$comment -> $outdir"
     rm -rf $outdir/"$TARGET"
-    ./t -c $config_file -q -l$lib -r $filter $outdir -0 $srcdir/"$TARGET" 2>&1 | tee $errfile
+    ./t -c $config_file -q -j $jobs $cache_arg -l$lib -r $filter $outdir -0 $srcdir/"$TARGET" 2>&1 | tee $errfile
 
     return ${PIPESTATUS[0]} # return the exit code of the first command in the pipe
 }
 
 echo Started at: `date`
 
+# With -F, run every stage in memory in a single pass, writing only the final output
+if $fused; then
+    msg "Running all stages in memory... -> final$dir_suffix"
+    rm -rf ./final$dir_suffix/${TARGET}
+    ./t -c $config_file -q -j $jobs $cache_arg \
+        -lapps.cn.pipeline -r ConversionPipeline final$dir_suffix - -0 \
+        -lapps.sanity -r SanityChecks -0 "$corpus_dir"/"$TARGET" 2>&1 | tee pipeline_errors
+
+    echo Finished at: `date`
+    exit ${PIPESTATUS[0]}
+fi
+
 # 0. Filter
 apply "$corpus_dir" "filtered$dir_suffix" \
     apps.cn.clean Clean clean_errors \
@@ -115,7 +133,7 @@ apply "fixed_adverbs$dir_suffix" "fixed_np$dir_suffix" \
 # 5. Output
 msg "Outputting CCGbank format... -> final$dir_suffix"
 rm -rf ./final$dir_suffix/${TARGET}
-./t -q -lapps.cn.output -r CCGbankStyleOutput final$dir_suffix -0 \
+./t -q -j $jobs $cache_arg -lapps.cn.output -r CCGbankStyleOutput final$dir_suffix -0 \
     -c $config_file \
     -lapps.sanity -r SanityChecks -0 fixed_np$dir_suffix/${TARGET}
 
@@ -10,11 +10,14 @@
 # notify the maintainer Daniel Tse <cncandc@gmail.com>.
 
 dir_suffix=
-while getopts 's:' OPTION
+jobs=1
+while getopts 's:j:' OPTION
 do
     case $OPTION in
         s) dir_suffix="_$OPTARG"
         ;;
+        j) jobs="$OPTARG"
+        ;;
     esac
 done
 shift $(($OPTIND - 1))
@@ -31,4 +34,4 @@ fi
 
 rm -rf ./final/${TARGET};
 echo "[`date +%c`] Outputting CCGbank format... -> final$dir_suffix"
-./t -q -lapps.cn.output -r CCGbankStyleOutput final$dir_suffix -0 -lapps.sanity -r SanityChecks -0 fixed_np$dir_suffix/${TARGET}
+./t -q -j $jobs -lapps.cn.output -r CCGbankStyleOutput final$dir_suffix -0 -lapps.sanity -r SanityChecks -0 fixed_np$dir_suffix/${TARGET}
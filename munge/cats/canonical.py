@@ -0,0 +1,162 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''Hash-consed categories. canonical(cat) returns the one canonical object for every category with
+the same atoms, features, slashes and modes as _cat_. Each canonical category carries two
+precomputed integer IDs:
+    _id_, shared only by structurally identical categories, and
+    _eq_id_, shared by categories which are equal under ==, which ignores features;
+as well as its hash, so that comparing two canonical categories, or looking one up in a dict, costs a
+single integer comparison instead of a walk over the category.
+
+Canonical categories are shared, so they must not be modified: labelled() raises, and clone()
+returns an ordinary, mutable category.
+
+Finding the canonical category for an ordinary one takes a walk over it, unless the ordinary category
+was remembered: munge.cats.parse.parse_category is memoised, so each category it returns is long-lived
+and shared between every node with that category string, and the table keeps its canonical category
+against its identity.
+
+Headed categories are fresh objects which are rewritten in place (by mkdeps and the fixes, among
+others), so they can be neither remembered nor assumed unchanged. Instead, each one made from a
+template (see munge.cats.headed.parse) carries the canonical category of its template as its
+_canonical_hint_. The hint is confirmed by a walk which compares the fields of each category against
+the hint, which is cheaper than building and looking up a key for each. A category whose hint no longer
+holds is looked up, and given the result as its new hint.'''
+
+from copy import copy
+
+from munge.cats.nodes import AtomicCategory, ComplexCategory
+from munge.util.exceptions import CatParseException
+
+class Canonical(object):
+    '''Mixed into the canonical versions of AtomicCategory and ComplexCategory.'''
+    def __eq__(self, other):
+        if self is other: return True
+
+        eq_id = getattr(other, 'eq_id', None)
+        if eq_id is not None: return self.eq_id == eq_id
+        # Otherwise _other_ is an ordinary category, so compare structurally
+        return self.base.__eq__(self, other)
+
+    def __ne__(self, other): return not (self == other)
+
+    def __hash__(self): return self.hash
+
+class CanonicalAtomicCategory(Canonical, AtomicCategory):
+    base = AtomicCategory
+
+    def __init__(self, cat, features, id, eq_id):
+        AtomicCategory.__init__(self, cat, features)
+        self.id, self.eq_id = id, eq_id
+        self.hash = AtomicCategory.__hash__(self)
+
+    def clone(self):
+        return AtomicCategory(self.cat, copy(self.features))
+
+    def clone_with(self, features=None):
+        return AtomicCategory(self.cat, features if features else copy(self.features))
+
+class CanonicalComplexCategory(Canonical, ComplexCategory):
+    base = ComplexCategory
+
+    def __init__(self, left, direction, right, mode, features, id, eq_id):
+        ComplexCategory.__init__(self, left, direction, right, mode, features)
+        self.id, self.eq_id = id, eq_id
+        # Agrees with ComplexCategory.__hash__, since the hashes of _left_ and _right_ are precomputed
+        self.hash = hash(direction) ^ left.hash ^ right.hash
+
+    def labelled(self, index=0):
+        raise CatParseException('Canonical category %s cannot be labelled in-place; clone() it first.' % self)
+    postorder_labelled = parg_labelled = labelled
+
+def confirms(hint, cat):
+    '''Returns whether the canonical category _hint_ is the canonical category for _cat_.'''
+    if cat.features != hint.features: return False
+    if type(hint) is CanonicalAtomicCategory:
+        return cat.is_leaf() and cat.cat == hint.cat
+    return (not cat.is_leaf() and cat.direction == hint.direction and cat.mode == hint.mode and
+            confirms(hint._left, cat._left) and confirms(hint._right, cat._right))
+
+class CategoryTable(object):
+    '''Maps each category to its canonical object, keeping count of the lookups which found a
+canonical category already in the table.'''
+    def __init__(self):
+        # structural key -> canonical category
+        self.categories = {}
+        # featureless structural key -> eq_id
+        self.eq_ids = {}
+        # id(remembered category) -> canonical category
+        self.remembered = {}
+        self.reset()
+
+    def reset(self):
+        self.nrequests = self.nshared = 0
+
+    def eq_id(self, eq_key):
+        eq_id = self.eq_ids.get(eq_key, None)
+        if eq_id is None:
+            eq_id = self.eq_ids[eq_key] = len(self.eq_ids)
+        return eq_id
+
+    def __call__(self, cat):
+        '''Returns the canonical category for _cat_. Any heads, variables, aliases and slash labels
+of _cat_ are discarded.'''
+        result = self.remembered.get(id(cat), None)
+        if result is not None: return result
+        if isinstance(cat, Canonical): return cat
+
+        self.nrequests += 1
+        hint = cat.canonical_hint
+        if hint is not None and confirms(hint, cat):
+            self.nshared += 1
+            return hint
+
+        ncategories = len(self.categories)
+        result = cat.canonical_hint = self.lookup(cat)
+        if len(self.categories) == ncategories: self.nshared += 1
+        return result
+
+    def lookup(self, cat):
+        if cat.is_leaf():
+            key = (cat.cat, tuple(cat.features) if cat.features else ())
+        else:
+            left, right = self.lookup(cat._left), self.lookup(cat._right)
+            key = (left.id, cat.direction, right.id, cat.mode, tuple(cat.features) if cat.features else ())
+
+        result = self.categories.get(key, None)
+        if result is not None: return result
+
+        new_id = len(self.categories)
+        if cat.is_leaf():
+            result = CanonicalAtomicCategory(cat.cat, list(cat.features), new_id, self.eq_id(cat.cat))
+        else:
+            result = CanonicalComplexCategory(left, cat.direction, right, cat.mode, list(cat.features),
+                                              new_id, self.eq_id( (left.eq_id, cat.direction, right.eq_id) ))
+
+        self.categories[key] = result
+        return result
+
+    def known(self, cat):
+        '''Returns the canonical category for _cat_ if it can be found without a walk over _cat_, and
+otherwise _cat_ itself.'''
+        return self.remembered.get(id(cat), cat)
+
+    def remember(self, cat):
+        '''Records the canonical category for _cat_, so that later lookups of _cat_ cost a single dict
+lookup. The caller must keep _cat_ alive, and must not modify its structure, from then on.'''
+        self.remembered[id(cat)] = self(cat)
+
+    def __len__(self): return len(self.categories)
+
+    def report(self):
+        return "%d of %d category lookups found a canonical category; %d distinct categories." % (
+            self.nshared, self.nrequests, len(self.categories))
+
+canonical = CategoryTable()
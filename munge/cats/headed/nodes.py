@@ -54,25 +54,49 @@ class Head(object):
     __repr__ = lambda self: "<|%s|>" % (str(self.lex) or "?")
 
 class Slot(object):
-    '''A Slot is a mapping from a variable name to a Head.'''
+    '''A Slot is a mapping from a variable name to a Head. Unified slots share a Head: they form a
+set in a union-find forest, whose root holds the Head of the whole set.'''
     def __init__(self, var, head_lex=None):
         self.var = var        
         self._head = Head(head_lex)
         
-        self.dependers = set()
-        self.dependers.add( self )
+        # The next slot towards the root of this slot's set, or None if this slot is the root
+        self._parent = None
+        self._rank = 0
+        
+    def find(self):
+        '''Returns the root of the set of slots unified with this one, pointing each slot on the way
+directly at the root.'''
+        root = self
+        while root._parent is not None:
+            root = root._parent
+            
+        slot = self
+        while slot is not root:
+            slot._parent, slot = root, slot._parent
+            
+        return root
         
     @property
     def head(self): 
-        return self._head
+        return self.find()._head
         
     def unify_heads(self, other):
+        '''Unifies this slot with _other_, after which every slot unified with either shares the Head
+of _other_.'''
         assert isinstance(other, Slot), "unify_heads is an operation between two Slots."
-        self.dependers |= other.dependers
-        
-        for dep in self.dependers:
-            dep._head = other._head
-            dep.dependers = self.dependers
+        root, other_root = self.find(), other.find()
+        if root is other_root: return
+        
+        head = other_root._head
+        # Union by rank: the shallower tree goes under the root of the deeper
+        if root._rank < other_root._rank:
+            root, other_root = other_root, root
+        elif root._rank == other_root._rank:
+            root._rank += 1
+            
+        other_root._parent = root
+        root._head = head
         
     def is_filled(self):
         return self.head.lex is not None
@@ -88,7 +112,11 @@ class Slot(object):
         
     if config.curly_vars:
         def __repr__(self):
-            head = ('=' + self.head.lex) if self.head.lex else ''
+            if not self.head.lex: head = ''
+            elif isinstance(self.head.lex, list):
+                head = '=<' + ', '.join(self.head.lex) + '>'
+            else: head = '=' + self.head.lex
+            
             return "{" + self.var + head + "}"
     else:
         def __repr__(self):
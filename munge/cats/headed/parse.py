@@ -12,8 +12,10 @@ from itertools import *
 from munge.lex.lex import preserving_split
 from munge.cats.nodes import BACKWARD, FORWARD, ALL
 from munge.cats.headed.nodes import AtomicCategory, ComplexCategory, Slot
+from munge.cats.canonical import canonical
 from munge.util.parse_utils import *
 from munge.util.exceptions import CatParseException
+from munge.util.intern_utils import intern_string
 
 from munge.util.deco_utils import memoised
 
@@ -23,8 +25,74 @@ def parse_alias(toks):
     toks.next() # skip over the '~'
     return toks.next()
 
-# IMPORTANT: memoised is off for headed categories
+# IMPORTANT: memoised is off for headed categories, since their slots are unified and their
+# structure rewritten in-place. Instead, each category string is parsed once into a template: a
+# nested tuple holding the atoms, features, slashes, modes and variables of the category, which
+# parse_category then instantiates into fresh categories with fresh slots.
+Templates = {}
+
 def parse_category(cat_string):
+    template = Templates.get(cat_string, None)
+    if template is None:
+        template = Templates[cat_string] = make_template(parse_uncached_category(cat_string))
+
+    return instantiate(template)
+
+def make_template(cat):
+    '''Returns the template for _cat_: a triple of the template for its root, the variable name of
+each distinct Slot it contains, and its canonical category (see munge.cats.canonical), which each
+category made from the template carries as its _canonical_hint_.'''
+    slot_vars = []
+    return make_template_node(cat, {}, slot_vars), tuple(slot_vars), canonical(cat)
+
+def make_template_node(cat, slot_indices, slot_vars):
+    # Categories share a Slot exactly when they share a variable, so the template refers to slots by
+    # index in order to preserve that sharing
+    slot_index = slot_indices.get(id(cat.slot), None)
+    if slot_index is None:
+        slot_index = slot_indices[id(cat.slot)] = len(slot_vars)
+        slot_vars.append(cat.slot.var)
+
+    if cat.is_leaf():
+        return (cat.cat, tuple(cat.features), slot_index, cat.alias)
+    else:
+        return (make_template_node(cat._left, slot_indices, slot_vars), cat.direction,
+                make_template_node(cat._right, slot_indices, slot_vars), cat.mode,
+                tuple(cat.features), slot_index, cat.alias)
+
+def instantiate(template, rename_var=None):
+    '''Returns a fresh category from _template_ (see make_template). If _rename_var_ is given, it is
+called with the variable name of each distinct slot, in pre-order, and returns the name to give the
+slot instead.'''
+    root, slot_vars, canonical_hint = template
+    if rename_var: slot_vars = map(rename_var, slot_vars)
+
+    ret = instantiate_node(root, [Slot(var) for var in slot_vars])
+    ret.canonical_hint = canonical_hint
+    return ret
+
+def instantiate_node(node, slots):
+    # Bypasses the constructors, which would each allocate a Slot only to have it replaced
+    if len(node) == 4:
+        cat, features, slot_index, alias = node
+
+        ret = AtomicCategory.__new__(AtomicCategory)
+        ret.cat = cat
+    else:
+        left, direction, right, mode, features, slot_index, alias = node
+
+        ret = ComplexCategory.__new__(ComplexCategory)
+        ret._left, ret.direction, ret._right = (instantiate_node(left, slots), direction,
+                                                instantiate_node(right, slots))
+        ret.mode, ret.label = mode, None
+        ret.slash = ComplexCategory.slash_strings[direction]
+
+    ret.features = list(features)
+    ret.slot = slots[slot_index]
+    ret.alias = alias
+    return ret
+
+def parse_uncached_category(cat_string):
     # Return each mode symbol as a token too when encountered.
     # Important: avoid using mode symbols in atomic category labels.
     toks = preserving_split(cat_string, "(\\/)[]{}~")# + ComplexCategory.mode_symbols)
@@ -38,7 +106,7 @@ def parse_category(cat_string):
     return result
 
 def parse_atom(toks, vars):
-    atom = toks.next()
+    atom = intern_string(toks.next())
 
     features = []
     var = None
@@ -71,7 +139,7 @@ def is_direction(char):
     return char in ('/', '\\')
 
 def parse_feature(toks):
-    return with_squares(lambda toks: toks.next(), toks)
+    return with_squares(lambda toks: intern_string(toks.next()), toks)
     
 def parse_var(toks):
     return with_braces(lambda toks: toks.next(), toks)
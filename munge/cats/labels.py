@@ -34,40 +34,41 @@ def _label_result(l, r, p):
     
 #    print '< %s %s %s %s' % (app, L, R, p.cat)
 
+# For each rule, the (source, destination) pairs of paths (see subcategory) along which label_result carries
+# labels from the child _prev_ to the result, when _prev_ is the left child and when it is the right child
+LabelCarries = {
+    'fwd_appl':   ( (('l', ''),), () ),                       # _X/Y_ Y -> X
+    'bwd_appl':   ( (), (('l', ''),) ),                       # Y _X\Y_ -> X
+    'fwd_comp':   ( (('l', 'l'),), (('r', 'r'),) ),           # _X/Y_ Y/Z -> X/Z, X/Y _Y/Z_ -> X/Z
+    'bwd_comp':   ( (('r', 'r'),), (('l', 'l'),) ),           # _Y\Z_ X\Y -> X\Z, Y\Z _X\Y_ -> X\Z
+    'fwd_raise':  ( (('', 'rr'),), (('', 'rr'),) ),           # X -> T|(T|X)
+    'fwd_subst':  ( (('ll', 'l'), ('r', 'r')), (('r', 'r'),) ), # _(X/Y)/Z_ Y/Z -> X/Z, (X/Y)/Z _Y/Z_ -> X/Z
+    'bwd_subst':  ( (('r', 'r'),), (('ll', 'l'), ('r', 'r')) ), # _Y/Z_ (X\Y)/Z -> X/Z, Y/Z _(X\Y)/Z_ -> X/Z
+}
+LabelCarries['fwd_xcomp'] = LabelCarries['fwd_comp']
+LabelCarries['bwd_xcomp'] = LabelCarries['bwd_comp']
+LabelCarries['bwd_raise'] = LabelCarries['fwd_raise']
+LabelCarries['fwd_xsubst'] = LabelCarries['fwd_subst']
+LabelCarries['bwd_xsubst'] = LabelCarries['bwd_subst']
+
+def subcategory(cat, path):
+    '''Returns the sub-category of _cat_ reached by following _path_, a string of 'l' (result) and 'r'
+(argument) steps, together with its position among the slashes of _cat_ in pre-order.'''
+    position = 0
+    for step in path:
+        if step == 'l':
+            cat, position = cat.left, position + 1
+        else:
+            cat, position = cat.right, position + 1 + cat.left.slash_count()
+    return cat, position
+
 def label_result(cur, prev, app, flipped):
     '''This labels the slashes of the results of combinatory rule applications in a way that 
     preserves the indices attached to the slashes of its arguments.
     For example, (X\\1)/0Y Y/0Z -> (X\\1)/0Z.
     _flipped_ is true when prev was the right child of its parent.'''
-
-    if app == "fwd_appl":
-        if (not flipped) and prev.left.label: # _X/Y_ Y -> X
-            cur.labelled(prev.left.label)
-    elif app == "bwd_appl":
-        if flipped and prev.left.label: # Y _X\Y_ -> X
-            cur.labelled(prev.left.label)
-    elif app in ("fwd_comp", "fwd_xcomp"):
-        if flipped: # X/Y _Y/Z_ -> X/Z 
-            if prev.right.label: cur.right.labelled(prev.right.label)
-        else: # _X/Y_ Y/Z -> X/Z
-            if prev.left.label: cur.left.labelled(prev.left.label)
-    elif app in ("bwd_comp", "bwd_xcomp"):
-        if flipped: # Y\Z _X\Y_ -> X\Z
-            if prev.left.label: cur.left.labelled(prev.left.label)
-        else: # _Y\Z_ X\Y -> X\Z
-            if prev.right.label: cur.right.labelled(prev.right.label)
-    elif app in ("fwd_raise", "bwd_raise"): # X -> T|(T|X)
-        if prev.label: cur.right.right.labelled(prev.label)
-    elif app in ("fwd_subst", "fwd_xsubst"):
-        if flipped: # (X/Y)/Z _Y/Z_ -> X/Z
-            if prev.right.label: cur.right.labelled(prev.right.label)
-        else: # _(X/Y)/Z_ Y/Z -> X/Z
-            if prev.left.left.label: cur.left.labelled(prev.left.left.label)
-            if prev.right.label: cur.right.labelled(prev.right.label)
-    elif app in ("bwd_subst", "bwd_xsubst"):
-        if flipped: # Y/Z _(X\Y)/Z_ -> X/Z
-            if prev.left.left.label: cur.left.labelled(prev.left.left.label)
-            if prev.right.label: cur.right.labelled(prev.right.label)
-        else: # _Y/Z_ (X\Y)/Z -> X/Z
-            if prev.right.label: cur.right.labelled(prev.right.label)
-
+    for src_path, dest_path in LabelCarries.get(app, ((), ()))[flipped]:
+        label = subcategory(prev, src_path)[0].label
+        # The label 0 is not carried
+        if label:
+            subcategory(cur, dest_path)[0].labelled(label)
@@ -22,6 +22,10 @@ ShowModes = config.use_modes
 class Featured(object):
     '''Represents an object with a _features_ field. The class this is mixed into must provide
 a method clone_with(features) which returns a copy of itself with the given features added.'''
+    # A canonical category which this category was made from, and probably still matches (see
+    # munge.cats.canonical)
+    canonical_hint = None
+
     def __init__(self, features=None):
         self.features = features or []
         
@@ -13,6 +13,8 @@ from munge.lex.lex import preserving_split
 from munge.cats.nodes import BACKWARD, FORWARD, BAR, AtomicCategory, ComplexCategory, ALL
 from munge.util.parse_utils import *
 from munge.util.exceptions import CatParseException
+from munge.util.intern_utils import intern_string
+from munge.cats.canonical import canonical
 
 from munge.util.deco_utils import memoised
 
@@ -29,10 +31,12 @@ tokens remain.'''
     result = parse_compound(toks)
     ensure_stream_exhausted(toks, 'cats.parse_category')
 
+    # The memo table keeps _result_ alive, so its canonical category can be found by identity
+    canonical.remember(result)
     return result
 
 def parse_atom(toks):
-    atom = toks.next()
+    atom = intern_string(toks.next())
 
     features = []
     while toks.peek() == '[':
@@ -57,7 +61,7 @@ def is_direction(char):
     return char in ('/', '\\', '|')
 
 def parse_feature(toks):
-    return with_squares(lambda toks: toks.next(), toks)
+    return with_squares(lambda toks: intern_string(toks.next()), toks)
     
 def parse_compound_rhs(toks):
     '''Parses and returns the slash, mode and right hand side of a compound category.'''
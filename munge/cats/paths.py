@@ -11,7 +11,20 @@ from itertools import starmap, tee
 from munge.util.iter_utils import each_pair
 from munge.util.list_utils import preserving_zip
 from munge.cats.trace import analyse
-from munge.cats.labels import label_result
+from munge.cats.labels import label_result, LabelCarries, subcategory
+
+def node_category(node):
+    '''Returns the category of a CCGbank node (munge.ccg.nodes) or an augmented PTB node
+(munge.penn.aug_nodes).'''
+    try:
+        return node.category
+    except AttributeError:
+        return node.cat
+
+def is_same_node(node, other):
+    '''Determines whether _node_ and _other_ are the same node, where either may be a weak proxy
+(munge.ccg.nodes holds its parent through one), by comparing the identity of their first children.'''
+    return node is other or (not node.is_leaf() and not other.is_leaf() and node[0] is other[0])
 
 def simple_path_to_root(node):
     '''Returns a list of the nodes from the given node to the root.'''
@@ -43,9 +56,9 @@ the path of a node and its sibling from the given _node_ up to the root.
 If f0 is true, then r0 is the 'focus' of the triple. Otherwise, l0 is. The focus
 is the node which actually lies on the sought path, the non-focus node is its sibling.'''
     while node.parent:
-        if node.parent.count() > 1 and node.parent[1] is node:
+        if node.parent.count() > 1 and is_same_node(node.parent[1], node):
             yield node.parent[0], node, True
-        elif node.parent[0] is node:
+        elif is_same_node(node.parent[0], node):
             yield node, node.parent[1] if node.parent.count() > 1 else None, False
 
         node = node.parent
@@ -57,7 +70,7 @@ def category_path_to_root(node):
     '''Identical to path_to_root, except that the _categories_ of each node on
 the path are returned, instead of the nodes themselves.'''
     def extract_categories(left, right, was_flipped):
-        return (left.category, right.category if right else None, was_flipped)
+        return (node_category(left), node_category(right) if right else None, was_flipped)
 
     return starmap(extract_categories, path_to_root(node))
     
@@ -65,7 +78,7 @@ def cloned_category_path_to_root(node):
     '''Identical to path_to_root, except that copies of the _categories_ of each node on
 the path are returned, instead of the nodes themselves.'''
     def extract_categories(left, right, was_flipped):
-        return (left.category.clone(), right.category.clone() if right else None, was_flipped)
+        return (node_category(left).clone(), node_category(right).clone() if right else None, was_flipped)
 
     return starmap(extract_categories, path_to_root(node))
 
@@ -82,45 +95,108 @@ def applications_per_slash(node, examine_modes=False):
     '''Returns a list of length _n_, the number of slashes in the category of _node_.
 Index _i_ in this list denotes the combinatory rule which consumed slash _i_.'''
     return applications_per_slash_with_path(cloned_category_path_to_root(node),
-                                            node.category.slash_count(),
-                                            examine_modes)
+                                            node_category(node).slash_count(),
+                                            examine_modes, cloned=True)
+
+def has_labelled_slash(cat):
+    return cat.is_complex() and any(label is not None for (_, label) in cat.slashes())
 
-def applications_per_slash_with_path(orig_path, slash_count, examine_modes=False):
+def applications_per_slash_with_path(path, slash_count, examine_modes=False, rules=None, cloned=False):
     '''Given a category, returns a list whose index _i_ is the rule which consumed its _i_th slash, or None
-if it was not consumed.'''
-    result = []
+if it was not consumed. If _rules_ is given, it yields the rule used at each step of the path, which
+is then not analysed again. If _cloned_ is true, the categories on _path_ are unlabelled copies (see
+cloned_category_path_to_root), so no slash can be consumed once the labels have run out.'''
+    result = [None] * slash_count
+    nconsumed = 0
+    first = True
+
+    # The slashes of the first category are labelled with their indices, and label_result carries
+    # the labels up the path, so that the slash consumed at each step is identified by its label.
+    # This labels the categories in-place.
+    for (prev_l, prev_r, prev_was_flipped), (l, r, was_flipped) in each_pair(path):
+        if first:
+            if prev_was_flipped and prev_r:
+                prev_r.labelled()
+            elif not prev_was_flipped:
+                prev_l.labelled()
+            first = False
+
+        cur      = r      if was_flipped      else l
+        prev_cur = prev_r if prev_was_flipped else prev_l
+
+        rule = rules.next() if rules else analyse(prev_l, prev_r, cur, examine_modes)
+        label_result(cur, prev_cur, rule, prev_was_flipped)
+
+        if   rule == 'fwd_appl': consumed_category = prev_l
+        elif rule == 'bwd_appl': consumed_category = prev_r
+        elif rule in ('fwd_comp', 'bwd_comp', 'bwd_xcomp', 'fwd_xcomp'): consumed_category = prev_cur
+        else: consumed_category = None
+
+        if consumed_category:
+            slash = consumed_category.label
+            # The first rule to consume a slash is its consumer
+            if slash is not None and slash < slash_count and result[slash] is None:
+                result[slash] = rule
+                nconsumed += 1
+                if nconsumed == slash_count: break
+
+        if cloned and not has_labelled_slash(cur): break
+
+    return result
 
-    for slash in xrange(slash_count):
-        consumer = None # the rule which consumed this slash, if any
-        first = True
+def carry_labels(cur, labels, prev, prev_labels, rule, flipped):
+    '''Carries the labels of the slashes of _prev_ to the slashes of _cur_ as label_result would, where
+_labels_ and _prev_labels_ hold a dict for each slash of _cur_ and _prev_ in pre-order, mapping each
+leaf to the label which the path from that leaf gives the slash.'''
+    for src_path, dest_path in LabelCarries.get(rule, ((), ()))[flipped]:
+        src, src_position = subcategory(prev, src_path)
+        if not src.is_complex(): continue
         
-        # We need to copy the path for each slash, because in each iteration we label
-        # the categories in-place.
-        orig_path, path = tee(orig_path, 2)
+        for leaf, label in prev_labels[src_position].iteritems():
+            # label_result does not carry the label 0
+            if not label: continue
+            
+            dest, dest_position = subcategory(cur, dest_path)
+            # labelled() numbers the slashes of _dest_ in pre-order from _label_
+            for offset in xrange(dest.slash_count()):
+                labels[dest_position + offset][leaf] = label + offset
+
+def slash_consumers(root, examine_modes=False):
+    '''Returns a list holding applications_per_slash(leaf) for each leaf under _root_, in order, computed
+in a single bottom-up pass. Rather than labelling a copy of each category on the path from each leaf,
+each slash of each node carries the label given to it by every leaf whose path passes through the node
+(see carry_labels), so each production is analysed, and each category labelled, once.'''
+    consumers = []
+    
+    def label_slashes(node):
+        cat = node_category(node)
+        if node.is_leaf():
+            leaf = len(consumers)
+            consumers.append([None] * cat.slash_count())
+            return [ {leaf: slash} for slash in xrange(cat.slash_count()) ]
+            
+        kids = list(node)
+        kid_cats = map(node_category, kids)
+        kid_labels = map(label_slashes, kids)
+        rule = analyse(kid_cats[0], kid_cats[1] if len(kids) > 1 else None, cat, examine_modes)
         
-        for (prev_l, prev_r, prev_was_flipped), (l, r, was_flipped) in each_pair(path):
-            if first:
-                if prev_was_flipped and prev_r:
-                    prev_r.labelled()
-                elif not prev_was_flipped:
-                    prev_l.labelled()
-                first = False
-
-            cur      = r      if was_flipped      else l
-            prev_cur = prev_r if prev_was_flipped else prev_l
-
-            rule = analyse(prev_l, prev_r, cur, examine_modes)
-            label_result(cur, prev_cur, rule, prev_was_flipped)
-
-            if   rule == 'fwd_appl': consumed_category = prev_l
-            elif rule == 'bwd_appl': consumed_category = prev_r
-            elif rule in ('fwd_comp', 'bwd_comp', 'bwd_xcomp', 'fwd_xcomp'): consumed_category = prev_cur
-            else: consumed_category = None
-
-            if consumed_category and consumed_category.label == slash:
-                consumer = rule
-                break
-
-        result.append( consumer )
-
-    return result
+        # The kids whose outermost slash the rule consumes
+        if   rule == 'fwd_appl': consumed = kid_labels[:1]
+        elif rule == 'bwd_appl': consumed = kid_labels[1:2]
+        elif rule in ('fwd_comp', 'bwd_comp', 'bwd_xcomp', 'fwd_xcomp'): consumed = kid_labels[:2]
+        else: consumed = ()
+        
+        for labels in consumed:
+            if not labels: continue
+            # The first rule to consume a slash is its consumer
+            for leaf, slash in labels[0].iteritems():
+                if slash < len(consumers[leaf]) and consumers[leaf][slash] is None:
+                    consumers[leaf][slash] = rule
+        
+        labels = [ {} for _ in xrange(cat.slash_count()) ]
+        for flipped, (kid_cat, prev_labels) in enumerate(zip(kid_cats[:2], kid_labels[:2])):
+            carry_labels(cat, labels, kid_cat, prev_labels, rule, flipped)
+        return labels
+        
+    label_slashes(root)
+    return consumers
@@ -9,9 +9,58 @@
 
 from munge.cats.nodes import APPLY, COMP, NULL, ALL, BACKWARD, FORWARD
 from munge.cats.cat_defs import *
+from munge.cats.canonical import canonical
+from munge.util.deco_utils import memoised
+
+# The rules below compare each category against many constants. Since the arguments of
+# analyse_uncached are canonical (see munge.cats.canonical), each comparison is a single integer
+# comparison. The canonical constants are bound only in this module, as other users of cat_defs may
+# modify them.
+S, N, NP, QP, Sdcl, conj, SbNP, SfNP, NPbNP, NPfNP, NbN, NfN, SbS, SfS, SbNPbSbNP, SbNPfSbNP, \
+SbNPfNP, SfSfNP, SfSfS = map(canonical,
+    (S, N, NP, QP, Sdcl, conj, SbNP, SfNP, NPbNP, NPfNP, NbN, NfN, SbS, SfS, SbNPbSbNP, SbNPfSbNP,
+     SbNPfNP, SfSfNP, SfSfS))
+
+@memoised
+def C(cat_string):
+    return canonical(parse_category(cat_string))
+
+class RuleCache(object):
+    '''Maps each production [l r -> cur] to the rule which analyse determined was used in it. The
+rules consult the features, slashes and modes of the categories, and the cn_rules config setting, but
+not their heads, aliases or slash labels, so productions are keyed on the canonical IDs of their categories.'''
+    def __init__(self):
+        self.rules = {}
+        self.reset()
+
+    def reset(self):
+        self.nhits = self.nmisses = 0
+
+    def clear(self):
+        self.rules.clear()
+        self.reset()
+
+    def report(self):
+        return "%d of %d productions analysed were found in the rule cache; %d distinct productions." % (
+            self.nhits, self.nhits + self.nmisses, len(self.rules))
+
+rule_cache = RuleCache()
 
 def analyse(l, r, cur, examine_modes=False):
     '''Determines which parser rule was used in the production [l r -> cur].'''
+    l, cur = canonical(l), canonical(cur)
+    if r: r = canonical(r)
+
+    key = (l.id, r.id if r else None, cur.id, examine_modes, config.cn_rules)
+    try:
+        rule = rule_cache.rules[key]
+        rule_cache.nhits += 1
+    except KeyError:
+        rule = rule_cache.rules[key] = analyse_uncached(l, r, cur, examine_modes)
+        rule_cache.nmisses += 1
+    return rule
+
+def analyse_uncached(l, r, cur, examine_modes=False):
     return (try_unary_rules(l, r, cur) if not r else
             try_binary_rules(l, r, cur) or 
             try_application(l, r, cur, examine_modes) or
@@ -246,7 +295,7 @@ def try_absorption(l, r, cur):
             # conj X -> X[cur]
             if (l.cat in ("conj", "PU", "LCM") or l.cat in (",",)) and r == cur: return "conj_absorb"
 
-        if cur == SbNPbSbNP and l.cat == "," and str(r) == "NP": # , NP -> (S\NP)\(S\NP)
+        if cur == SbNPbSbNP and l.cat == "," and r.is_leaf() and r.cat == "NP" and not r.features: # , NP -> (S\NP)\(S\NP)
             return "appositive_comma_absorb"
         if cur == N and l == conj and r == N:
             return "funny_conj" # conj N -> N is the funny conj rule
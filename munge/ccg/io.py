@@ -13,13 +13,35 @@ from itertools import imap, islice
 from munge.util.exceptions import CCGbankParseException
 from munge.ccg.parse import parse_tree
 from munge.io.single import SingleReader
-from munge.util.str_utils import nth_occurrence
+from munge.trees.traverse import text
+from munge.io.offsets import read_derivation_text
 
 class Derivation(object):
-    '''Represents a single derivation inside a CCGbank document.'''
-    def __init__(self, sec_no, doc_no, der_no, derivation):
+    '''Represents a single derivation inside a CCGbank document. As with munge.penn.io.Derivation, the
+derivation may be given as unparsed _text_, which is only parsed when first accessed.'''
+    def __init__(self, sec_no, doc_no, der_no, derivation, text=None):
         self.sec_no, self.doc_no, self.der_no = sec_no, doc_no, der_no
-        self.derivation = derivation
+        self._derivation = derivation
+        self.text = text
+        
+    def get_derivation(self):
+        if self._derivation is None and self.text is not None:
+            self._derivation = parse_tree(self.text)
+        return self._derivation
+    def set_derivation(self, derivation):
+        self._derivation = derivation
+        self.text = None
+    derivation = property(get_derivation, set_derivation)
+    
+    # The fields of a leaf are <L cat pos pos lex cat>
+    LeafRegex = re.compile(r'<L \S+ \S+ \S+ (\S+) \S+>')
+    
+    def tokens(self):
+        '''Returns the lexical item at each leaf, reading them from the unparsed text if the derivation
+has not yet been parsed.'''
+        if self._derivation is None and self.text is not None:
+            return self.LeafRegex.findall(self.text)
+        return text(self.derivation)
         
     def label(self): 
         '''Returns a label representing this derivation.'''
@@ -44,9 +66,7 @@ class Derivation(object):
         matches = re.match(r'ID=wsj_(\d\d)(\d\d).(\d+)', header)
         if matches and len(matches.groups()) == 3:
             sec_no, doc_no, der_no = [int(i) for i in matches.groups()]
-            derivation = parse_tree(deriv_string)
-        
-            return Derivation(sec_no, doc_no, der_no, derivation)
+            return Derivation(sec_no, doc_no, der_no, None, text=deriv_string)
 
         raise CCGbankParseException, "Malformed CCGbank header: %s" % header
 
@@ -66,19 +86,21 @@ class CCGbankReader(SingleReader):
 
         SingleReader.__init__(self, filename)
         
+    HeaderRegex = re.compile(r'^ID=wsj_\d{4}\.(\d+) ')
+    @classmethod
+    def derivation_key(cls, line, n):
+        '''Each header line begins the derivation whose number it gives.'''
+        matches = cls.HeaderRegex.match(line)
+        if matches: return int(matches.group(1))
+        
     def derivation_with_index(self, filename, index=None):
         self.file = open(filename, 'r')
         
-        base = imap(lambda line: line.rstrip(), self.file.xreadlines())
         if index:
-            lines = nth_occurrence(base,
-                                  N=1,
-                                  # put a space after the pattern to ensure we match the whole token
-                                  when=lambda line: re.match(r"^ID=wsj_%02d%02d.%d " % (self.sec_no, self.doc_no, index), line),
-                                  until=lambda line: re.match(r"^ID", line))
-            return iter(lines)
+            text = read_derivation_text(filename, index, self.derivation_key)
+            return imap(lambda line: line.rstrip(), text.splitlines())
         else:
-            return base
+            return imap(lambda line: line.rstrip(), self.file.xreadlines())
                           
     def __getitem__(self, index):
         '''Index-based retrieval of a derivation.'''
@@ -9,6 +9,7 @@
 
 from munge.lex.lex import preserving_split
 from munge.util.config import config
+from munge.util.intern_utils import intern_string
 
 if config.hatted_cats:
     from munge.cats.hatted.parse import parse_category
@@ -25,7 +26,7 @@ class CCGNodeFactory(object):
     node_class = Node
     leaf_class = Leaf
 
-def parse_tree(tree_string, node_factory=CCGNodeFactory):
+def python_parse_tree(tree_string, node_factory=CCGNodeFactory):
     parser = CCGParser(node_factory)
     
     toks = preserving_split(tree_string, "()<>", suppressors='<>')
@@ -35,6 +36,16 @@ def parse_tree(tree_string, node_factory=CCGNodeFactory):
 
     return deriv
     
+def c_parse_tree(tree_string, node_factory=CCGNodeFactory):
+    return ccgparse.parse_tree(tree_string, parse_category, node_factory.node_class, node_factory.leaf_class,
+                               intern_string)
+    
+try:
+    import ccgparse
+    parse_tree = c_parse_tree
+except ImportError:
+    parse_tree = python_parse_tree
+    
 class CCGParser(object):
     def __init__(self, node_factory=CCGNodeFactory):
         self.node_factory = node_factory
@@ -68,8 +79,8 @@ class CCGParser(object):
         shift_and_check( 'L', toks )
 
         cat_string, pos1, pos2, lex, catfix = \
-                toks.next(), toks.next(), \
-                toks.next(), toks.next(), toks.next()
+                toks.next(), intern_string(toks.next()), \
+                intern_string(toks.next()), intern_string(toks.next()), intern_string(toks.next())
         cat = parse_category(cat_string)
 
         return self.node_factory.leaf_class(cat, pos1, pos2, lex, catfix, parent)
@@ -78,7 +89,7 @@ class CCGParser(object):
         shift_and_check( 'T', toks )
 
         cat_string, head_index, child_count = \
-                toks.next(), toks.next(), toks.next()
+                toks.next(), intern_string(toks.next()), intern_string(toks.next())
         cat = parse_category(cat_string)
         #head_index = int(head_index)
 
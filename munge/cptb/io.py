@@ -10,6 +10,7 @@
 from munge.penn.parse import parse_tree, AugmentedPennParser
 from munge.io.single import SingleReader
 from munge.util.str_utils import nth_occurrence
+from munge.trees.traverse import text
 from munge.util.exceptions import CPTBParseException
 import re, os
 
@@ -26,6 +27,9 @@ class Derivation(object):
         
     def label(self):
         return "%0d:%d(%d)" % self.spec_tuple()
+        
+    def tokens(self):
+        return text(self.derivation)
     
 import sys
 from sgmllib import SGMLParser    
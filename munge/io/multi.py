@@ -7,8 +7,10 @@
 # supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
 # notify the maintainer Daniel Tse <cncandc@gmail.com>.
 
-import os, re
+import os, re, sys
 from glob import glob
+from threading import Thread, Event
+from Queue import Queue, Empty
 from munge.io.guess import GuessReader
 from munge.util.err_utils import warn, info, err
 
@@ -27,24 +29,24 @@ modification of derivations, nor corpus output.'''
 
         self.verbose = verbose
 
-    def __iter__(self):
-        # TODO: duplication
+    def document_paths(self):
+        '''Yields the path of each document in the corpus, in the order they would be read.'''
         for section_path in self.sections:
             # If _topdir_ has directories under, expand to use the files it contains
             if os.path.isdir(section_path):
-                docs = glob(os.path.join(section_path, '*'))
-                for doc_path in docs:
-                    if self.verbose: info("Processing %s...", doc_path)
-                    reader = self.reader(doc_path)
-                    for deriv_bundle in reader:
-                        yield deriv_bundle
-                    del reader
+                for doc_path in glob(os.path.join(section_path, '*')):
+                    yield doc_path
             # Otherwise _topdir_ is flat: read the files it contains
             else:
-                reader = self.reader(section_path)
-                for deriv_bundle in reader:
-                    yield deriv_bundle
-                del reader
+                yield section_path
+
+    def __iter__(self):
+        for doc_path in self.document_paths():
+            if self.verbose: info("Processing %s...", doc_path)
+            reader = self.reader(doc_path)
+            for deriv_bundle in reader:
+                yield deriv_bundle
+            del reader
 
     def no_getitem_setitem(self, *args):
         raise NotImplementedError("get and setitem unavailable with MultiGuessReader.")
@@ -61,6 +63,18 @@ class DirFileGuessReader(object):
         self.verbose = verbose
         self.reader_class = reader_class
 
+    def document_paths(self):
+        '''Yields the path of each document which would be read, so that documents can be
+distributed over worker processes. A file specifier (including any trailing :N index) is
+yielded unchanged.'''
+        path, index = padded_rsplit(self.path, ':', 1)
+        
+        if os.path.isdir(path):
+            for doc_path in MultiGuessReader(path, verbose=self.verbose).document_paths():
+                yield doc_path
+        else:
+            yield self.path
+
     def __iter__(self):
         path, index = padded_rsplit(self.path, ':', 1)
 
@@ -82,4 +96,68 @@ class DirFileGuessReader(object):
                 reader = GuessReader(self.path)
 
         for deriv_bundle in reader:
-            yield deriv_bundle
\ No newline at end of file
+            yield deriv_bundle
+
+def parse_now(bundle):
+    '''Parses the derivation in _bundle_ if its reader deferred parsing. A derivation which fails to
+parse is left unparsed, so that the error is raised where the derivation is first used, as it would be
+if it had not been parsed early.'''
+    try:
+        bundle.derivation
+    except Exception:
+        pass
+
+class PrefetchingReader(object):
+    '''Reader which behaves like DirFileGuessReader, but reads and parses up to _depth_ documents ahead
+on a background thread, so that the filters need not wait on I/O.'''
+    def __init__(self, path, depth=2, verbose=True, reader_class=None):
+        self.path = path
+        self.depth = depth
+        self.verbose = verbose
+        self.reader_class = reader_class
+        
+    # Put on the queue after the last document
+    Done = object()
+        
+    def read_ahead(self, queue, stopped):
+        for doc_path in DirFileGuessReader(self.path, verbose=self.verbose).document_paths():
+            if stopped.is_set(): return
+            
+            try:
+                bundles = list(DirFileGuessReader(doc_path, verbose=False, reader_class=self.reader_class))
+                # Readers only split the text, so parse here rather than in the consuming thread
+                for bundle in bundles: parse_now(bundle)
+                queue.put( (doc_path, bundles, None) )
+            except Exception:
+                # Re-raised in the consuming thread when this document is reached
+                queue.put( (doc_path, None, sys.exc_info()) )
+                return
+                
+        queue.put(self.Done)
+        
+    def __iter__(self):
+        queue, stopped = Queue(maxsize=self.depth), Event()
+        
+        reader_thread = Thread(target=self.read_ahead, args=(queue, stopped))
+        reader_thread.daemon = True
+        reader_thread.start()
+        
+        try:
+            while True:
+                item = queue.get()
+                if item is self.Done: break
+                
+                doc_path, bundles, exc_info = item
+                if exc_info: raise exc_info[0], exc_info[1], exc_info[2]
+                
+                if self.verbose: info("Processing %s...", doc_path)
+                for deriv_bundle in bundles:
+                    yield deriv_bundle
+        finally:
+            # If the consumer stops early, unblock the reader thread so that it can exit
+            stopped.set()
+            while reader_thread.is_alive():
+                try:
+                    queue.get_nowait()
+                except Empty:
+                    reader_thread.join(0.01)
@@ -0,0 +1,96 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''Sidecar indices mapping each derivation number in a document to the range of bytes it occupies,
+so that a single derivation (file:N) can be read without scanning the document.'''
+
+import os
+
+def offsets_filename(filename):
+    '''Returns the name of the index for _filename_. The index is a dotfile beside the document, so
+that it is not picked up when a directory of documents is read.'''
+    dirname, basename = os.path.split(filename)
+    return os.path.join(dirname, '.%s.offsets' % basename)
+
+def stamp(filename):
+    '''The modification time and size of _filename_, which an index records to detect staleness.'''
+    stat = os.stat(filename)
+    return repr(stat.st_mtime), stat.st_size
+
+def build_offsets(filename, derivation_key):
+    '''Scans _filename_, returning a dict mapping derivation numbers to (start, end) byte ranges.
+_derivation_key_ is called on each line with the 1-based count of derivations begun before it, and
+returns the number of the derivation the line begins, or None if the line continues the current
+derivation.'''
+    offsets = {}
+    key = start = None
+    count = 0
+    position = 0
+
+    with open(filename, 'rb') as file:
+        for line in file:
+            line_key = derivation_key(line, count+1)
+            if line_key is not None:
+                if key is not None: offsets[key] = (start, position)
+                key, start = line_key, position
+                count += 1
+            position += len(line)
+
+    if key is not None: offsets[key] = (start, position)
+    return offsets
+
+def read_offsets(index_filename, expected_stamp):
+    '''Returns the offsets stored in _index_filename_, or None if it is missing, malformed, or was
+built from a different version of the document.'''
+    try:
+        with open(index_filename, 'r') as file:
+            mtime, size = file.readline().split()
+            if (mtime, int(size)) != expected_stamp: return None
+
+            offsets = {}
+            for line in file:
+                key, start, end = map(int, line.split())
+                offsets[key] = (start, end)
+            return offsets
+    except (IOError, ValueError):
+        return None
+
+def write_offsets(index_filename, file_stamp, offsets):
+    try:
+        with open(index_filename + '.tmp', 'w') as file:
+            print >>file, "%s %d" % file_stamp
+            for key, (start, end) in sorted(offsets.iteritems()):
+                print >>file, "%d %d %d" % (key, start, end)
+        os.rename(index_filename + '.tmp', index_filename)
+    except (IOError, OSError):
+        # The index is only an optimisation, so a read-only corpus is still usable
+        pass
+
+def load_offsets(filename, derivation_key):
+    '''Returns the offset index of _filename_ (see build_offsets), reading it from its sidecar file if
+that is up to date, and otherwise building it and writing it out.'''
+    file_stamp = stamp(filename)
+    index_filename = offsets_filename(filename)
+
+    offsets = read_offsets(index_filename, file_stamp)
+    if offsets is None:
+        offsets = build_offsets(filename, derivation_key)
+        write_offsets(index_filename, file_stamp, offsets)
+    return offsets
+
+def read_derivation_text(filename, index, derivation_key):
+    '''Returns the text of derivation number _index_ in _filename_, or the empty string if there is
+no such derivation.'''
+    offsets = load_offsets(filename, derivation_key)
+    if index not in offsets: return ''
+
+    start, end = offsets[index]
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        return file.read(end - start)
@@ -12,15 +12,19 @@ import re
 
 from munge.penn.parse import parse_tree, PennParser
 from munge.util.err_utils import warn
+from munge.trees.traverse import text
 
 from munge.io.single import SingleReader
-from munge.util.str_utils import nth_occurrence
+from munge.io.offsets import read_derivation_text
 
 class Derivation(object):
-    '''Represents a single derivation inside a PTB document.'''
-    def __init__(self, sec_no, doc_no, der_no, derivation):
+    '''Represents a single derivation inside a PTB document. A reader may instead supply the unparsed
+_text_ of the derivation and a function _parse_ which builds it, in which case the derivation is only
+parsed when first accessed.'''
+    def __init__(self, sec_no, doc_no, der_no, derivation, text=None, parse=None):
         self.sec_no, self.doc_no, self.der_no = sec_no, doc_no, der_no
         self._derivation = derivation
+        self.text, self.parse = text, parse
         
     def spec_tuple(self):
         return (self.sec_no, self.doc_no, self.der_no)
@@ -29,9 +33,25 @@ class Derivation(object):
         '''Returns a label representing this derivation.'''
         return "%0d:%d(%d)" % self.spec_tuple()
         
-    def get_derivation(self): return self._derivation
-    def set_derivation(self, derivation): self._derivation = derivation
+    def get_derivation(self):
+        if self._derivation is None and self.text is not None:
+            self._derivation = self.parse(self.text)
+        return self._derivation
+    def set_derivation(self, derivation):
+        self._derivation = derivation
+        self.text = None
     derivation = property(get_derivation, set_derivation)
+    
+    # Matches each leaf of a bracketing once any {categories} have been removed
+    LeafRegex = re.compile(r'\(\s*[^\s()<>]+\s*(?:<[^<>]*>)?\s+([^\s()<>]+)\s*\)')
+    CategoryRegex = re.compile(r'\{[^{}]*\}')
+    
+    def tokens(self):
+        '''Returns the lexical item at each leaf, reading them from the unparsed text if the derivation
+has not yet been parsed.'''
+        if self._derivation is None and self.text is not None:
+            return self.LeafRegex.findall(self.CategoryRegex.sub('', self.text))
+        return text(self.derivation)
         
     def __str__(self):
         return str(self.derivation)
@@ -42,15 +62,16 @@ class PTBReader(SingleReader):
         SingleReader.__init__(self, filename)
         self.sec_no, self.doc_no = self.determine_sec_and_doc(filename)
         
+    @staticmethod
+    def derivation_key(line, n):
+        '''Each line beginning with an open bracket begins the next derivation.'''
+        if line.startswith('('): return n
+        
     def derivation_with_index(self, filename, index=None):
-        with open(filename, 'r') as file:
-            if index:
-                return self.parse_file(''.join(
-                    nth_occurrence(file.xreadlines(),
-                                      N=index, 
-                                      when=lambda line: re.match(r"^\(", line),
-                                      until=lambda line: re.match(r"^\(", line))))
-            else:
+        if index:
+            return self.parse_file(read_derivation_text(filename, index, self.derivation_key))
+        else:
+            with open(filename, 'r') as file:
                 return self.parse_file(file.read())
         
     @staticmethod
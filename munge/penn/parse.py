@@ -12,6 +12,7 @@ from munge.lex.lex import preserving_split
 from munge.util.parse_utils import with_parens, shift_and_check, ensure_stream_exhausted
 
 from munge.util.config import config
+from munge.util.intern_utils import intern_string
 
 if config.headed_cats:
     from munge.cats.headed.parse import parse_category
@@ -39,7 +40,7 @@ class PennParser(object):
 
     def read_deriv(self, toks, parent=None):
         def body(toks):
-            tag = toks.next()
+            tag = intern_string(toks.next())
             lex = None
 
             kids = []
@@ -48,7 +49,7 @@ class PennParser(object):
                 if toks.peek() == '(':
                     kids.append( self.read_deriv(toks) )
                 else:
-                    lex = toks.next()
+                    lex = intern_string(toks.next())
 
             if (not kids) and lex:
                 return N.Leaf(tag, lex, parent)
@@ -86,8 +87,8 @@ class YZPTBParser(object):
             kids = []
 
             if headedness == 'c':
-                tag = toks.next()
-                lex = toks.next()
+                tag = intern_string(toks.next())
+                lex = intern_string(toks.next())
                 return A.Leaf(tag, lex, category, parent)
             else:
                 if headedness in 's':
@@ -121,7 +122,7 @@ class CategoryPennParser(PennParser):
                 if toks.peek() == '(':
                     kids.append( self.read_deriv(toks) )
                 else:
-                    lex = toks.next()
+                    lex = intern_string(toks.next())
 
             if (not kids) and lex:
                 return A.Leaf(tag, lex, category, parent)
@@ -149,7 +150,7 @@ class PythonAugmentedPennParser(PennParser):
     def read_deriv(self, toks, parent=None):
         def body(toks):
             # HACK
-            tag = toks.next()
+            tag = intern_string(toks.next())
 
             head_index = None
             if toks.peek() == '<' and (not tag == 'PU'):
@@ -170,7 +171,7 @@ class PythonAugmentedPennParser(PennParser):
                 if toks.peek() == '(':
                     kids.append( self.read_deriv(toks) )
                 else:
-                    lex = toks.next()
+                    lex = intern_string(toks.next())
 
             if (not kids) and lex:
                 return A.Leaf(tag, lex, category, parent)
@@ -14,10 +14,13 @@ from munge.penn.parse import parse_tree, AugmentedPennParser
 from munge.io.single import SingleReader
 from munge.util.err_utils import warn
 from itertools import imap
-from munge.util.str_utils import nth_occurrence
+from munge.io.offsets import read_derivation_text
 
 import munge.penn.io as B
 
+def parse_derivation(deriv_string):
+    return parse_tree(deriv_string, AugmentedPennParser)[0]
+    
 class Derivation(B.Derivation):
     '''Represents a single derivation inside a PTB document.'''
     @staticmethod
@@ -25,10 +28,7 @@ class Derivation(B.Derivation):
         matches = re.match(r'ID=wsj_(\d\d)(\d\d).(\d+)', header)
         if matches and len(matches.groups()) == 3:
             sec_no, doc_no, der_no = [int(i) for i in matches.groups()]
-            derivation = parse_tree(deriv_string, AugmentedPennParser)[0]
-
-            ret = Derivation(sec_no, doc_no, der_no, derivation)
-            return ret
+            return Derivation(sec_no, doc_no, der_no, None, text=deriv_string, parse=parse_derivation)
 
         raise CCGbankParseException, "Malformed CCGbank header: %s" % header
         
@@ -38,19 +38,21 @@ class PrefacedPTBReader(B.AugmentedPTBReader):
         self.sec_no, self.doc_no = self.determine_sec_and_doc(filename)
         SingleReader.__init__(self, filename)
         
+    HeaderRegex = re.compile(r'^ID=wsj_\d{4}\.(\d+) ')
+    @classmethod
+    def derivation_key(cls, line, n):
+        '''Each header line begins the derivation whose number it gives.'''
+        matches = cls.HeaderRegex.match(line)
+        if matches: return int(matches.group(1))
+        
     def derivation_with_index(self, filename, index=None):
         self.file = open(filename, 'r')
         
-        base = imap(lambda line: line.rstrip(), self.file.xreadlines())
         if index:
-            lines = nth_occurrence(base,
-                                  N=1,
-                                  # put a space after the pattern to ensure we match the whole token
-                                  when=lambda line: re.match(r"^ID=wsj_%02d%02d.%d " % (self.sec_no, self.doc_no, index), line),
-                                  until=lambda line: re.match(r"^ID", line))
-            return iter(lines)
+            text = read_derivation_text(filename, index, self.derivation_key)
+            return imap(lambda line: line.rstrip(), text.splitlines())
         else:
-            return base
+            return imap(lambda line: line.rstrip(), self.file.xreadlines())
             
     def __iter__(self):
         '''Yields an iterator over this document.'''
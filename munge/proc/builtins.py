@@ -16,4 +16,6 @@ from munge.proc.builtins_impl import (WriteDOT, WritePNG, WritePDF,
                                       NullModeCandidates,
                                       ApplicationModeCandidates,
                                       
-                                      PrettyPrint)
+                                      PrettyPrint,
+                                      InternReport,
+                                      RuleCacheReport)
@@ -168,3 +168,34 @@ class PrettyPrint(Filter):
     opt = "P"
     long_opt = "pp"
     
+    
+from munge.util.intern_utils import intern_string
+class InternReport(Filter):
+    '''Reports how much memory sharing interned strings saved while reading the corpus.'''
+    def __init__(self):
+        Filter.__init__(self)
+        
+    def accept_derivation(self, bundle):
+        # Readers may defer parsing until the derivation is first accessed
+        bundle.derivation
+        
+    def output(self):
+        print intern_string.report()
+        
+    opt = "M"
+    long_opt = "intern-report"
+    
+from munge.cats.canonical import canonical
+from munge.cats.trace import rule_cache
+class RuleCacheReport(Filter):
+    '''Reports how often the other filters in a run found a production in the rule cache of analyse,
+and how many distinct canonical categories they saw.'''
+    def __init__(self):
+        Filter.__init__(self)
+        
+    def output(self):
+        print rule_cache.report()
+        print canonical.report()
+        
+    opt = "Y"
+    long_opt = "rule-cache-report"
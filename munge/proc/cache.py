@@ -0,0 +1,114 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''A content-addressed cache of the result of running a set of filters over each document, so that
+a stage can be re-run by recomputing only those documents whose result could have changed.'''
+
+import os, sys
+import cPickle as pickle
+from hashlib import sha1
+from modulefinder import ModuleFinder
+
+from munge.util.str_utils import padded_rsplit
+from munge.util.config import config
+
+# While a document is being processed, this holds the (filename, text) pairs written by
+# filters through record_output.
+recorded_output = None
+
+def start_recording():
+    global recorded_output
+    recorded_output = []
+
+def stop_recording():
+    '''Stops recording, returning the (filename, text) pairs written since start_recording.'''
+    global recorded_output
+    result, recorded_output = recorded_output, None
+    return result
+
+def record_output(filename, text):
+    '''Filters which write to disk call this with the text appended to _filename_, so that the
+write can be replayed from the cache.'''
+    if recorded_output is not None:
+        recorded_output.append( (filename, text) )
+
+def replay_output(written):
+    '''Re-performs the writes recorded for a document.'''
+    for filename, text in written:
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.exists(dirname): os.makedirs(dirname)
+
+        with open(filename, 'a') as f:
+            f.write(text)
+
+def is_cacheable(filter):
+    '''A filter can be cached if all its effects are recorded: either it declares that it writes only
+through record_output, or its state is merged back into the parent (see Filter.merge).'''
+    return getattr(filter, 'cacheable', False) or filter.merge is not None
+
+def source_files_for(module_names):
+    '''Returns the source files of the given modules, and of each module under the current directory
+which they import.'''
+    finder = ModuleFinder(path=[os.getcwd()])
+    for module_name in module_names:
+        finder.run_script(sys.modules[module_name].__file__.replace('.pyc', '.py'))
+
+    return sorted(set(module.__file__ for module in finder.modules.itervalues()
+                                      if module.__file__ and module.__file__.endswith('.py')))
+
+class StageCache(object):
+    '''Stores the result of processing each document under a key which hashes the document's
+contents, the source of the filters (and the modules they import), the filter arguments, and the
+config file.'''
+    def __init__(self, cache_dir, filter_specs):
+        self.cache_dir = cache_dir
+
+        signature = sha1()
+        # The reader and the processing loop also determine the result
+        module_names = ['munge.proc.trace_core'] + [filter_class.__module__ for (filter_class, _) in filter_specs]
+        for source_file in source_files_for(module_names):
+            with open(source_file, 'r') as f:
+                signature.update(f.read())
+
+        for filter_class, args in filter_specs:
+            signature.update(repr( (filter_class.__name__, tuple(args)) ))
+
+        with open(config.config_file, 'r') as f:
+            signature.update(f.read())
+
+        self.signature = signature.hexdigest()
+
+    def key_for(self, doc_path):
+        key = sha1(self.signature)
+        key.update(doc_path)
+
+        path, _ = padded_rsplit(doc_path, ':', 1)
+        with open(path, 'r') as f:
+            key.update(f.read())
+
+        return key.hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def __contains__(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def __getitem__(self, key):
+        with open(self.path_for(key), 'rb') as f:
+            return pickle.load(f)
+
+    def __setitem__(self, key, entry):
+        path = self.path_for(key)
+        if not os.path.exists(os.path.dirname(path)): os.makedirs(os.path.dirname(path))
+
+        # Write then rename, so that an interrupted run never leaves a partial entry
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(path + '.tmp', path)
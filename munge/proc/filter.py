@@ -47,6 +47,12 @@ class Filter(object):
         '''This is invoked by the framework after all derivations have been processed.'''
         pass
 
+    # In parallel mode (-j), each worker process runs its own instance of the filter on each
+    # document. A filter which accumulates state for output() must define merge(self, other), which
+    # folds the state of the (unpickled) worker instance _other_ into this one. Filters which
+    # override output() but leave merge undefined force a serial run.
+    merge = None
+
     # Concrete filters should define a long name ('--long-name') for command-line invocation.
     long_opt = Option()
     # Concrete filters should define a short name ('-l') for command-line invocation.
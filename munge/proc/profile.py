@@ -0,0 +1,114 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''Collects the time spent in each filter hook, in the reader, and on each derivation over a
+trace run (see the --profile switch of munge.proc.trace).'''
+
+import sys, time, json, resource
+from collections import defaultdict
+
+from munge.io.multi import parse_now
+
+# The filter hooks which are timed
+Hooks = ('accept_leaf', 'accept_comb_and_slash_index', 'accept_derivation', 'output')
+
+def peak_memory():
+    '''Returns the peak resident set size of this process (in kilobytes on Linux).'''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def percentile(sorted_values, p):
+    '''Returns the _p_th percentile of a non-empty sorted list by the nearest-rank method.'''
+    index = int(round(p / 100. * len(sorted_values) + 0.5)) - 1
+    return sorted_values[max(0, min(index, len(sorted_values)-1))]
+
+class Profile(object):
+    '''Accumulates, for each (filter, hook) pair, the number of calls, their total wall time, and the
+growth in peak memory during those calls. Python offers no per-call allocation counter, so growth in
+the peak resident set size stands in for allocations: it is attributed to whichever hook first
+pushed memory use past its previous high.'''
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.memory = defaultdict(int)
+
+        self.reader_seconds = 0.
+        self.reader_memory = 0
+        # (label, seconds) for each derivation
+        self.derivation_seconds = []
+
+    def instrument(self, filter):
+        '''Replaces each hook which _filter_ defines with a timed version.'''
+        filter_name = type(filter).__name__
+        for hook in Hooks:
+            method = getattr(filter, hook)
+            if method is not None:
+                setattr(filter, hook, self.timed((filter_name, hook), method))
+
+    def timed(self, key, method):
+        def timed_method(*args):
+            memory_before, start = peak_memory(), time.time()
+            try:
+                return method(*args)
+            finally:
+                self.seconds[key] += time.time() - start
+                self.memory[key] += peak_memory() - memory_before
+                self.calls[key] += 1
+        return timed_method
+
+    def timed_reader(self, reader):
+        '''Yields each bundle from _reader_, adding the time taken to read and parse it to the reader
+total.'''
+        bundles = iter(reader)
+        while True:
+            memory_before, start = peak_memory(), time.time()
+            try:
+                bundle = bundles.next()
+                # Readers defer parsing, which would otherwise be timed in the first hook to need the tree
+                parse_now(bundle)
+            finally:
+                self.reader_seconds += time.time() - start
+                self.reader_memory += peak_memory() - memory_before
+            yield bundle
+
+    def add_derivation(self, label, seconds):
+        self.derivation_seconds.append( (label, seconds) )
+
+    def report(self, slowest=10, out=sys.stderr):
+        '''Prints per-filter totals, per-derivation latency percentiles and the _slowest_ derivations.'''
+        print >>out, "%-40s %10s %12s %12s" % ('filter/hook', 'calls', 'seconds', 'peak KB')
+        print >>out, "%-40s %10s %12.3f %12d" % ('(reader)', len(self.derivation_seconds),
+                                                 self.reader_seconds, self.reader_memory)
+        for key in sorted(self.seconds, key=lambda key: -self.seconds[key]):
+            print >>out, "%-40s %10d %12.3f %12d" % ('%s.%s' % key, self.calls[key],
+                                                     self.seconds[key], self.memory[key])
+
+        if not self.derivation_seconds: return
+
+        latencies = sorted(seconds for (label, seconds) in self.derivation_seconds)
+        print >>out, "derivation latency (ms): %s" % ', '.join(
+            "p%d %.2f" % (p, percentile(latencies, p) * 1000) for p in (50, 90, 99, 100))
+
+        print >>out, "slowest derivations:"
+        for label, seconds in sorted(self.derivation_seconds, key=lambda (label, seconds): -seconds)[:slowest]:
+            print >>out, "\t%s\t%.2f ms" % (label, seconds * 1000)
+
+    def as_dict(self):
+        return {
+            'reader': { 'seconds': self.reader_seconds, 'peak_kb': self.reader_memory },
+            'hooks': [ { 'filter': filter_name, 'hook': hook, 'calls': self.calls[(filter_name, hook)],
+                         'seconds': self.seconds[(filter_name, hook)],
+                         'peak_kb': self.memory[(filter_name, hook)] }
+                       for (filter_name, hook) in sorted(self.seconds) ],
+            'derivations': [ { 'label': label, 'seconds': seconds }
+                             for (label, seconds) in self.derivation_seconds ],
+        }
+
+    def dump(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.as_dict(), f, indent=1)
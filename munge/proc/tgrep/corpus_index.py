@@ -0,0 +1,126 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''An inverted index from the literals occurring in a corpus (see
+munge.proc.tgrep.nodes.literal_requirements) to the labels of the derivations they occur in, so that a
+tgrep filter can pass over a derivation which lacks a literal its query requires without parsing it.
+
+The index is built by the BuildTgrepIndex filter (munge.proc.tgrep.tgrep), and consulted by the tgrep
+filters when the trace driver is given --tgrep-index. Each derivation is recorded with a digest of its
+text, so that a derivation which has changed since the index was built, or which the index does not
+cover, is always processed.'''
+
+import os
+import cPickle as pickle
+from hashlib import sha1
+
+from munge.proc.tgrep.nodes import literal_requirements
+from munge.trees.traverse import nodes
+from munge.util.config import config
+from munge.util.err_utils import warn
+
+def derivation_literals(root):
+    '''Returns the set of literals occurring in the tree rooted at _root_.'''
+    literals = set()
+    for node in nodes(root):
+        literals.add( ('cat', str(node.cat)) )
+        if node.is_leaf():
+            literals.add( ('lex', node.lex) )
+        category = getattr(node, 'category', None)
+        if category is not None:
+            literals.add( ('category', str(category)) )
+    return literals
+
+def text_digest(bundle):
+    '''Returns the digest of the unparsed text of the derivation in _bundle_, or None if the reader did
+not supply its text, or it has already been replaced.'''
+    text = getattr(bundle, 'text', None)
+    if text is None: return None
+    return sha1(text).digest()
+
+class CorpusIndex(object):
+    '''Maps each literal to the set of labels of the derivations in which it occurs.'''
+    def __init__(self):
+        # derivation label -> digest of its text when indexed
+        self.digests = {}
+        # literal -> set of derivation labels
+        self.postings = {}
+
+    def add(self, label, digest, literals):
+        self.digests[label] = digest
+        for literal in literals:
+            self.postings.setdefault(literal, set()).add(label)
+
+    def update(self, other):
+        '''Folds the derivations indexed by the CorpusIndex _other_ into this one.'''
+        self.digests.update(other.digests)
+        for literal, labels in other.postings.iteritems():
+            self.postings.setdefault(literal, set()).update(labels)
+
+    def candidates(self, requirements):
+        '''Returns the set of labels of the indexed derivations containing every literal in
+_requirements_, or None if there are no requirements.'''
+        if not requirements: return None
+
+        postings = sorted((self.postings.get(literal, set()) for literal in requirements), key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def is_current(self, bundle):
+        '''Returns whether the derivation in _bundle_ is indexed as it is now.'''
+        digest = self.digests.get(bundle.label(), None)
+        return digest is not None and digest == text_digest(bundle)
+
+    def save(self, filename):
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.exists(dirname): os.makedirs(dirname)
+
+        # Write then rename, so that an interrupted run never leaves a partial index
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump( (self.digests, self.postings), f, pickle.HIGHEST_PROTOCOL )
+        os.rename(filename + '.tmp', filename)
+
+    @staticmethod
+    def load(filename):
+        index = CorpusIndex()
+        with open(filename, 'rb') as f:
+            index.digests, index.postings = pickle.load(f)
+        return index
+
+# filename -> CorpusIndex, so that each process loads an index once, however many filters consult it
+loaded_indices = {}
+def load_index(filename):
+    '''Returns the CorpusIndex stored in _filename_, or None if it cannot be read.'''
+    if filename not in loaded_indices:
+        try:
+            loaded_indices[filename] = CorpusIndex.load(filename)
+        except (IOError, EOFError, pickle.UnpicklingError), e:
+            warn("Couldn't load tgrep index `%s', so reading every derivation: %s", filename, e)
+            loaded_indices[filename] = None
+    return loaded_indices[filename]
+
+class Prefilter(object):
+    '''Decides whether a derivation could match the parsed query _query_, using the CorpusIndex in
+_index_file_ (by default, the file given by config.tgrep_index). Without an index, every derivation could
+match.'''
+    def __init__(self, query, index_file=None):
+        self.requirements = literal_requirements(query)
+        self.index_file = index_file or getattr(config, 'tgrep_index', None)
+        # the labels of the indexed derivations containing every required literal
+        self._candidates = None
+
+    def may_match(self, bundle):
+        '''Returns whether the query could match the derivation in _bundle_.'''
+        if not (self.index_file and self.requirements): return True
+
+        index = load_index(self.index_file)
+        if index is None or not index.is_current(bundle): return True
+
+        if self._candidates is None:
+            self._candidates = index.candidates(self.requirements)
+        return bundle.label() in self._candidates
@@ -21,7 +21,184 @@ class AttributeAccessibleDict(dict):
     def __setattr__(self, attr, v):
         self[attr.upper()] = v
 
-Context = AttributeAccessibleDict
+class Context(AttributeAccessibleDict):
+    '''Holds the nodes captured while matching a query, as well as the TreeIndex (if any) of the tree
+being matched.'''
+    tree_index = None
+    
+    def __init__(self, tree_index=None):
+        AttributeAccessibleDict.__init__(self)
+        # Bypass AttributeAccessibleDict.__setattr__, which would store the index as a capture
+        object.__setattr__(self, 'tree_index', tree_index)
+
+def cat_string(node, context):
+    '''Returns the category string of _node_, through the TreeIndex of _context_ if it has one, so that
+each category is rendered at most once between invalidations of the index.'''
+    index = context.tree_index
+    if index is None: return str(node.cat)
+    return index.cat_string(node.cat)
+    
+def category_string(node, context):
+    '''Returns the string of the _category_ of the augmented node _node_, as cat_string does for its
+category label.'''
+    index = context.tree_index
+    if index is None: return str(node.category)
+    return index.cat_string(node.category)
+
+# Every query node defines is_satisfied_by(node, context), which interprets the query against a tree
+# node, and compiled(), which lowers the query node once into a matcher: a closure
+# matcher(node, context) with the same result and side effects, in which operators have already been
+# resolved, regexes compiled, and each sub-query replaced by its own matcher.
+def compile_query(query):
+    '''Returns the matcher for the query _query_. Query nodes which cannot be compiled are
+interpreted.'''
+    compiled = getattr(query, 'compiled', None)
+    if compiled is None: return query.is_satisfied_by
+    return compiled()
+
+def subqueries(query):
+    '''Iterates in pre-order over the query node _query_ and every query node under it.'''
+    yield query
+    for attr in ('anchor', 'constraint', 'rhs', 'inner', 'lhs', 'node', 'atom'):
+        subquery = getattr(query, attr, None)
+        if subquery is not None:
+            for node in subqueries(subquery): yield node
+    for constraint in getattr(query, 'constraints', ()):
+        for node in subqueries(constraint): yield node
+
+def reads_only_subtree(query):
+    '''Returns whether the query _query_ only inspects the node it is matched against and the nodes
+under it.'''
+    return all(is_subtree_operator(subquery.operator) for subquery in subqueries(query)
+               if isinstance(subquery, Constraint))
+
+def label_anchor(query):
+    '''Returns the query node which tests a node by its own label alone, and which matches every node
+the query _query_ matches, or None if there is no such query node.'''
+    while isinstance(query, (Node, Group, StoreAtom)):
+        query = (query.anchor if isinstance(query, Node) else
+                 query.node   if isinstance(query, Group) else
+                 query.atom)
+    if isinstance(query, (Atom, RE, MatchLex, RELex, MatchCat, RECat)): return query
+    return None
+
+def reads_categories(query):
+    '''Returns whether the query _query_ inspects the _category_ of augmented nodes.'''
+    return any(isinstance(subquery, (MatchCat, RECat)) for subquery in subqueries(query))
+
+def literal_requirements(query):
+    '''Returns a set of literals, each of which must occur in any tree containing a node which the query
+_query_ matches: ('cat', C) for a node whose _cat_ is the string C, ('lex', L) for a leaf with lexical item
+L, and ('category', C) for an augmented node whose _category_ is the string C.'''
+    if isinstance(query, Atom): return set([ ('cat', query.value) ])
+    elif isinstance(query, MatchLex): return set([ ('lex', query.lex_to_match) ])
+    elif isinstance(query, MatchCat): return set([ ('category', query.cat_to_match) ])
+
+    elif isinstance(query, Node):
+        requirements = literal_requirements(query.anchor)
+        for constraint in query.constraints:
+            requirements |= literal_requirements(constraint)
+        return requirements
+    elif isinstance(query, ConstraintGroup):
+        return reduce(operator.or_, map(literal_requirements, query.constraints), set())
+    elif isinstance(query, Group): return literal_requirements(query.node)
+    elif isinstance(query, StoreAtom): return literal_requirements(query.atom)
+    # Whatever operator relates them, the node matching the right hand side is in the same tree
+    elif isinstance(query, Constraint):
+        return literal_requirements(query.rhs) if query.rhs is not None else set()
+    # Only the literals required by both alternatives are required
+    elif isinstance(query, Alternation):
+        return literal_requirements(query.lhs) & literal_requirements(query.rhs)
+
+    # A negated or reluctant constraint requires nothing, as do regexes and captured values
+    return set()
+
+# The query planner. A compiled Node (or ConstraintGroup) tests its constraints in the order given by
+# plan_constraints, which moves cheap constraints ahead of expensive ones, since the first constraint to
+# fail saves evaluating the rest. Only constraints without side effects move: a constraint which captures
+# a node, reads a captured node, or is reluctant is _pinned_, and no constraint moves past a pinned one,
+# so that whether each pinned constraint is evaluated (and so the captures made) is unchanged. The
+# interpreter (is_satisfied_by) still evaluates constraints as written.
+
+# The estimated number of nodes an operator tests against its right hand side, for a derivation of
+# typical size. Operators which take no right hand side cost nothing beyond the operator itself.
+OperatorCosts = {
+    '<': 2, '<1': 1, '<2': 1, '<%': 2, '&': 1, '<#': 1,
+    '>': 1, '$': 2,
+    '<<#': 5, '>>': 8, '.': 10,
+    '<<': 25, '..': 50,
+}
+# The cost of an operator taking an integer (see munge.proc.tgrep.ops.IntArgOperators)
+IntArgOperatorCost = 1
+
+def operator_cost(operator):
+    return OperatorCosts.get(operator, IntArgOperatorCost)
+
+def estimated_cost(query):
+    '''Returns the estimated cost of matching the query node _query_ against a single node.'''
+    if isinstance(query, Node):
+        # Each constraint is only evaluated if those before it succeed
+        return estimated_cost(query.anchor) + 0.5 * sum(map(estimated_cost, query.constraints))
+    elif isinstance(query, ConstraintGroup): return sum(map(estimated_cost, query.constraints))
+    elif isinstance(query, Constraint):
+        rhs_cost = estimated_cost(query.rhs) if query.rhs is not None else 0
+        return operator_cost(query.operator) * max(rhs_cost, 1)
+    elif isinstance(query, Alternation): return estimated_cost(query.lhs) + estimated_cost(query.rhs)
+    elif isinstance(query, (Negation, Reluctant)):
+        return estimated_cost(getattr(query, 'inner', None) or query.constraint)
+    elif isinstance(query, Group): return estimated_cost(query.node)
+    elif isinstance(query, StoreAtom): return estimated_cost(query.atom)
+    elif isinstance(query, All): return 0.5
+    elif isinstance(query, REValue): return 2
+    # Atoms, lexical items, categories and captured values
+    return 1
+
+def pinned_reason(constraint):
+    '''Returns why the constraint _constraint_ may not be reordered, or None if it may be.'''
+    for subquery in subqueries(constraint):
+        if isinstance(subquery, Reluctant): return 'reluctant'
+        elif isinstance(subquery, StoreAtom): return 'captures =%s' % subquery.var
+        elif isinstance(subquery, AtomValue): return 'reads %s' % subquery.var
+        # An unimplemented operator raises, which must not happen where it did not before
+        elif isinstance(subquery, Constraint) and subquery.op_func is not_implemented:
+            return 'not implemented'
+        # Reading a missing head index raises, which likewise must not happen where it did not before
+        elif isinstance(subquery, Constraint) and reads_head_index(subquery.operator):
+            return 'reads head index'
+    return None
+
+def plan_constraints(constraints):
+    '''Returns the constraints _constraints_ in the order in which they should be evaluated.'''
+    planned, movable = [], []
+    for constraint in constraints:
+        if pinned_reason(constraint) is None:
+            movable.append(constraint)
+        else:
+            # Constraints move freely between consecutive pinned constraints, but not past them
+            planned += sorted(movable, key=estimated_cost)
+            planned.append(constraint)
+            movable = []
+    return planned + sorted(movable, key=estimated_cost)
+
+def explain(query, indent=0):
+    '''Returns the lines of a description of the order in which the compiled query _query_ evaluates its
+constraints, with the estimated cost of each.'''
+    while isinstance(query, (Group, StoreAtom)):
+        query = query.node if isinstance(query, Group) else query.atom
+    if not isinstance(query, (Node, ConstraintGroup)): return []
+
+    lines = []
+    for constraint in plan_constraints(query.constraints):
+        reason = pinned_reason(constraint)
+        lines.append("%s%-*s cost %g%s" % ('  ' * indent, max(40 - 2*indent, 0), constraint,
+                                           estimated_cost(constraint),
+                                           ' (pinned: %s)' % reason if reason else ''))
+        # Describe the plan of the query on the right hand side, or of the constraints in a group
+        if isinstance(constraint, Constraint) and constraint.rhs is not None:
+            lines += explain(constraint.rhs, indent+1)
+        elif isinstance(constraint, ConstraintGroup):
+            lines += explain(constraint, indent+1)
+    return lines
 
 class Node(object):
     '''Represents a head node matcher (the anchor) and its sequence of constraints.'''
@@ -41,6 +218,24 @@ class Node(object):
             # XXX: side effects for unevaluated constraints will not be executed (due to short-circuiting)
             return all(constraint.is_satisfied_by(node, context) for constraint in self.constraints)
         return False
+        
+    def compiled(self):
+        anchor = compile_query(self.anchor)
+        constraints = map(compile_query, plan_constraints(self.constraints))
+        
+        if not constraints: return anchor
+        elif len(constraints) == 1:
+            constraint = constraints[0]
+            match_node = lambda node, context: anchor(node, context) and constraint(node, context)
+        else:
+            def match_node(node, context):
+                if not anchor(node, context): return False
+                for constraint in constraints:
+                    if not constraint(node, context): return False
+                return True
+                
+        match_node.anchor_cat = getattr(anchor, 'anchor_cat', None)
+        return match_node
     
 class Reluctant(object):
     '''A constraint which always succeeds, but allows side-effects a chance to run.'''
@@ -54,6 +249,13 @@ class Reluctant(object):
         self.constraint.is_satisfied_by(node, context)
         return True
         
+    def compiled(self):
+        constraint = compile_query(self.constraint)
+        def match_reluctant(node, context):
+            constraint(node, context)
+            return True
+        return match_reluctant
+        
 class Constraint(object):
     '''Represents a single constraint, characterised by an operator symbol and an argument node.'''
     def __init__(self, operator, rhs=None):
@@ -79,12 +281,24 @@ class Constraint(object):
     def is_satisfied_by(self, node, context):
         try:
             # Determine whether rhs matches the candidate node
-            return self.op_func(self.rhs, node, context)
+            return self.op_func(self.rhs and self.rhs.is_satisfied_by, node, context)
         except KeyError:
             warn("Invalid operator %s encountered.", self.operator)
 
         return False
         
+    def compiled(self):
+        op_func, operator = self.op_func, self.operator
+        rhs = self.rhs and compile_query(self.rhs)
+        
+        def match_constraint(node, context):
+            try:
+                return op_func(rhs, node, context)
+            except KeyError:
+                warn("Invalid operator %s encountered.", operator)
+            return False
+        return match_constraint
+        
 class Negation(object):
     '''Represents the negation of a constraint.'''
     def __init__(self, inner):
@@ -93,6 +307,9 @@ class Negation(object):
         return "!%s" % self.inner
     def is_satisfied_by(self, node, context):
         return not self.inner.is_satisfied_by(node, context)
+    def compiled(self):
+        inner = compile_query(self.inner)
+        return lambda node, context: not inner(node, context)
         
 class Alternation(object):
     '''Represents a disjunction between two constraints.'''
@@ -102,6 +319,9 @@ class Alternation(object):
         return "%s | %s" % (self.lhs, self.rhs)
     def is_satisfied_by(self, node, context):
         return self.lhs.is_satisfied_by(node, context) or self.rhs.is_satisfied_by(node, context)
+    def compiled(self):
+        lhs, rhs = compile_query(self.lhs), compile_query(self.rhs)
+        return lambda node, context: lhs(node, context) or rhs(node, context)
         
 class Group(object):
     def __init__(self, node):
@@ -110,6 +330,8 @@ class Group(object):
         return "{%s}" % self.node
     def is_satisfied_by(self, node, context):
         return self.node.is_satisfied_by(node, context)
+    def compiled(self):
+        return compile_query(self.node)
         
 class ConstraintGroup(object):
     '''Matches when all sub-constraints are matched.'''
@@ -119,6 +341,13 @@ class ConstraintGroup(object):
         return "[%s]" % ' '.join(str(c) for c in self.constraints)
     def is_satisfied_by(self, node, context):
         return all(constraint.is_satisfied_by(node, context) for constraint in self.constraints)
+    def compiled(self):
+        constraints = map(compile_query, plan_constraints(self.constraints))
+        def match_constraint_group(node, context):
+            for constraint in constraints:
+                if not constraint(node, context): return False
+            return True
+        return match_constraint_group
  
 class Atom(object):
     '''Matches only on an exact string match of the node's _cat_.'''
@@ -128,6 +357,11 @@ class Atom(object):
         return self.value
     def is_satisfied_by(self, node, context):
         return self.value == str(node.cat)
+    def compiled(self):
+        value = self.value
+        match_atom = lambda node, context: value == cat_string(node, context)
+        match_atom.anchor_cat = value
+        return match_atom
         
 class StoreAtom(object):
     '''Matches exactly what its body matches, with the side effect of capturing the matched node to a variable.'''
@@ -141,6 +375,16 @@ class StoreAtom(object):
         if satisfied:
             context[self.var] = node
         return satisfied
+        
+    def compiled(self):
+        atom, var = compile_query(self.atom), self.var
+        def match_store_atom(node, context):
+            satisfied = atom(node, context)
+            if satisfied:
+                context[var] = node
+            return satisfied
+        match_store_atom.anchor_cat = getattr(atom, 'anchor_cat', None)
+        return match_store_atom
         # # store into context as side effect
         # context[self.var] = self.atom
         # # TODO: Should we prevent the just-assigned variable from being used when evaluating this node?
@@ -161,6 +405,14 @@ class AtomValue(object):
         # XXX: This defines two nodes as equal if they are the same modulo features (which is what we often want)
         return self.evaluate(stored_node, node)
         
+    def compiled(self):
+        var, evaluate = self.var, self.evaluate
+        def match_atom_value(node, context):
+            if var not in context:
+                raise TgrepException('No variable %s exists in the context.' % var)
+            return evaluate(context[var], node)
+        return match_atom_value
+        
 class GetLex(AtomValue):
     '''Matches tree nodes which have a lexical item identical to that of the captured tree node.'''
     def __init__(self, var):
@@ -200,6 +452,9 @@ class MatchLex(object):
     def is_satisfied_by(self, node, context):
         if not node.is_leaf(): return False
         return node.lex == self.lex_to_match
+    def compiled(self):
+        lex_to_match = self.lex_to_match
+        return lambda node, context: node.is_leaf() and node.lex == lex_to_match
         
 class MatchCat(object):
     def __init__(self, cat_to_match, quoted=False):
@@ -209,7 +464,10 @@ class MatchCat(object):
         cat = "\"%s\"" % self.cat_to_match if self.quoted else self.cat_to_match
         return "@%s" % cat
     def is_satisfied_by(self, node, context):
-        return str(node.category) == self.cat_to_match        
+        return str(node.category) == self.cat_to_match
+    def compiled(self):
+        cat_to_match = self.cat_to_match
+        return lambda node, context: category_string(node, context) == cat_to_match
         
 class REValue(object):
     def __init__(self, source, anchor_at_start=True, unicode=False):
@@ -229,6 +487,12 @@ class RELex(REValue):
             return self.match_method(node.lex.decode('u8')) is not None
         else:
             return self.match_method(node.lex) is not None
+    def compiled(self):
+        match_method = self.match_method
+        if self.unicode:
+            return lambda node, context: node.is_leaf() and match_method(node.lex.decode('u8')) is not None
+        else:
+            return lambda node, context: node.is_leaf() and match_method(node.lex) is not None
         
 class RECat(REValue):
     def __init__(self, source, anchor_at_start=True, unicode=False):
@@ -237,6 +501,9 @@ class RECat(REValue):
         return "@/%s/" % self.source
     def is_satisfied_by(self, node, context):
         return self.match_method(str(node.category)) is not None
+    def compiled(self):
+        match_method = self.match_method
+        return lambda node, context: match_method(category_string(node, context)) is not None
         
 class RE(REValue):
     '''Matches tree nodes whose category labels satisfy a regex.'''
@@ -246,6 +513,9 @@ class RE(REValue):
         return "/%s/" % self.source
     def is_satisfied_by(self, node, context):
         return self.match_method(str(node.cat)) is not None
+    def compiled(self):
+        match_method = self.match_method
+        return lambda node, context: match_method(cat_string(node, context)) is not None
 
 class All(object):
     '''Matches unconditionally against any tree node.'''
@@ -253,4 +523,6 @@ class All(object):
         return "*"
     def is_satisfied_by(self, node, context):
         return True
+    def compiled(self):
+        return lambda node, context: True
 
@@ -7,65 +7,127 @@
 # supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
 # notify the maintainer Daniel Tse <cncandc@gmail.com>.
 
+import re
+
 from munge.trees.traverse import nodes
 from munge.util.deco_utils import cast_to
-from munge.trees.traverse import get_index_of_leaf, get_leaf, leaves, ancestors
-from itertools import islice
+from munge.trees.traverse import leaves, ancestors
+
+# Each operator receives the node being tested, the context, and _candidate_: a function
+# candidate(node, context) which returns whether a node satisfies the right hand side of the
+# constraint. The interpreter passes the is_satisfied_by method of the right hand side, and the
+# compiler (see munge.proc.tgrep.nodes.compile_query) its compiled matcher. A compiled matcher which
+# can only match nodes with a given category string carries it as its _anchor_cat_, and if the context
+# carries a TreeIndex (munge.trees.index) for the tree, the dominance operators only test the nodes
+# with that category, and the precedence operators find the leaves after a leaf by position.
 
 def IsParentOf(candidate, node, context):
     if node.is_leaf(): return False
     if node.count() == 1:
-        return candidate.is_satisfied_by(node[0], context)
+        return candidate(node[0], context)
     elif node.count() == 2:
-        return (candidate.is_satisfied_by(node[0], context) or
-                candidate.is_satisfied_by(node[1], context))
-    return any(candidate.is_satisfied_by(child, context) for child in node)
+        return (candidate(node[0], context) or
+                candidate(node[1], context))
+    for child in node:
+        if candidate(child, context): return True
+    return False
 
 # A << B => B is a node under A
 # node <- A
 # ask: out of all nodes under A, does 'candidate' match any of them?
 def Dominates(candidate, node, context):
     if node.is_leaf(): return False
-    return any(candidate.is_satisfied_by(internal_node, context) for internal_node in nodes(node))
+    
+    index, cat = context.tree_index, getattr(candidate, 'anchor_cat', None)
+    if index is not None and cat is not None and index.worth_building():
+        i = index.number(node)
+        if i is not None:
+            for j in index.descendants_with_cat(i, cat):
+                if candidate(index.nodes[j], context): return True
+            return False
+            
+    nwalked, found = 0, False
+    for internal_node in nodes(node):
+        nwalked += 1
+        if candidate(internal_node, context):
+            found = True
+            break
+            
+    if index is not None: index.charge(nwalked)
+    return found
 
 def IsChildOf(candidate, node, context):
     if node.parent is None: return False
-    return candidate.is_satisfied_by(node.parent, context)
+    return candidate(node.parent, context)
 
 def IsDominatedBy(candidate, node, context):
     if node.parent is None: return False
-    return any(candidate.is_satisfied_by(ancestor, context) for ancestor in ancestors(node))
+    
+    index, cat = context.tree_index, getattr(candidate, 'anchor_cat', None)
+    if index is not None and cat is not None and index.worth_building():
+        i = index.number(node)
+        if i is not None:
+            for j in index.ancestors_with_cat(i, cat):
+                if candidate(index.nodes[j], context): return True
+            return False
+            
+    nwalked, found = 0, False
+    for ancestor in ancestors(node):
+        nwalked += 1
+        if candidate(ancestor, context):
+            found = True
+            break
+            
+    if index is not None: index.charge(nwalked)
+    return found
     
 def get_root(node):
     while node.parent: node = node.parent
     return node
 
+def leaves_after(node, context):
+    '''Returns the leaves after the leaf _node_ from left to right, from the TreeIndex of _context_ if
+it is worth using, and otherwise by walking the leaves of the tree.'''
+    index = context.tree_index
+    if index is not None and index.worth_building():
+        leaf_index = index.leaf_index(node)
+        if leaf_index is not None:
+            return iter(index.leaves[leaf_index+1:])
+            
+    return walk_leaves_after(node, index)
+    
+def walk_leaves_after(node, index):
+    nwalked = 0
+    following = False
+    try:
+        for leaf in leaves(get_root(node)):
+            nwalked += 1
+            if following:
+                yield leaf
+            elif leaf is node:
+                following = True
+    finally:
+        # Charges the walk even if the caller stops early
+        if index is not None: index.charge(nwalked)
+
+# A . B => B comes immediately after A
 def ImmediatelyPrecedes(candidate, node, context):
     if not node.is_leaf(): return False
     
-    # does a node which matches 'candidate' occur immediately before _node_?
-    root = get_root(node)
-    
-    node_index = get_index_of_leaf(root, node)
-    
-    successor = get_leaf(root, node_index+1)
+    successor = next(leaves_after(node, context), None)
     if not successor: return False
-    if candidate.is_satisfied_by(successor, context): return True
+    if candidate(successor, context): return True
     
     return False
 
-# A . B => B comes after A
+# A .. B => B comes after A
 # node <- A
 # out of all nodes after A, is B one of them?
 def Precedes(candidate, node, context):
     if not node.is_leaf(): return False
     
-    root = get_root(node)
-    
-    node_index = get_index_of_leaf(root, node)
-    
-    for successor in islice(leaves(root), node_index+1):
-        if candidate.is_satisfied_by(successor, context): 
+    for successor in leaves_after(node, context):
+        if candidate(successor, context): 
             return True
             
     return False
@@ -75,7 +137,7 @@ def IsSiblingOf(candidate, node, context):
     
     for kid in node.parent:
         if kid is node: continue
-        if candidate.is_satisfied_by(kid, context): return True
+        if candidate(kid, context): return True
     
     return False
     
@@ -87,22 +149,24 @@ IsSiblingOfAndPrecedes = not_implemented
 
 def LeftChildOf(candidate, node, context):
     if node.is_leaf(): return False
-    return candidate.is_satisfied_by(node[0], context)
+    return candidate(node[0], context)
 
 def RightChildOf(candidate, node, context):
     if node.is_leaf(): return False
-    return node.count() > 1 and candidate.is_satisfied_by(node[1], context)
+    return node.count() > 1 and candidate(node[1], context)
     
 def AllChildrenOf(candidate, node, context):
     if node.is_leaf(): return False
-    return all(candidate.is_satisfied_by(kid, context) for kid in node)
+    for kid in node:
+        if not candidate(kid, context): return False
+    return True
 
 @cast_to(int)
 def IsNthChildOf(n):
     def _IsNthChildOf(candidate, node, context):
         if not 1 <= n <= node.count(): return False
         # value is 1-indexed, while child indexing in Nodes is 0-indexed
-        return candidate.is_satisfied_by(node[n-1], context)
+        return candidate(node[n-1], context)
     return _IsNthChildOf
     
 @cast_to(int)
@@ -119,12 +183,12 @@ def HeadIndexIs(n):
     return _HeadIndexIs
 
 def And(candidate, node, context):
-    return candidate.is_satisfied_by(node, context)
+    return candidate(node, context)
     
 def ImmediatelyHeadedBy(candidate, node, context):
     if node.is_leaf(): return False
     if node.head_index is None: return False
-    return candidate.is_satisfied_by(node[node.head_index], context)
+    return candidate(node[node.head_index], context)
     
 def HeadedBy(candidate, node, context):
     if node.is_leaf(): return False
@@ -134,7 +198,7 @@ def HeadedBy(candidate, node, context):
     while not cur.is_leaf() and cur.head_index is not None:
         cur = cur[cur.head_index]
         
-        if candidate.is_satisfied_by(cur, context): return True
+        if candidate(cur, context): return True
     return False
 
 Operators = {
@@ -160,3 +224,22 @@ IntArgOperators = {
     r'\#<(\d+)': ChildCount,
     r'\#\#(\d+)': HeadIndexIs,
 }
+
+# Operators which only inspect the node and the nodes under it, so that whether a query built from them
+# matches a node depends only on the subtree rooted at that node
+SubtreeOperators = frozenset(('<', '<<', '<1', '<2', '<%', '&', '<#', '<<#'))
+
+# Operators which read the head index, which only headed trees have (and which may be None even there)
+HeadOperators = frozenset(('<#', '<<#'))
+
+def reads_head_index(operator):
+    '''Returns whether the operator _operator_ reads the head index of the nodes it inspects.'''
+    return operator in HeadOperators or bool(re.match(r'\#\#(\d+)$', operator))
+
+def is_subtree_operator(operator):
+    '''Returns whether the operator _operator_ only inspects the node and the nodes under it.'''
+    if operator in SubtreeOperators: return True
+    # IsNthChildOf, ChildCount and HeadIndexIs only inspect the node and its children
+    for regex in IntArgOperators.iterkeys():
+        if re.match(regex + '$', operator): return True
+    return False
@@ -0,0 +1,140 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''Corpus-wide tgrep search over worker processes. Each document is searched by a worker, and the
+matches are printed in document order as soon as each document (and every document before it) has been
+searched, so that the first matches appear without waiting for the whole corpus. Given a limit, the
+search stops once that many matches have been printed.
+
+    python -m munge.proc.tgrep.search [-j N] [--limit N] [--json] EXPR FILE...'''
+
+import sys, json, traceback
+from itertools import imap, izip
+from multiprocessing import Pool
+from optparse import OptionParser
+
+from munge.io.multi import DirFileGuessReader
+from munge.proc.tgrep.tgrep import tgrep, parse_query, initialise
+from munge.proc.tgrep.corpus_index import Prefilter
+from munge.util.dict_utils import smash_key_case
+from munge.util.err_utils import err
+
+class Match(object):
+    '''A match of a query in a derivation, reduced to strings so that it can be returned by a worker.'''
+    def __init__(self, doc_path, label, node, context):
+        self.doc_path, self.label = doc_path, label
+        self.node = str(node)
+        self.tokens = node.text()
+        self.captures = dict( (name, str(captured)) for (name, captured) in smash_key_case(context).iteritems() )
+
+    def as_json(self):
+        return json.dumps({ 'document': self.doc_path, 'derivation': self.label, 'match': self.node,
+                            'tokens': self.tokens, 'captures': self.captures })
+
+    def __str__(self):
+        return "%s %s" % (self.label, self.node)
+
+def search_document(job):
+    '''Worker entry point. Searches one document, returning the number of derivations read, the number
+in which the query matched, the list of Matches (at most _limit_ of them, if given), and the exceptions
+raised as (label, formatted traceback) pairs.'''
+    expression, doc_path, find_all, limit, index_file = job
+    initialise()
+    prefilter = Prefilter(parse_query(expression), index_file)
+
+    nderivs = nmatched = 0
+    matches, exceptions = [], []
+    for bundle in DirFileGuessReader(doc_path, verbose=False):
+        if limit is not None and len(matches) >= limit: break
+        nderivs += 1
+        if not prefilter.may_match(bundle): continue
+
+        try:
+            matched = False
+            for node, context in tgrep(bundle.derivation, expression, with_context=True):
+                matched = True
+                matches.append( Match(doc_path, bundle.label(), node, context) )
+                if not find_all or (limit is not None and len(matches) >= limit): break
+
+            if matched: nmatched += 1
+        except Exception:
+            exceptions.append( (bundle.label(), traceback.format_exc()) )
+
+    return nderivs, nmatched, matches, exceptions
+
+def search(expression, files, jobs=1, find_all=False, limit=None, index_file=None):
+    '''Searches the documents named by _files_ for _expression_ over _jobs_ worker processes, yielding
+(doc_path, nderivs, nmatched, matches, exceptions) for each document in document order. Given a
+_limit_, no more than _limit_ matches are yielded in all, and the search stops once they have been.'''
+    docs = [ doc_path for file in files
+                      for doc_path in DirFileGuessReader(file, verbose=False).document_paths() ]
+    # Each document stops at _limit_ matches, since the documents before it may have none
+    search_jobs = ( (expression, doc_path, find_all, limit, index_file) for doc_path in docs )
+
+    pool = Pool(processes=jobs) if jobs > 1 else None
+    results = pool.imap(search_document, search_jobs) if pool else imap(search_document, search_jobs)
+    try:
+        remaining = limit
+        for doc_path, (nderivs, nmatched, matches, exceptions) in izip(docs, results):
+            if remaining is not None:
+                matches = matches[:remaining]
+                remaining -= len(matches)
+
+            yield doc_path, nderivs, nmatched, matches, exceptions
+            if remaining == 0: break
+    finally:
+        # Workers may still be searching documents which are no longer needed
+        if pool:
+            pool.terminate()
+            pool.join()
+
+def main(argv):
+    parser = OptionParser(usage='%prog [options] EXPR FILE...')
+    parser.add_option("-j", "--jobs", help="Distributes documents over N worker processes.",
+                      type='int', dest='jobs', default=1, metavar='N')
+    parser.add_option("-a", "--find-all", help="Find all matches in each derivation (not just the first).",
+                      action='store_true', dest='find_all', default=False)
+    parser.add_option("--limit", help="Stops once N matches have been printed.",
+                      type='int', dest='limit', metavar='N')
+    parser.add_option("--json", help="Prints each match as a line of JSON.",
+                      action='store_true', dest='json', default=False)
+    parser.add_option("-c", "--count", help="Prints only the number of derivations matched.",
+                      action='store_true', dest='count', default=False)
+    parser.add_option("--tgrep-index", help="Skips the derivations which the corpus index INDEX shows the query cannot match.",
+                      dest='tgrep_index', metavar='INDEX')
+
+    opts, args = parser.parse_args(argv[1:])
+    if len(args) < 2:
+        parser.print_help()
+        sys.exit(1)
+    expression, files = args[0], args[1:]
+
+    total = nmatched = 0
+    for doc_path, doc_nderivs, doc_nmatched, matches, exceptions in search(
+            expression, files, jobs=opts.jobs, find_all=opts.find_all, limit=opts.limit,
+            index_file=opts.tgrep_index):
+        total += doc_nderivs
+        nmatched += doc_nmatched
+
+        for label, formatted_exception in exceptions:
+            err("Processing failed on derivation %s of file %s:", label, doc_path)
+            sys.stderr.write(formatted_exception)
+
+        if not opts.count:
+            for match in matches:
+                print match.as_json() if opts.json else match
+            sys.stdout.flush()
+
+    # In JSON mode, stdout holds only the matches
+    summary = sys.stderr if opts.json else sys.stdout
+    print >>summary, "matches: %d/%d derivs = %.2f%%" % (nmatched, total,
+                                                        0 if total == 0 else nmatched/float(total)*100.0)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -15,8 +15,11 @@ except ImportError:
     import lex, yacc
 
 import munge.proc.tgrep.parse as parse
-from munge.proc.tgrep.nodes import Context
+from munge.proc.tgrep.nodes import Context, compile_query, cat_string
+from munge.proc.tgrep.ops import get_root
 from munge.trees.traverse import nodes, leaves, nodes_reversed, tag_and_lex, tag_and_text_under, lrp_repr
+from munge.trees.index import TreeIndex
+from munge.proc.tgrep.corpus_index import CorpusIndex, Prefilter, derivation_literals, text_digest
 
 from munge.trees.pprint import pprint
 from munge.trees.synttree import pprint_synttree
@@ -52,15 +55,11 @@ def initialise():
 # quick and dirty memoisation. This is based on the exact string expression, so
 # semantically identical expressions with trivial differences such as whitespace
 # will not be considered identical
-expression_cache = {}
-def tgrep(deriv, expression, with_context=False, nonrecursive=False, left_to_right=False):
-    '''Performs the given tgrep query on the given tree. If _with_context_ is True, each matched node
-yields a pair (node, context), and captured nodes are accessible by name using the dict-like context.
-If the user wants to keep context around, a copy must be made.'''
-    if not expression: raise RuntimeError('No query expression given.')
-
-    query = expression_cache.get(expression, None)
-        
+query_cache = {}
+def parse_query(expression):
+    '''Returns the parsed query for the tgrep expression _expression_.'''
+    query = query_cache.get(expression, None)
+    
     if query is None:
         initialise()
             
@@ -70,44 +69,119 @@ If the user wants to keep context around, a copy must be made.'''
             for tok in iter(lex.token, None):
                 debug("%s %s", tok.type, tok.value)
 
-        query = yacc.parse(expression)
-        expression_cache[expression] = query
+        query = query_cache[expression] = yacc.parse(expression)
+        
+    return query
+
+# expression -> compiled matcher (see munge.proc.tgrep.nodes.compile_query)
+expression_cache = {}
+def compile_expression(expression):
+    '''Returns the matcher for the tgrep expression _expression_, a function accepting a node and a
+context, and returning whether the node matches.'''
+    matcher = expression_cache.get(expression, None)
+    
+    if matcher is None:
+        matcher = expression_cache[expression] = compile_query(parse_query(expression))
+        
+    return matcher
+    
+def tgrep(deriv, expression, with_context=False, nonrecursive=False, left_to_right=False):
+    '''Performs the given tgrep query on the given tree. If _with_context_ is True, each matched node
+yields a pair (node, context), and captured nodes are accessible by name using the dict-like context.
+If the user wants to keep context around, a copy must be made.'''
+    if not expression: raise RuntimeError('No query expression given.')
+
+    matcher = compile_expression(expression)
     
     # Default traversal method is right to left
     traversal_method = (single if nonrecursive  else 
                         nodes  if left_to_right else 
                         nodes_reversed)
                         
-    context = Context()
+    # Dominance operators may be evaluated over the whole tree, not just under _deriv_
+    context = Context(TreeIndex(get_root(deriv)))
     for node in traversal_method(deriv):
         context.clear()
         
-        if query.is_satisfied_by(node, context):
-            if _tgrep_debug: debug("%s matched %s", lrp_repr(node), query)
+        if matcher(node, context):
+            if _tgrep_debug: debug("%s matched %s", lrp_repr(node), expression)
             if with_context:
                 yield node, context
             else: yield node
             
+            # The caller may have mutated the tree
+            context.tree_index.invalidate()
+            
+class QuerySet(object):
+    '''A set of tgrep expressions, each compiled once, which are matched together in a single traversal.
+Each node is only tested against the expressions which can match its category label (those whose
+matcher carries an _anchor_cat_ equal to it, and those with no anchor category), in the order the
+expressions were given.'''
+    def __init__(self, expressions):
+        self.expressions = list(expressions)
+        self.matchers = map(compile_expression, self.expressions)
+        
+        # anchor category -> indices of the expressions anchored on it
+        self.anchored = {}
+        # indices of the expressions which may match a node with any category
+        self.unanchored = []
+        for i, matcher in enumerate(self.matchers):
+            cat = getattr(matcher, 'anchor_cat', None)
+            if cat is None:
+                self.unanchored.append(i)
+            else:
+                self.anchored.setdefault(cat, []).append(i)
+                
+        # category string -> [ (index, expression, matcher) ] to test against nodes with that category
+        self.dispatch = {}
+        
+    def candidates(self, cat):
+        candidates = self.dispatch.get(cat, None)
+        if candidates is None:
+            candidates = self.dispatch[cat] = [ (i, self.expressions[i], self.matchers[i]) for i in 
+                                                sorted(self.anchored.get(cat, []) + self.unanchored) ]
+        return candidates
+        
+    def find_all(self, deriv):
+        '''Yields a triple (node, expression, context) for each node of the tree rooted at _deriv_ (in
+pre-order) and each expression which matches it. The context is only valid until the next triple is
+requested.'''
+        context = Context(TreeIndex(get_root(deriv)))
+        for node in nodes(deriv):
+            candidates = self.candidates(cat_string(node, context))
+            j = 0
+            while j < len(candidates):
+                i, expression, matcher = candidates[j]
+                j += 1
+                
+                context.clear()
+                if matcher(node, context):
+                    yield node, expression, context
+                    
+                    # The caller may have mutated the tree, and relabelled the node, in which case the
+                    # expressions after this one are those which can match its new label
+                    context.tree_index.invalidate()
+                    candidates = [ candidate for candidate in self.candidates(cat_string(node, context))
+                                   if candidate[0] > i ]
+                    j = 0
+
+# tuple of expressions -> QuerySet
+query_set_cache = {}
 def multi_tgrep(deriv, query_callback_map):
+    '''Calls _query_callback_map_[expression] on each node of the tree rooted at _deriv_ matching each
+expression, passing the captured nodes (if any) as keyword arguments.'''
     if not query_callback_map: raise RuntimeError('No query expressions given.')
-    initialise()
     
-    if _tgrep_debug:
-        for expression in query_callback_map.keys():
-            debug("Lexing %s", expression)
-            lex.input(expression)
-            for tok in iter(lex.token, None):
-                debug("\t%s %s", tok.type, tok.value)
+    expressions = tuple(query_callback_map.iterkeys())
+    query_set = query_set_cache.get(expressions, None)
+    if query_set is None:
+        query_set = query_set_cache[expressions] = QuerySet(expressions)
     
-    queries = [yacc.parse(expression) for expression in query_callback_map.keys()]
-    for node in nodes(deriv):
-        for query_expr, query_str in izip(queries, query_callback_map.keys()):
-            context = Context()
-            if query_expr.is_satisfied_by(node, context):
-                if context:
-                    query_callback_map[query_str](node, **smash_key_case(context))
-                else:
-                    query_callback_map[query_str](node)
+    for node, expression, context in query_set.find_all(deriv):
+        if context:
+            query_callback_map[expression](node, **smash_key_case(context))
+        else:
+            query_callback_map[expression](node)
     
 find_all = tgrep
 find_first = compose(curry(take, 1), find_all)
@@ -151,13 +225,19 @@ class TgrepCount(Filter):
         initialise()
         
         self.expression = expression
+        self.prefilter = Prefilter(parse_query(expression))
         self.count = 0
         self.total = 0
         
     def accept_derivation(self, bundle):
-        if list(find_first(bundle.derivation, self.expression)): self.count += 1
+        if self.prefilter.may_match(bundle) and list(find_first(bundle.derivation, self.expression)):
+            self.count += 1
         self.total += 1
-        
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+
     def output(self):
         if self.total > 0:
             print "%s matched %d/%d=(%0.2f%%)" % (
@@ -169,6 +249,32 @@ class TgrepCount(Filter):
     
     arg_names = 'EXPR'
     
+class BuildTgrepIndex(Filter):
+    '''Builds the corpus index (see munge.proc.tgrep.corpus_index) which the tgrep filters consult
+when the trace driver is given --tgrep-index INDEX.'''
+    def __init__(self, index_file):
+        Filter.__init__(self)
+        
+        self.index_file = index_file
+        self.index = CorpusIndex()
+        
+    def accept_derivation(self, bundle):
+        # The digest is of the text before the derivation is parsed
+        digest = text_digest(bundle)
+        self.index.add(bundle.label(), digest, derivation_literals(bundle.derivation))
+        
+    def merge(self, other):
+        self.index.update(other.index)
+        
+    def output(self):
+        self.index.save(self.index_file)
+        info("Indexed %d derivations in %s.", len(self.index.digests), self.index_file)
+        
+    opt = 'X'
+    long_opt = 'build-tgrep-index'
+    
+    arg_names = 'INDEX'
+    
 class TgrepCore(Filter):
     '''Abstract filter class for a tgrep query. Subclasses must override match_generator, match_callback and caption_generator.'''
     def __init__(self, expression):
@@ -176,6 +282,7 @@ class TgrepCore(Filter):
         initialise()
         
         self.expression = expression
+        self.prefilter = Prefilter(parse_query(expression))
         
         self.nmatched = self.total = 0
         
@@ -188,6 +295,10 @@ class TgrepCore(Filter):
     def accept_derivation(self, derivation_bundle):
         matched = False
         
+        if not self.prefilter.may_match(derivation_bundle):
+            self.total += 1
+            return
+        
         for match_node, context in self.match_generator(derivation_bundle.derivation, self.expression, with_context=True):
             if use_colour: sys.stdout.write(codes['bold'])
             self.caption_generator(derivation_bundle)
@@ -13,6 +13,7 @@ import sys, re, os
 from munge.util.err_utils import warn, info, err
 from munge.proc.trace_core import TraceCore
 from munge.proc.dynload import get_argcount_for_method
+from munge.proc.profile import Profile
 
 from munge.util.config import config
     
@@ -114,6 +115,23 @@ def register_builtin_switches(parser):
                       action='callback', callback=set_config_file)
     group.add_option("-d", "--debug", help="Print debug messages.",
                       action='store_true', dest='debug')
+    group.add_option("-j", "--jobs", help="Distributes documents over N worker processes.",
+                      type='int', dest='jobs', default=1, metavar='N')
+    group.add_option("-K", "--cache", help="Reuses the result for each document unchanged since a previous run.",
+                      dest='cache_dir', metavar='DIR')
+    group.add_option("--tgrep-index", help="Skips the derivations which the corpus index INDEX shows a tgrep query cannot match.",
+                      dest='tgrep_index', metavar='INDEX')
+    group.add_option("--prefetch", help="Reads up to K documents ahead of the filters on a background thread.",
+                      type='int', dest='prefetch', default=0, metavar='K')
+                      
+    profile_group = OptionGroup(parser, title='Profiling')
+    
+    profile_group.add_option("--profile", help="Reports the time spent in each filter hook and on each derivation.",
+                      action='store_true', dest='profile', default=False)
+    profile_group.add_option("--profile-slowest", help="Lists the N slowest derivations in the profile.",
+                      type='int', dest='profile_slowest', default=10, metavar='N')
+    profile_group.add_option("--profile-json", help="Writes the profile to FILE as JSON (implies --profile).",
+                      dest='profile_json', metavar='FILE')
                       
     errors_group = OptionGroup(parser, title='Error handling')
                       
@@ -122,6 +140,7 @@ def register_builtin_switches(parser):
 
     parser.add_option_group(group)
     parser.add_option_group(errors_group)
+    parser.add_option_group(profile_group)
 
 def filter_library_switches(argv):
     '''This strips argv of all command-line switches of the form -lPACKAGE where PACKAGE is a 
@@ -191,10 +210,17 @@ def main(argv):
     
     if opts.debug:
         config.set(debug=True)
+    if opts.tgrep_index:
+        config.set(tgrep_index=opts.tgrep_index)
             
     # Set verbose switch if given on command line
     tracer.verbose = opts.verbose
     tracer.break_on_exception = opts.break_on_exception
+    tracer.jobs = opts.jobs
+    tracer.cache_dir = opts.cache_dir
+    tracer.prefetch = opts.prefetch
+    if opts.profile or opts.profile_json:
+        tracer.profile = Profile()
     
     # Set override Reader if given on command line
     tracer.reader_class_name = opts.reader_class_name
@@ -215,6 +241,11 @@ def main(argv):
         sys.exit(1)
     except IOError, e: # file not found, for instance
         sys.exit(2)
+        
+    if tracer.profile:
+        tracer.profile.report(slowest=opts.profile_slowest)
+        if opts.profile_json:
+            tracer.profile.dump(opts.profile_json)
 
 if __name__ == '__main__':
     #try:
@@ -11,31 +11,82 @@ import sys
 import os
 import errno
 import re
+import traceback
+import time
+from itertools import izip, imap
+from functools import partial as curry
+from multiprocessing import Pool
+from cStringIO import StringIO
 
 from munge.io.guess import GuessReader
-from munge.io.multi import DirFileGuessReader
+from munge.io.multi import DirFileGuessReader, PrefetchingReader
 from munge.penn.io import AugmentedPTBReader, CategoryPTBReader
 from munge.penn.prefaced_io import PrefacedPTBReader
 from munge.cptb.io import CPTBHeadlineReader
 from munge.io.paired import PairedReader
 
 from munge.trees.traverse import leaves
-from munge.cats.paths import applications_per_slash
+from munge.cats.paths import slash_consumers
 from munge.proc.dynload import (get_available_filters_dict,
                                 load_requested_packages,
                                 get_argcount_for_method)
+from munge.proc.filter import Filter
+from munge.proc.cache import StageCache, is_cacheable, start_recording, stop_recording, replay_output
 from munge.util.err_utils import warn, info, err, muzzle
 from munge.util.exceptions import FilterException
 
+def process_document(job):
+    '''Worker entry point for parallel and cached modes. Runs freshly constructed filters over a
+single document, returning any exceptions as (label, formatted traceback) pairs, the text the filters
+wrote to stdout, those filter instances whose state must be merged into the parent, and the
+(filename, text) pairs written through munge.proc.cache.record_output.'''
+    filter_specs, doc_path, reader_args, verbose, break_on_exception = job
+    
+    filters = [filter_class(*args) for (filter_class, args) in filter_specs]
+    exceptions = []
+    
+    stdout, sys.stdout = sys.stdout, StringIO()
+    start_recording()
+    try:
+        for derivation_bundle in DirFileGuessReader(doc_path, verbose=verbose, **reader_args):
+            if verbose: info("Processing %s...", derivation_bundle.label())
+            try:
+                TraceCore.process_bundle(filters, derivation_bundle)
+            except Exception, e:
+                exceptions.append( (derivation_bundle.label(), traceback.format_exc()) )
+                
+                if break_on_exception: break
+        
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+        written = stop_recording()
+        
+    for filter in filters: filter.context = None
+    
+    return (exceptions, output,
+            [(filter if filter.merge is not None else None) for filter in filters],
+            written)
+
 class TraceCore(object):
     '''Implements filter loading functionality and the document processing loop.'''
-    def __init__(self, libraries, verbose=True, break_on_exception=False, reader_class_name=None):
+    def __init__(self, libraries, verbose=True, break_on_exception=False, reader_class_name=None, jobs=1, cache_dir=None, profile=None, prefetch=0):
         self.loaded_modules = set(load_requested_packages(libraries))
         self.update_available_filters_dict()
         
         self.verbose = verbose
         self.reader_class_name = reader_class_name
+        # Number of worker processes over which documents are distributed
+        self.jobs = jobs
+        # If set, the directory holding per-document results (see munge.proc.cache)
+        self.cache_dir = cache_dir
+        # If set, the munge.proc.profile.Profile accumulating timings for this run
+        self.profile = profile
+        # Number of documents to read ahead of the filters in a serial run (0 to read synchronously)
+        self.prefetch = prefetch
         
+        # The exceptions raised by the last run, as (derivation label, formatted traceback) pairs for
+        # every document, in either mode: neither bundles nor tracebacks can be sent between processes
         self.last_exceptions = []
         self._break_on_exception = break_on_exception
         
@@ -99,6 +150,8 @@ class TraceCore(object):
     def run(self, filters_to_run, files):
         '''Performs a processing run, given a list of filter names to run, and a list of file specifiers.'''
         filters = []
+        # (filter class, args) pairs, so that worker processes can construct their own instances
+        filter_specs = []
 
         for filter_name, args in filters_to_run:
             # For a no-args switch, optparse passes in None; we substitute an empty tuple for
@@ -114,6 +167,7 @@ class TraceCore(object):
                     continue
                     
                 filters.append(filter_class(*args))
+                filter_specs.append( (filter_class, args) )
             except KeyError:
                 err("No filter with name `%s' found.", filter_name)
                 
@@ -129,7 +183,7 @@ class TraceCore(object):
             
         files = [expand_short_notation(file) for file in files]
 
-        self.run_filters(filters, files)
+        self.run_filters(filters, files, filter_specs)
         
     @staticmethod
     def is_pair_spec(file):
@@ -161,7 +215,113 @@ phase/sec:doc(deriv) to full PCTB paths.'''
             return fn
         return (transform_element(fn) for fn in files)
 
-    def run_filters(self, filters, files):
+    @staticmethod
+    def process_bundle(filters, derivation_bundle):
+        '''Runs each of the given filters over a single derivation bundle.'''
+        for filter in filters:
+            filter.context = derivation_bundle
+
+        if filter.accept_leaf is not None:
+            # The rule which consumed each slash of each leaf is computed once for the derivation,
+            # and only if a filter asks for it
+            consumers = None
+            if any(filter.accept_comb_and_slash_index is not None for filter in filters):
+                try:
+                    consumers = slash_consumers(derivation_bundle.derivation)
+                except AttributeError: # derivations without categories, such as plain PTB
+                    pass
+                    
+            for leaf_index, leaf in enumerate(leaves(derivation_bundle.derivation)):
+                for filter in filters:
+                    filter.accept_leaf(leaf)
+
+                    if consumers and filter.accept_comb_and_slash_index is not None:
+                        for slash_index, comb in enumerate(consumers[leaf_index]):
+                            filter.accept_comb_and_slash_index(leaf, comb, slash_index)
+
+        for filter in filters:
+            filter.accept_derivation(derivation_bundle)
+            filter.context = None
+            
+    def can_run_by_document(self, filters, files):
+        '''Parallel and cached modes require every filter which accumulates state for output() to
+define merge, and cannot distribute paired (A~B) specifiers.'''
+        for filter in filters:
+            if type(filter).output.im_func is not Filter.output.im_func and filter.merge is None:
+                warn("Filter %s does not define merge, so running serially.", type(filter).__name__)
+                return False
+                
+        if any(self.is_pair_spec(file) for file in files):
+            warn("Paired specifiers cannot be processed document by document, so running serially.")
+            return False
+            
+        return True
+        
+    def make_cache(self, filters, filter_specs):
+        '''Returns the StageCache for this run, or None if caching is off or some filter has effects
+which the cache cannot replay.'''
+        if not self.cache_dir: return None
+        
+        for filter in filters:
+            if not is_cacheable(filter):
+                warn("Filter %s cannot be cached, so not using the cache.", type(filter).__name__)
+                return None
+                
+        return StageCache(self.cache_dir, filter_specs)
+
+    def run_filters_by_document(self, filters, filter_specs, files, reader_args, cache):
+        '''Processes each document named by _files_ with its own filter instances, distributing
+documents over _self.jobs_ worker processes, and replaying documents found in _cache_ instead of
+processing them. Returns False if processing was interrupted. Results are consumed in document
+order, so that output is identical to a serial run.'''
+        docs = [ doc_path for file in files
+                          for doc_path in DirFileGuessReader(file, verbose=self.verbose).document_paths() ]
+        keys = [ cache.key_for(doc_path) if cache else None for doc_path in docs ]
+        hits = [ cache is not None and key in cache for key in keys ]
+        
+        jobs = ( (filter_specs, doc_path, reader_args, self.verbose, self._break_on_exception)
+                 for (doc_path, hit) in izip(docs, hits) if not hit )
+        
+        self.last_exceptions = []
+        pool = Pool(processes=self.jobs) if self.jobs > 1 else None
+        results = pool.imap(process_document, jobs) if pool else imap(process_document, jobs)
+        try:
+            for doc_path, key, hit in izip(docs, keys, hits):
+                if hit:
+                    if self.verbose: info("Using cached result for %s...", doc_path)
+                    exceptions, output, worker_filters, written = cache[key]
+                    replay_output(written)
+                else:
+                    exceptions, output, worker_filters, written = results.next()
+                    # Documents which raised are not stored, so that their errors are seen again
+                    if cache and not exceptions:
+                        cache[key] = (exceptions, output, worker_filters, written)
+                        
+                try:
+                    sys.stdout.write(output)
+                except IOError, e:
+                    # The pager has gone away (see run_filters_serially)
+                    if e.errno == errno.EPIPE:
+                        if pool: pool.terminate()
+                        return False
+                    raise
+                    
+                for filter, worker_filter in izip(filters, worker_filters):
+                    if worker_filter is not None:
+                        filter.merge(worker_filter)
+                    
+                self.report_exceptions(exceptions, doc_path)
+                    
+            if pool: pool.close()
+        except:
+            if pool: pool.terminate()
+            raise
+        finally:
+            if pool: pool.join()
+            
+        return True
+
+    def run_filters(self, filters, files, filter_specs=None):
         # If all given filters were not found or had wrong argument count, do nothing
         if not filters: return
         
@@ -174,67 +334,88 @@ phase/sec:doc(deriv) to full PCTB paths.'''
                 reader_args['reader_class'] = reader_class
             except KeyError:
                 raise RuntimeError("Reader class %s not found." % self.reader_class_name)
-        
-        for file in self.transform(files):
+                
+        files = list(self.transform(files))
+        if self.profile:
+            # Timings are only collected in this process
+            if self.jobs > 1 or self.cache_dir:
+                warn("Profiling, so running serially without the cache.")
+            for filter in filters:
+                self.profile.instrument(filter)
+                
+            completed = self.run_filters_serially(filters, files, reader_args)
+        elif ((self.jobs > 1 or self.cache_dir) and filter_specs and
+            self.can_run_by_document(filters, files)):
+            cache = self.make_cache(filters, filter_specs)
+            completed = self.run_filters_by_document(filters, filter_specs, files, reader_args, cache)
+        else:
+            completed = self.run_filters_serially(filters, files, reader_args)
+        # Output was interrupted (see run_filters_serially)
+        if not completed: return
+
+        for filter in filters:
+            filter.output()
+            if self.verbose:
+                print >>sys.stderr, "---"
+                
+    def report_exceptions(self, exceptions, file):
+        '''Reports the (label, formatted traceback) pairs _exceptions_ raised by derivations of _file_, and
+adds them to last_exceptions.'''
+        self.last_exceptions.extend(exceptions)
+        for label, formatted_exception in exceptions:
+            err("Processing failed on derivation %s of file %s:", label, file)
+            sys.stderr.write(formatted_exception)
+            
+    def run_filters_serially(self, filters, files, reader_args):
+        '''Runs the filters over each derivation in turn, returning False if processing was
+interrupted.'''
+        self.last_exceptions = []
+        for file in files:
             if self.is_pair_spec(file):
                 meta_reader = PairedReader
+            elif self.prefetch:
+                meta_reader = curry(PrefetchingReader, depth=self.prefetch)
             else:
                 meta_reader = DirFileGuessReader
                 
+            # The exceptions raised by derivations of this file
+            exceptions = []
             try:
-                self.last_exceptions = []
+                reader = meta_reader(file, verbose=self.verbose, **reader_args)
+                if self.profile: reader = self.profile.timed_reader(reader)
                 
-                for derivation_bundle in meta_reader(file, verbose=self.verbose, **reader_args):
+                for derivation_bundle in reader:
                     if self.verbose: info("Processing %s...", derivation_bundle.label())
                     try:
-                        for filter in filters:
-                            filter.context = derivation_bundle
-
-                        if filter.accept_leaf is not None:
-                            for leaf in leaves(derivation_bundle.derivation):
-                                for filter in filters:
-                                    filter.accept_leaf(leaf)
-
-                                    if filter.accept_comb_and_slash_index is not None:
-                                        try:
-                                            for slash_index, comb in enumerate(applications_per_slash(leaf)):
-                                                filter.accept_comb_and_slash_index(leaf, comb, slash_index)
-                                        except AttributeError: # TODO: hacky and inefficient, need this to work for PTB too
-                                            pass
-
-                        for filter in filters:
-                            filter.accept_derivation(derivation_bundle)
-                            filter.context = None
+                        if self.profile:
+                            start = time.time()
+                            self.process_bundle(filters, derivation_bundle)
+                            self.profile.add_derivation(derivation_bundle.label(), time.time() - start)
+                        else:
+                            self.process_bundle(filters, derivation_bundle)
                             
                     except IOError, e:
                         # If output is going to a pager, and the user requests an interrupt (^C)
                         # the filter fails with IOError: Broken pipe
                         # In that case, running filters on further derivations will continue to
                         # lead to 'Broken pipe', so just bail out
-                        if e.errno == errno.EPIPE: return
+                        if e.errno == errno.EPIPE: return False
                             
                     except Exception, e:
-                        self.last_exceptions.append( (derivation_bundle, sys.exc_info()) )
+                        exceptions.append( (derivation_bundle.label(), traceback.format_exc()) )
                         
                         if self._break_on_exception:
                             raise FilterException(e, None)
                 else:
-                    if self.last_exceptions:
+                    if exceptions:
                         raise FilterException(e, None)
                         
             except FilterException, e:
-                for bundle, exception in self.last_exceptions:
-                    err("Processing failed on derivation %s of file %s:", bundle.label(), file)
-                    sys.excepthook(*exception)
+                self.report_exceptions(exceptions, file)
                     
             except IOError, e:
-                for bundle, exception in self.last_exceptions:
-                    err("Processing failed on derivation %s of file %s:", bundle.label(), file)
-                    sys.excepthook(*exception)
+                self.report_exceptions(exceptions, file)
                 err("Processing failed with IOError: %s", e)
                 raise
-
-        for filter in filters:
-            filter.output()
-            if self.verbose:
-                print >>sys.stderr, "---"
+                
+        return True
@@ -11,17 +11,18 @@ from munge.ccg.nodes import Leaf, Node
 from munge.quote.base import BaseQuoter
 from munge.quote.utils import make_open_quote_leaf, make_closed_quote_leaf
 from munge.trees.traverse import leaves, get_leaf
+from munge.trees.index import TreeIndex
 from munge.cats.paths import lca
 
 class LCAQuoter(BaseQuoter):
     def attach_quotes(self, deriv, span_begin, span_end, quote_type, higher, quotes):
-        leaf_count = len(list(leaves(deriv)))
+        index = TreeIndex(deriv)
         
         first_index = 0 if (span_begin is None) else span_begin
         last_index =  0 if (span_end is None)   else span_end
         
-        begin_node = get_leaf(deriv, first_index, "forwards")
-        end_node = get_leaf(deriv, last_index, "backwards")
+        begin_node = get_leaf(deriv, first_index, "forwards", index)
+        end_node = get_leaf(deriv, last_index, "backwards", index)
         
         if end_node:
             end_node = self.punct_class.process_punct(deriv, end_node, span_end)
@@ -8,7 +8,8 @@
 # notify the maintainer Daniel Tse <cncandc@gmail.com>.
 
 from munge.trees.traverse import text_in_span, text
-from munge.trees.traverse import leaves, get_leaf
+from munge.trees.traverse import get_leaf
+from munge.trees.index import TreeIndex
 from munge.util.list_utils import is_sublist
 from munge.ccg.nodes import Node, Leaf
 
@@ -28,20 +29,21 @@ the quotes have been inserted. Either b or e may be None to indicate that no ope
         first_index = 0 if (span_begin is None) else span_begin
         last_index = 0 if (span_end is None) else span_end
         
-        leaf_count = len(list(leaves(deriv)))
-        quoted_text = list(text_in_span(deriv, first_index, (leaf_count - last_index)))
+        index = TreeIndex(deriv)
+        leaf_count = len(index.leaves_under(deriv))
+        quoted_text = list(text_in_span(deriv, first_index, (leaf_count - last_index), index))
         
         if (first_index is not None) or (last_index is not None):
             if higher == "left":
                 if do_right:
-                    deriv = self.insert_quote(deriv, tokens=quoted_text, at=span_end, quote="end", quote_type=quote_type)
+                    deriv = self.insert_quote(deriv, tokens=quoted_text, at=span_end, quote="end", quote_type=quote_type, index=index)
                 if do_left:
-                    deriv = self.insert_quote(deriv, tokens=quoted_text, at=span_begin, quote="begin", quote_type=quote_type)
+                    deriv = self.insert_quote(deriv, tokens=quoted_text, at=span_begin, quote="begin", quote_type=quote_type, index=index)
             elif higher == "right":
                 if do_left:
-                    deriv = self.insert_quote(deriv, tokens=quoted_text, at=span_begin, quote="begin", quote_type=quote_type)
+                    deriv = self.insert_quote(deriv, tokens=quoted_text, at=span_begin, quote="begin", quote_type=quote_type, index=index)
                 if do_right:
-                    deriv = self.insert_quote(deriv, tokens=quoted_text, at=span_end, quote="end", quote_type=quote_type)
+                    deriv = self.insert_quote(deriv, tokens=quoted_text, at=span_end, quote="end", quote_type=quote_type, index=index)
                     
         quote_indices = []
         if (span_begin is not None) and do_left:
@@ -56,21 +58,24 @@ the quotes have been inserted. Either b or e may be None to indicate that no ope
             
         return deriv, quote_indices
         
-    def insert_quote(self, deriv, tokens, at, quote, quote_type):
+    def insert_quote(self, deriv, tokens, at, quote, quote_type, index=None):
         '''Performs the actual quote insertion. Returns the root of the newly quoted derivation (which may differ
-from the root of the input derivation).'''
+from the root of the input derivation). If a TreeIndex _index_ of the derivation is given, the quoted leaf is
+found through it, and the index is invalidated if the derivation changes.'''
 
         if quote == "begin": direction = "forwards"
         elif quote == "end": direction = "backwards"
         
         double = (quote_type == "``")
         
-        node = get_leaf(deriv, at, direction)
+        node = get_leaf(deriv, at, direction, index)
         
         if (at is not None) and node:
             if quote == "end": # Process absorbed punctuation
                 if self.punct_class:
                     node = self.punct_class.process_punct(deriv, node, at)
+                    # ShiftComma may have moved the punctuation leaf
+                    if index is not None: index.invalidate()
             
             if node and is_sublist(smaller=text(node), larger=tokens):
                 attachment_node = node
@@ -91,12 +96,14 @@ from the root of the input derivation).'''
                                     parent=None, lch=attachment_node,
                                     rch=make_closed_quote_leaf(None, double))
                                     
+                if index is not None: index.invalidate()
                 if prev_parent:
                     if was_left_child:
                         prev_parent.lch = new_node
                     else:
                         prev_parent.rch = new_node
                 else:
+                    if index is not None: index.root = new_node
                     return new_node # Replace the old root
 
         return deriv
\ No newline at end of file
@@ -11,6 +11,7 @@ import os
 import unittest
 from munge.cats.nodes import *
 from munge.cats.parse import *
+from munge.cats.canonical import canonical
 from munge.vis.dot import *
 
 class CatTests(unittest.TestCase):
@@ -34,6 +35,82 @@ class CatTests(unittest.TestCase):
 
         self.assertEqual(repr(cat), r'(S\-NP[b])/.(S[c]/@NP)[feat]')
 
+    def testCanonicalCategories(self):
+        a = canonical(parse_category(r'(S[dcl]\NP)/(S[dcl]\NP)'))
+        b = canonical(ComplexCategory(parse_category(r'S[dcl]\NP'), FORWARD, parse_category(r'S[dcl]\NP'), ALL))
+        self.assert_(a is b)
+        self.assert_(a.left is a.right)
+
+        # Equality ignores features, so [dcl] makes a distinct canonical category which is still ==
+        c = canonical(self.n2)
+        self.assert_(c is not a)
+        self.assertNotEqual(c.id, a.id)
+        self.assertEqual(c, a)
+        self.assertEqual(hash(c), hash(self.n2))
+        self.assertEqual(a, parse_category(r'(S\NP)/(S\NP)'))
+        self.assertNotEqual(c, canonical(parse_category(r'(S\NP)\(S\NP)')))
+
+        # The memoised parser remembers the canonical category of each category it returns
+        self.assert_(canonical.known(self.n2) is c)
+        self.assert_(canonical.known(self.n) is self.n)
+
+        # Clones of canonical categories are mutable
+        d = c.clone()
+        d.labelled()
+        self.assertFalse(c.is_labelled())
+
+    def testHeadedCategoryTemplates(self):
+        from munge.cats.headed.parse import parse_category as parse_headed, parse_uncached_category
+
+        cat_string = r'((S[dcl]{_}\NP{Y}){_}/(S[dcl]{Z}/NP{Y}){Z}){_}~SB'
+        a, b = parse_headed(cat_string), parse_headed(cat_string)
+        self.assertEqual(repr(a), repr(parse_uncached_category(cat_string)))
+
+        # Categories sharing a variable share a slot, but instances do not share slots
+        self.assert_(a.left.right.slot is a.right.right.slot)
+        self.assert_(a.slot is a.left.slot)
+        self.assert_(a.right.slot is not a.left.slot)
+        self.assert_(a.slot is not b.slot)
+        self.assertEqual(a.alias, 'SB')
+
+        a.left.features.append('conj')
+        self.assertEqual(b.left.features, [])
+
+    def testCanonicalHints(self):
+        from munge.cats.headed.parse import parse_category as parse_headed
+
+        cat = parse_headed(r'((S[dcl]{_}\NP{Y}){_}/NP{Z}){_}')
+        self.assert_(canonical(cat) is cat.canonical_hint)
+        self.assert_(canonical(cat) is canonical.lookup(cat))
+
+        # Categories rewritten in place no longer match their hints
+        old_hint = cat.canonical_hint
+        cat.left._left = parse_headed('S[q]{_}')
+        self.assert_(canonical(cat) is not old_hint)
+        self.assert_(canonical(cat) is canonical.lookup(cat))
+        self.assertEqual(str(canonical(cat)), r'(S[q]\NP)/NP')
+
+        cat.features.append('conj')
+        self.assertEqual(str(canonical(cat)), r'((S[q]\NP)/NP)[conj]')
+
+    def testSlotUnification(self):
+        from munge.cats.headed.nodes import Slot
+
+        slots = [ Slot('X%d' % i) for i in xrange(10) ]
+        for slot, next in zip(slots, slots[1:]):
+            slot.unify_heads(next)
+        # Unifying two slots already in the same set changes nothing
+        slots[0].unify_heads(slots[-1])
+
+        self.assert_(all(slot.head is slots[-1].head for slot in slots))
+        slots[3].head.lex = 'head'
+        self.assert_(all(slot.is_filled() for slot in slots))
+
+        other = Slot('Y', 'other')
+        slots[5].unify_heads(other)
+        self.assertEqual([ slot.head.lex for slot in slots ], ['other'] * len(slots))
+        self.assertNotEqual(slots[0], slots[1])
+
     def tearDown(self):
         if os.path.exists('cat.dot'):
             os.remove('cat.dot')
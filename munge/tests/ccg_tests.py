@@ -10,7 +10,8 @@
 import os
 import unittest
 from munge.ccg.nodes import Node, Leaf
-from munge.ccg.parse import parse_tree
+from munge.ccg.parse import parse_tree, python_parse_tree, c_parse_tree
+from munge.util.exceptions import CCGbankParseException
 from munge.cats.nodes import AtomicCategory
 from munge.vis.dot import *
 
@@ -38,5 +39,25 @@ class CCGTests(unittest.TestCase):
         if os.path.exists('ccg_deriv.dot'):
             os.remove('ccg_deriv.dot')
 
+class CCGParserTests(unittest.TestCase):
+    def setUp(self):
+        with open('munge/tests/wsj_0003.auto', 'r') as f:
+            self.deriv_strings = [line.strip() for line in f if line.startswith('(')]
+        
+    def testCParserAgreesWithPythonParser(self):
+        try:
+            import ccgparse
+        except ImportError:
+            return
+            
+        for deriv_string in self.deriv_strings:
+            self.assertEqual(repr(c_parse_tree(deriv_string)), repr(python_parse_tree(deriv_string)))
+        
+        tree = c_parse_tree(self.deriv_strings[0])
+        self.assertEqual(tree.lch.parent, tree)
+        
+        for malformed in ('(<T NP 0 2> (<L N NN NN x N>)', '(<X NP>)', '(<L N NN x N>)', '(<L N NN NN x N>) x'):
+            self.assertRaises(CCGbankParseException, c_parse_tree, malformed)
+
 if __name__ == '__main__':
     unittest.main()
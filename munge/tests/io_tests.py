@@ -0,0 +1,91 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+import unittest
+import os, shutil, tempfile
+
+from munge.ccg.io import CCGbankReader
+from munge.penn.io import PTBReader
+from munge.penn.prefaced_io import PrefacedPTBReader
+from munge.trees.traverse import text
+from munge.io.offsets import offsets_filename
+from munge.io.multi import MultiGuessReader
+
+PTBDocument = '''( (S (NP (DT the) (NN cat))
+   (VP (VBD sat))) )
+( (S (NP (PRP it))
+   (VP (VBD slept))) )
+( (S (NP (NNS cats)) (VP (VBP sleep))) )
+'''
+
+PrefacedDocument = '''ID=wsj_0001.1 PARSER=GOLD NUMPARSE=1
+((IP <0> {S[dcl]} (IP <1> {S[dcl]} (PN-SBJ:l {NP} ta) (VP:h <1> {S[dcl]\\NP} (AD:a {(S\\NP)/(S\\NP)} yijing) (VP:h <0> {S[dcl]\\NP} (VV:h {S[dcl]\\NP} zou) (AS:a {(S\\NP)\\(S\\NP)} le)))) (PU {.} .)))
+'''
+
+class IOTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        
+        self.ccg_filename = os.path.join(self.dir, 'wsj_0003.auto')
+        shutil.copy('munge/tests/wsj_0003.auto', self.ccg_filename)
+        
+        self.prefaced_filename = os.path.join(self.dir, 'chtb_0001.fid')
+        with open(self.prefaced_filename, 'w') as f:
+            f.write(PrefacedDocument)
+        
+        self.ptb_filename = os.path.join(self.dir, 'wsj_0001.mrg')
+        with open(self.ptb_filename, 'w') as f:
+            f.write(PTBDocument)
+        
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        
+    def testCCGbankIndexedDerivation(self):
+        bundles = list(CCGbankReader(self.ccg_filename))
+        for bundle in (bundles[0], bundles[11], bundles[-1]):
+            indexed = list(CCGbankReader('%s:%d' % (self.ccg_filename, bundle.der_no)))
+            self.assertEqual(len(indexed), 1)
+            self.assertEqual(str(indexed[0]), str(bundle))
+            
+        self.assertEqual(list(CCGbankReader('%s:%d' % (self.ccg_filename, len(bundles)+1))), [])
+        self.assertTrue(os.path.exists(offsets_filename(self.ccg_filename)))
+        
+    def testPTBIndexedDerivation(self):
+        bundles = list(PTBReader(self.ptb_filename))
+        self.assertEqual(len(bundles), 3)
+        
+        for bundle in bundles:
+            indexed = list(PTBReader('%s:%d' % (self.ptb_filename, bundle.der_no)))
+            self.assertEqual(len(indexed), 1)
+            self.assertEqual(str(indexed[0]), str(bundle))
+            
+    def testStaleIndexRebuilt(self):
+        first = str(list(PTBReader(self.ptb_filename + ':1'))[0])
+        
+        with open(self.ptb_filename, 'w') as f:
+            f.write('( (S (NP (NN dog)) (VP (VBD barked))) )\n' + PTBDocument)
+            
+        self.assertNotEqual(str(list(PTBReader(self.ptb_filename + ':2'))[0]), str(list(PTBReader(self.ptb_filename + ':1'))[0]))
+        self.assertEqual(str(list(PTBReader(self.ptb_filename + ':2'))[0]), first)
+        
+    def testIndexNotReadAsDocument(self):
+        list(PTBReader(self.ptb_filename + ':1'))
+        self.assertTrue(os.path.exists(offsets_filename(self.ptb_filename)))
+        self.assertEqual(sorted(MultiGuessReader(self.dir).document_paths()),
+                         sorted([self.ccg_filename, self.prefaced_filename, self.ptb_filename]))
+                         
+    def testLazyTokens(self):
+        for bundle in list(CCGbankReader(self.ccg_filename)) + list(PrefacedPTBReader(self.prefaced_filename)):
+            tokens = bundle.tokens()
+            # Reading the tokens does not build the tree
+            self.assertTrue(bundle._derivation is None)
+            self.assertEqual(tokens, text(bundle.derivation))
+            
+        bundle = list(PrefacedPTBReader(self.prefaced_filename))[0]
+        self.assertEqual(bundle.tokens(), ['ta', 'yijing', 'zou', 'le', '.'])
@@ -94,6 +94,240 @@ class TgrepTests(unittest.TestCase):
         self.assertTrue(matches(self.tree, r'{((S\NP)\(S\NP))\NP $ NP} < T | > (S\NP)\(S\NP)'))
         self.assertFalse(matches(self.tree, r'{((S\NP)\(S\NP))\NP $ NP} < A | > B | $ C'))
         self.assertTrue(matches(self.tree, r'{((S\NP)\(S\NP))\NP $ NP} < A | > (S\NP)\(S\NP) | $ C'))
-        
+
+    def testCompiledQueries(self):
+        from munge.proc.tgrep.nodes import Context
+        from munge.trees.traverse import nodes
+
+        for expression in (r'*', r'^findings', r'^/pre/', r'/S/ << ^findings', r'NP ! $ NP[conj] > *',
+                           r'S[dcl]\NP [< (S[dcl]\NP)/(S[pss]\NP) #<2]', r'{NP $ NP[conj]} > * #<2',
+                           r'* >> S[dcl] . ^year', r'*=x <1 =x', r'*=x $ ~x', r'* ? < *=x',
+                           r'{((S\NP)\(S\NP))\NP $ NP} < A | > (S\NP)\(S\NP) | $ C'):
+            query, matcher = parse_query(expression), compile_expression(expression)
+
+            nmatched = 0
+            for node in nodes(self.tree):
+                interpreted_context, compiled_context = Context(), Context()
+
+                matched = bool(query.is_satisfied_by(node, interpreted_context))
+                self.assertEqual(matched, bool(matcher(node, compiled_context)))
+                self.assertEqual(interpreted_context, compiled_context)
+
+                if matched: nmatched += 1
+            self.assertEqual(nmatched, len(list(find_all(self.tree, expression))))
+
+    def testPlannedConstraints(self):
+        from munge.proc.tgrep.nodes import Context, plan_constraints
+        from munge.trees.traverse import nodes
+
+        query = parse_query(r'NP << ^findings < N .. ^problem $ *=x << N/N < NP[nb]/N $ =x')
+        self.assertEqual(map(str, plan_constraints(query.constraints)),
+                         ['< N', '<< ^findings', '.. ^problem', '$ *=x', '< NP[nb]/N', '<< N/N', '$ =x'])
+
+        # Reordering changes neither the matches nor the captures
+        for expression in (r'NP << ^findings < N .. ^problem $ *=x << N/N < NP[nb]/N $ =x',
+                           r'* .. ^problem ? < *=x <1 N/N', r'* >> S[dcl] [<< ^findings < N ] $ NP[conj]'):
+            query, matcher = parse_query(expression), compile_expression(expression)
+            for node in nodes(self.tree):
+                interpreted_context, compiled_context = Context(), Context()
+                self.assertEqual(bool(query.is_satisfied_by(node, interpreted_context)),
+                                 bool(matcher(node, compiled_context)))
+                self.assertEqual(interpreted_context, compiled_context)
+
+        # Penn trees have no head index, so a head operator must still be guarded by the constraints before it
+        from munge.penn.parse import parse_tree, PennParser
+        tree = parse_tree('( (IP (NP (NN a)) (VP (VV b))) )', PennParser)[0]
+        for expression in (r'VP < NR ##0', r'VP << NR ##0', r'VP < NR <# *'):
+            constraints = parse_query(expression).constraints
+            self.assertEqual(plan_constraints(constraints), constraints)
+            self.assertEqual(list(find_all(tree, expression)), [])
+
+    def testTreeIndex(self):
+        from munge.proc.tgrep.nodes import Context
+        from munge.trees.index import TreeIndex
+        from munge.trees.traverse import nodes
+
+        index = TreeIndex(self.tree)
+        all_nodes = list(nodes(self.tree))
+        self.assertEqual([ index.number(node) for node in all_nodes ], range(len(all_nodes)))
+        for i, node in enumerate(all_nodes):
+            self.assertEqual([ j for j in xrange(len(all_nodes)) if index.dominates(i, j) ],
+                             [ index.number(descendant) for descendant in list(nodes(node))[1:] ])
+
+        # The dominance operators give the same matches and captures with and without the index
+        for expression in (r'S[dcl] << "."', r'/S/ << {NP ? < *=x}', r'^findings >> S[dcl]\NP',
+                           r'* >> {NP $ NP[conj]}', r'NP[nb]/N ! >> S[dcl]', r'* << ^findings'):
+            matcher = compile_expression(expression)
+            for node in all_nodes:
+                indexed_context, context = Context(index), Context()
+                self.assertEqual(bool(matcher(node, indexed_context)), bool(matcher(node, context)))
+                self.assertEqual(indexed_context, context)
+
+    def testLeafPositions(self):
+        from munge.proc.tgrep.nodes import Context
+        from munge.trees.index import TreeIndex
+        from munge.trees.traverse import nodes, leaves, get_leaf, get_index_of_leaf, text_in_span
+
+        index = TreeIndex(self.tree)
+        all_leaves = list(leaves(self.tree))
+        self.assertEqual([ index.leaf_index(leaf) for leaf in all_leaves ], range(len(all_leaves)))
+        self.assertEqual(index.leaf(len(all_leaves)), None)
+
+        for node in nodes(self.tree):
+            under = list(leaves(node))
+            first, last = index.span(node)
+            self.assertEqual(all_leaves[first:last+1], under)
+            self.assertEqual(index.leaves_under(node), under)
+
+            for i in xrange(len(under) + 1):
+                self.assertEqual(get_leaf(node, i, index=index), get_leaf(node, i))
+                self.assertEqual(get_leaf(node, i, "backwards", index), get_leaf(node, i, "backwards"))
+            self.assertEqual(list(text_in_span(node, 1, 3, index)), list(text_in_span(node, 1, 3)))
+            self.assertEqual(get_index_of_leaf(node, under[-1], index), get_index_of_leaf(node, under[-1]))
+            self.assertEqual(get_index_of_leaf(node, all_leaves[0], index), get_index_of_leaf(node, all_leaves[0]))
+
+        # A .. B holds when B is a leaf after A
+        self.assertTrue(matches(self.tree, r'^were . ^reported'))
+        self.assertTrue(matches(self.tree, r'^were .. ^latest'))
+        self.assertFalse(matches(self.tree, r'^were . ^latest'))
+        self.assertFalse(matches(self.tree, r'^latest .. ^were'))
+
+        for expression in (r'* . ^reported', r'* .. ^latest', r'* .. /N/', r'^findings .. *=x'):
+            matcher = compile_expression(expression)
+            for node in nodes(self.tree):
+                indexed_context, context = Context(index), Context()
+                self.assertEqual(bool(matcher(node, indexed_context)), bool(matcher(node, context)))
+                self.assertEqual(indexed_context, context)
+
+    def testMultiTgrep(self):
+        from munge.trees.traverse import nodes
+
+        matched = []
+        def callback(expression):
+            return lambda node, **context: matched.append((expression, node))
+        callbacks = dict((expression, callback(expression)) for expression in
+                         (r'NP', r'/S/ < "."', r'*=x $ NP[conj]', r'NP[nb]/N', r'^findings', r'{NP $ NP[conj]}'))
+        multi_tgrep(self.tree, callbacks)
+
+        # Each node in pre-order, against each expression in turn
+        expected = [ (expression, node) for node in nodes(self.tree) for expression in callbacks.iterkeys()
+                     if any(match is node for match in find_all(self.tree, expression)) ]
+        self.assertEqual(matched, expected)
+
+        # A callback which relabels a node exposes it to the later expressions anchored on its new label
+        from munge.penn.parse import parse_tree, PennParser
+        tree = parse_tree('( (IP (NP (NN a)) (VP (VV b))) )', PennParser)[0]
+        fired = []
+        def relabel(node):
+            fired.append(('NP', node.tag))
+            node.tag = 'XP'
+        callbacks = { 'NP': relabel, 'XP': lambda node: fired.append(('XP', node.tag)) }
+        self.assertEqual(callbacks.keys(), ['NP', 'XP'])
+        multi_tgrep(tree, callbacks)
+        self.assertEqual(fired, [('NP', 'NP'), ('XP', 'XP')])
+
+    def testCorpusIndex(self):
+        import shutil, tempfile
+        from munge.proc.tgrep.corpus_index import Prefilter
+
+        index_dir = tempfile.mkdtemp()
+        try:
+            index_file = os.path.join(index_dir, 'index')
+            builder = BuildTgrepIndex(index_file)
+            for bundle in CCGbankReader('munge/tests/wsj_0003.auto'):
+                builder.accept_derivation(bundle)
+            builder.output()
+
+            for expression in (r'^findings', r'NP < ^findings', r'S[dcl] << { N/N $ ^Journal }', r'NP ! < ^findings',
+                               r'* < ^findings | < ^years', r'/N/ < ^findings', r'^nowhere', r'NP'):
+                prefilter = Prefilter(parse_query(expression), index_file)
+                for bundle in CCGbankReader('munge/tests/wsj_0003.auto'):
+                    # A derivation is only passed over if the query cannot match it
+                    if not prefilter.may_match(bundle):
+                        self.assertFalse(matches(bundle.derivation, expression))
+
+            prefilter = Prefilter(parse_query(r'NP < ^findings'), index_file)
+            self.assertEqual([ bundle.label() for bundle in CCGbankReader('munge/tests/wsj_0003.auto')
+                                              if prefilter.may_match(bundle) ], ['0:3(4)'])
+
+            # A derivation which has changed since it was indexed is always processed
+            bundle = CCGbankReader('munge/tests/wsj_0003.auto')[1]
+            bundle.text = bundle.text.replace('<L', ' <L')
+            self.assertTrue(prefilter.may_match(bundle))
+        finally:
+            shutil.rmtree(index_dir)
+
+    def testParallelSearch(self):
+        import shutil, tempfile
+        from munge.proc.tgrep.search import search
+
+        corpus_dir = tempfile.mkdtemp()
+        try:
+            section_dir = os.path.join(corpus_dir, '00')
+            os.makedirs(section_dir)
+            for fn in ('munge/tests/wsj_0003.auto', 'munge/tests/wsj_0087.auto'):
+                shutil.copy(fn, section_dir)
+
+            def run(**kwargs):
+                return [ (os.path.basename(doc_path), nderivs, nmatched, [ (match.label, match.node, match.captures) for match in matches ])
+                         for doc_path, nderivs, nmatched, matches, exceptions in search(r'/NP/=x < N', [corpus_dir], **kwargs) ]
+
+            serial = run(jobs=1, find_all=True)
+            self.assertEqual([ doc for doc, _, _, _ in serial ], ['wsj_0003.auto', 'wsj_0087.auto'])
+            self.assertEqual(serial, run(jobs=2, find_all=True))
+
+            expected = [ (bundle.label(), str(node))
+                         for bundle in CCGbankReader('munge/tests/wsj_0003.auto')
+                         for node in find_all(bundle.derivation, r'/NP/=x < N') ]
+            self.assertEqual([ (label, node) for label, node, _ in serial[0][3] ], expected)
+            self.assertEqual(serial[0][3][0][2], { 'x': serial[0][3][0][1] })
+
+            # The search stops within the first document once enough matches have been found
+            limited = run(jobs=2, find_all=True, limit=3)
+            self.assertEqual(len(limited), 1)
+            self.assertEqual(limited[0][3], serial[0][3][:3])
+        finally:
+            shutil.rmtree(corpus_dir)
+
+    def testSearchStopsAtLimit(self):
+        import shutil, tempfile
+        import munge.proc.tgrep.search as search_module
+
+        corpus_dir = tempfile.mkdtemp()
+        search_document = search_module.search_document
+        try:
+            section_dir = os.path.join(corpus_dir, '00')
+            os.makedirs(section_dir)
+            for i in xrange(6):
+                shutil.copy('munge/tests/wsj_0087.auto', os.path.join(section_dir, 'wsj_%04d.auto' % i))
+
+            searched = []
+            def counting_search_document(job):
+                searched.append(job[1])
+                return search_document(job)
+            search_module.search_document = counting_search_document
+
+            results = list(search_module.search(r'/NP/=x < N', [corpus_dir], jobs=1, limit=1))
+            self.assertEqual(sum(len(matches) for _, _, _, matches, _ in results), 1)
+            # Only the document holding the first match is searched
+            self.assertEqual(len(searched), 1)
+        finally:
+            search_module.search_document = search_document
+            shutil.rmtree(corpus_dir)
+
+    def testTreeIndexInvalidatedAfterMatch(self):
+        from munge.penn.parse import parse_tree, PennParser
+        from munge.penn.nodes import Leaf
+
+        tree = parse_tree('( (S (NP (NN a)) (VP (VV b) (NP (NN c)))) )', PennParser)[0]
+        matched = []
+        for node in tgrep(tree, r'* << NN', left_to_right=True):
+            matched.append(node.tag)
+            # Once S has matched, nothing under the VP dominates an NN any more
+            if node.tag == 'S':
+                tree[1][1][0] = Leaf('X', 'c', None)
+
+        self.assertEqual(matched, ['S', 'NP'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,153 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+import unittest
+import os, sys, shutil, tempfile
+from StringIO import StringIO
+from glob import glob
+
+from munge.proc.filter import Filter
+from munge.proc.trace_core import TraceCore
+from munge.proc.profile import Profile
+from munge.trees.traverse import leaves
+from apps.cn.output import OutputDerivation
+
+class WriteDerivations(Filter, OutputDerivation):
+    def __init__(self, outdir):
+        Filter.__init__(self)
+        OutputDerivation.__init__(self, outdir, transformer=lambda bundle: repr(bundle.derivation))
+
+    def accept_derivation(self, bundle):
+        self.write_derivation(bundle)
+
+class CountLeaves(Filter):
+    def __init__(self):
+        Filter.__init__(self)
+        self.nleaves = 0
+
+    def accept_derivation(self, bundle):
+        self.nleaves += len(list(leaves(bundle.derivation)))
+
+    def merge(self, other):
+        self.nleaves += other.nleaves
+
+class FailOnFirstDerivation(Filter):
+    def accept_derivation(self, bundle):
+        if bundle.label().endswith('(1)'): raise RuntimeError(bundle.label())
+
+class TraceCoreTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+        section_dir = os.path.join(self.dir, 'in', '00')
+        os.makedirs(section_dir)
+        for fn in ('munge/tests/wsj_0003.auto', 'munge/tests/wsj_0087.auto'):
+            shutil.copy(fn, section_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_with_jobs(self, jobs, *filters):
+        tracer = TraceCore(libraries=[], verbose=False, jobs=jobs)
+        tracer.run_filters([filter_class(*args) for (filter_class, args) in filters],
+                           [os.path.join(self.dir, 'in')],
+                           filters)
+        return tracer
+
+    def read_outputs(self, outdir):
+        return dict( (os.path.basename(fn), open(fn).read())
+                     for fn in glob(os.path.join(self.dir, outdir, '*')) )
+
+    def testParallelOutputIdenticalToSerial(self):
+        self.run_with_jobs(1, (WriteDerivations, (os.path.join(self.dir, 'serial'),)))
+        self.run_with_jobs(2, (WriteDerivations, (os.path.join(self.dir, 'parallel'),)))
+
+        serial, parallel = self.read_outputs('serial'), self.read_outputs('parallel')
+        self.assertEqual(len(serial), 2)
+        self.assertEqual(serial, parallel)
+
+    def testPrefetchOutputIdenticalToSerial(self):
+        for prefetch, outdir in ((0, 'serial'), (1, 'prefetched')):
+            tracer = TraceCore(libraries=[], verbose=False, prefetch=prefetch)
+            tracer.run_filters([WriteDerivations(os.path.join(self.dir, outdir))], [os.path.join(self.dir, 'in')])
+        
+        serial, prefetched = self.read_outputs('serial'), self.read_outputs('prefetched')
+        self.assertEqual(len(serial), 2)
+        self.assertEqual(serial, prefetched)
+
+    def testPrefetchParsesAhead(self):
+        from munge.io.multi import PrefetchingReader
+        bundles = list(PrefetchingReader(os.path.join(self.dir, 'in'), verbose=False))
+
+        self.assertEqual(len(set(bundle.doc_no for bundle in bundles)), 2)
+        # Each derivation was parsed on the reader thread, before the consumer asked for it
+        self.assertTrue(all(bundle._derivation is not None for bundle in bundles))
+
+    def testParallelMerge(self):
+        serial, parallel = CountLeaves(), CountLeaves()
+
+        tracer = TraceCore(libraries=[], verbose=False, jobs=1)
+        tracer.run_filters([serial], [os.path.join(self.dir, 'in')], [(CountLeaves, ())])
+        tracer.jobs = 2
+        tracer.run_filters([parallel], [os.path.join(self.dir, 'in')], [(CountLeaves, ())])
+
+        self.assertTrue(serial.nleaves > 0)
+        self.assertEqual(serial.nleaves, parallel.nleaves)
+
+    def testParallelExceptions(self):
+        # Serial and parallel runs keep the exceptions from every document, in the same shape
+        for jobs in (1, 2):
+            tracer = TraceCore(libraries=[], verbose=False, jobs=jobs)
+            stderr, sys.stderr = sys.stderr, StringIO()
+            try:
+                tracer.run_filters([FailOnFirstDerivation()], [os.path.join(self.dir, 'in')], [(FailOnFirstDerivation, ())])
+                reported = sys.stderr.getvalue()
+            finally:
+                sys.stderr = stderr
+
+            self.assertEqual(sorted(label for label, _ in tracer.last_exceptions), ['0:3(1)', '0:87(1)'])
+            self.assertTrue(all('RuntimeError' in formatted for _, formatted in tracer.last_exceptions))
+            self.assertEqual(reported.count('Processing failed on derivation'), 2)
+
+    def testCacheReplaysOutput(self):
+        cache_dir = os.path.join(self.dir, 'cache')
+        outdir = os.path.join(self.dir, 'out')
+
+        results = []
+        for run in range(2):
+            tracer = TraceCore(libraries=[], verbose=False, cache_dir=cache_dir)
+            tracer.run_filters([WriteDerivations(outdir)], [os.path.join(self.dir, 'in')],
+                               [(WriteDerivations, (outdir,))])
+            results.append(self.read_outputs('out'))
+            shutil.rmtree(outdir)
+
+        self.assertEqual(len(glob(os.path.join(cache_dir, '*', '*'))), 2)
+        self.assertEqual(len(results[0]), 2)
+        self.assertEqual(results[0], results[1])
+
+    def testProfile(self):
+        profile = Profile()
+        counter = CountLeaves()
+        
+        tracer = TraceCore(libraries=[], verbose=False, profile=profile)
+        tracer.run_filters([counter], [os.path.join(self.dir, 'in')], [(CountLeaves, ())])
+        
+        nderivs = len(profile.derivation_seconds)
+        self.assertTrue(nderivs > 0)
+        self.assertEqual(profile.calls[('CountLeaves', 'accept_derivation')], nderivs)
+        self.assertEqual(profile.calls[('CountLeaves', 'output')], 1)
+        self.assertTrue(counter.nleaves > 0)
+
+    def testProfileTimesParsingInReader(self):
+        from munge.io.multi import DirFileGuessReader
+        profile = Profile()
+        bundles = list(profile.timed_reader(DirFileGuessReader(os.path.join(self.dir, 'in'), verbose=False)))
+
+        self.assertTrue(bundles)
+        self.assertTrue(all(bundle._derivation is not None for bundle in bundles))
@@ -13,12 +13,14 @@ import munge
 from itertools import starmap, islice, izip, count
 
 from munge.cats.paths import applications, applications_with_path, applications_per_slash_with_path
+from munge.cats.paths import applications_per_slash, slash_consumers
 from munge.cats.parse import parse_category
-from munge.cats.trace import analyse
+from munge.cats.trace import analyse, analyse_uncached, rule_cache
 
 from munge.util.iter_utils import each_pair
-from munge.trees.traverse import leaves, leaves_reversed
+from munge.trees.traverse import leaves, leaves_reversed, nodes
 from munge.ccg.io import CCGbankReader, Derivation
+from munge.ccg.parse import parse_tree
 
 from munge.trees.traverse import get_leaf
     
@@ -46,6 +48,36 @@ class TraceTests(unittest.TestCase):
                           "(A\\.B)/.(C/.D)", "A\\.B", "C/.D",
                           "(A/.B)/.C", "A/.B"])
     
+    def testRuleCache(self):
+        rule_cache.clear()
+        
+        deriv = load_ccgbank_tree('munge/tests/wsj_0003.auto', 0)
+        for node in nodes(deriv):
+            if node.is_leaf(): continue
+            self.assertEqual(analyse(node.lch.cat, node.rch and node.rch.cat, node.cat),
+                             analyse_uncached(node.lch.cat, node.rch and node.rch.cat, node.cat))
+            
+        nmisses = rule_cache.nmisses
+        self.assertEqual(nmisses, len(rule_cache.rules))
+        
+        # Heads and slash labels do not distinguish productions
+        l, r = parse_category(r'(S\NP)/NP').clone(), parse_category('NP')
+        analyse(l, r, parse_category(r'S\NP'))
+        l.labelled()
+        self.assertEqual(analyse(l, r, parse_category(r'S\NP')), 'fwd_appl')
+        self.assertEqual(rule_cache.nmisses, nmisses + 1)
+        
+        # Features do
+        self.assertEqual(analyse(parse_category('NP'), parse_category('NP[conj]'), parse_category('NP')), 'conjoin')
+        self.assertNotEqual(analyse(parse_category('NP'), parse_category('NP'), parse_category('NP')), 'conjoin')
+        
+        # Nor do aliases, which the rules ignore
+        from munge.cats.headed.parse import parse_category as parse_headed
+        for lrp in ((',', 'NP{Z}~SB', r'(S\NP)\(S\NP)'), (',', 'NP{Z}', r'(S\NP)\(S\NP)')):
+            l, r, p = map(parse_headed, lrp)
+            self.assertEqual(analyse(l, r, p), 'appositive_comma_absorb')
+            self.assertEqual(analyse_uncached(l, r, p), 'appositive_comma_absorb')
+        
     def build_seq(self, iterable):
         for (l, r, was_flipped) in iterable:
             yield (parse_category(l), r and parse_category(r), was_flipped)
@@ -207,6 +239,25 @@ class TraceTests(unittest.TestCase):
         self.assert_is_unary_conversion("S/NP", "NP\\NP", "lex_typechange")
 
     
+    def testSlashConsumers(self):
+        tree = load_ccgbank_tree("munge/tests/wsj_0087.auto", 7)
+        
+        consumers = slash_consumers(tree)
+        self.assertEqual([ applications_per_slash(leaf) for leaf in leaves(tree) ], consumers)
+        self.assertEqual([ leaf.cat.slash_count() for leaf in leaves(tree) ], map(len, consumers))
+        self.assert_(any(any(rules) for rules in consumers))
+        
+        # The bottom-up pass agrees with walking the path from each leaf
+        trees = [ bundle.derivation for fn in ("munge/tests/wsj_0003.auto", "munge/tests/wsj_0087.auto")
+                                    for bundle in CCGbankReader(fn) ]
+        # type-raising, and composition with the focus on either side
+        trees.append(parse_tree(r'(<T S[dcl] 0 2> (<T S[dcl]/NP 0 2> (<T S/(S\NP) 0 1> (<L NP NNP NNP John NP>) ) '
+                                r'(<T (S[dcl]\NP)/NP 0 2> (<L (S[dcl]\NP)/(S[b]\NP) MD MD will x>) '
+                                r'(<L (S[b]\NP)/NP VB VB like x>) ) ) (<L NP NNP NNP Mary NP>) )'))
+        for tree in trees:
+            self.assertEqual([ applications_per_slash(leaf) for leaf in leaves(tree) ], slash_consumers(tree))
+        self.assertEqual(slash_consumers(trees[-1]), [[], ['fwd_comp', None, None], ['fwd_comp', None], []])
+        
     def test_by_slash(self):
         catseq = self.build_seq([ ["S\\NP", "(S\\NP)\\(S\\NP)", True],
                              ["NP", "S\\NP", True],
@@ -15,6 +15,7 @@ from munge.util.err_utils import *
 from munge.util.list_utils import *
 from munge.util.parse_utils import *
 from munge.util.dict_utils import *
+from munge.util.intern_utils import InternTable
 
 class UtilTests(unittest.TestCase):
     def testCompose(self):
@@ -93,3 +94,14 @@ class UtilTests(unittest.TestCase):
     def testTake(self):
         l = xrange(int(1e9))
         self.assertEquals(list(take(10, l)), range(10))
+
+    def testInternTable(self):
+        table = InternTable()
+        a, b = ''.join(['NP-SBJ-', 'intern-test']), ''.join(['NP-SBJ', '-intern-test'])
+        
+        self.assertTrue(table(a) is table(b))
+        self.assertEquals(table.nrequests, 2)
+        self.assertEquals(table.nshared, 1)
+        self.assertTrue(table.bytes_saved > 0)
+        
+        self.assertEquals(table(u'NP'), u'NP')
@@ -0,0 +1,158 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''Interval numbering of the nodes of a tree. Each node is given its pre-order number, and the
+pre-order number of its last descendant, so that the descendants of a node are exactly the nodes
+numbered between the two. Whether one node dominates another is then a pair of integer comparisons,
+and the nodes under a node with a given category are a slice of the sorted list of nodes with that
+category. The leaves are also numbered from left to right, and each node records the span of leaves
+under it, so that the position of a leaf, the leaf at a position, and the leaves under a node are each
+found without enumerating the leaves of the tree.
+
+The numbering is built on first use, and describes the tree as it was then: a caller which mutates the
+tree (or a category in it) must invalidate() the index (munge.proc.tgrep.tgrep.tgrep does so whenever it
+yields a match). Since a tree is renumbered after every match, a caller which can answer a question by
+walking the tree should do so and charge() the index for the nodes it walked, building the index only
+once the walks since it was invalidated have cost as much as building it would (see worth_building).
+
+Rendering categories dominates the cost of building the index, so the index also memoises the string of
+each category it sees (see cat_string), which callers matching against category strings can share.'''
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+class TreeIndex(object):
+    '''Lazily numbers the nodes of the tree rooted at _root_.'''
+    # Counting the nodes of a tree costs as much as numbering them, so until the index is first built,
+    # the tree is assumed to be about twice the size of a typical derivation
+    default_size = 100
+    
+    def __init__(self, root):
+        self.root = root
+        # the number of nodes in the tree when the index was last built
+        self.size = None
+        self.invalidate()
+
+    def invalidate(self):
+        '''Discards the numbering, so that it is rebuilt on the next request.'''
+        self.valid = False
+        # id(category) -> (category, str(category))
+        self.cat_strings = {}
+        # str(cat) -> sorted pre-order numbers of the nodes with that category
+        self.cats = None
+        # the number of nodes walked by callers since the numbering was discarded
+        self.walked = 0
+        
+    def charge(self, nwalked):
+        '''Records that a caller answered a question by walking _nwalked_ nodes instead of using the
+index.'''
+        self.walked += nwalked
+        
+    def worth_building(self):
+        '''Returns whether the index is built, or has been charged for at least as many nodes as the tree
+had when it was last built (or _default_size_ nodes, before it is first built).'''
+        if self.valid: return True
+        return self.walked >= (self.size or self.default_size)
+
+    def build(self):
+        # nodes in pre-order, and the pre-order number of the last descendant of each node
+        self.nodes, self.last = [], []
+        # id(node) -> pre-order number
+        self.pre = {}
+        # leaves from left to right, and the span of leaves under each node as a half-open interval
+        self.leaves, self.first_leaf, self.end_leaf = [], [], []
+
+        self.number_node(self.root)
+        self.size = len(self.nodes)
+        self.valid = True
+
+    def number_node(self, node):
+        i = len(self.nodes)
+        self.pre[id(node)] = i
+        self.nodes.append(node)
+        self.last.append(i)
+        self.first_leaf.append(len(self.leaves))
+        self.end_leaf.append(len(self.leaves))
+
+        if node.is_leaf():
+            self.leaves.append(node)
+        else:
+            for kid in node:
+                self.number_node(kid)
+            self.last[i] = len(self.nodes) - 1
+        self.end_leaf[i] = len(self.leaves)
+
+    def number(self, node):
+        '''Returns the pre-order number of _node_, or None if _node_ is not in the tree (for instance,
+if it is a weakref proxy to a node rather than the node itself).'''
+        if not self.valid: self.build()
+        return self.pre.get(id(node), None)
+
+    def dominates(self, i, j):
+        '''Returns whether the node numbered _i_ properly dominates the node numbered _j_.'''
+        return i < j <= self.last[i]
+
+    def leaf_index(self, leaf):
+        '''Returns the position of _leaf_ among the leaves of the tree, counting from 0 at the left, or
+None if _leaf_ is not a leaf of the tree.'''
+        i = self.number(leaf)
+        if i is None or not leaf.is_leaf(): return None
+        return self.first_leaf[i]
+
+    def leaf(self, index):
+        '''Returns the leaf at position _index_, or None if there is no such leaf.'''
+        if not self.valid: self.build()
+        if 0 <= index < len(self.leaves): return self.leaves[index]
+        return None
+
+    def span(self, node):
+        '''Returns the positions (first, last) of the leftmost and rightmost leaves under _node_, or None
+if _node_ is not in the tree.'''
+        i = self.number(node)
+        if i is None: return None
+        return self.first_leaf[i], self.end_leaf[i] - 1
+
+    def leaves_under(self, node):
+        '''Returns the list of leaves under _node_ from left to right, or None if _node_ is not in the
+tree.'''
+        i = self.number(node)
+        if i is None: return None
+        return self.leaves[self.first_leaf[i]:self.end_leaf[i]]
+
+    def nodes_with_cat(self, cat):
+        '''Returns the sorted pre-order numbers of the nodes whose category is the string _cat_.'''
+        if not self.valid: self.build()
+        if self.cats is None:
+            self.cats = defaultdict(list)
+            for i, node in enumerate(self.nodes):
+                self.cats[self.cat_string(node.cat)].append(i)
+
+        return self.cats.get(cat, ())
+
+    def cat_string(self, cat):
+        '''Returns str(_cat_), rendering each category at most once until the index is invalidated.'''
+        # Plain tags need no rendering
+        if type(cat) is str: return cat
+        # Keeps a reference to _cat_, so that its id is not reused
+        entry = self.cat_strings.get(id(cat), None)
+        if entry is None:
+            entry = self.cat_strings[id(cat)] = (cat, str(cat))
+        return entry[1]
+
+    def descendants_with_cat(self, i, cat):
+        '''Returns, in pre-order, the pre-order numbers of the nodes numbered between _i_ and its last
+descendant inclusive whose category is the string _cat_.'''
+        numbers = self.nodes_with_cat(cat)
+        return numbers[bisect_left(numbers, i):bisect_right(numbers, self.last[i])]
+
+    def ancestors_with_cat(self, i, cat):
+        '''Returns, nearest first, the pre-order numbers of the proper ancestors of the node numbered
+_i_ whose category is the string _cat_.'''
+        numbers = self.nodes_with_cat(cat)
+        return [ j for j in reversed(numbers[:bisect_left(numbers, i)]) if self.last[j] >= i ]
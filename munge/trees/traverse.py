@@ -127,9 +127,17 @@ def text_without_traces(deriv, pred=lambda e: True):
     '''Returns a list of the text under this node, ignoring traces.'''
     return text(deriv, lambda e: pred(e) and not is_ignored(e, ignoring_quotes=False))
     
-def text_in_span(deriv, begin, end):
+def text_in_span(deriv, begin, end, index=None):
     '''Returns a subset of the text under this node, as specified by a pair of indices
-(0 would be the leftmost leaf under this node).'''
+(0 would be the leftmost leaf under this node). If a TreeIndex _index_ of the tree is given, the leaves
+are taken from it.'''
+    if index is not None:
+        leaves_under = index.leaves_under(deriv)
+        if leaves_under is not None:
+            for leaf in leaves_under[begin:end]:
+                yield leaf.lex
+            return
+        
     for cur_index, leaf in enumerate(leaves(deriv)):
         if begin <= cur_index < end:
             yield leaf.lex
@@ -152,14 +160,27 @@ def lrp_repr(node):
         return repr(node)
     
 # Assumes that the second argument is a leaf.
-def get_index_of_leaf(deriv, leaf):
+def get_index_of_leaf(deriv, leaf, index=None):
+    if index is not None:
+        span, leaf_index = index.span(deriv), index.leaf_index(leaf)
+        if span is not None and leaf_index is not None:
+            first, last = span
+            return (leaf_index - first) if first <= leaf_index <= last else None
+        
     for cur_index, candidate_leaf in enumerate(leaves(deriv)):
         if leaf is candidate_leaf: return cur_index
     return None
 
-def get_leaf(derivation, token_index, direction="forwards"):
+def get_leaf(derivation, token_index, direction="forwards", index=None):
     '''Retrieves the nth leaf under this node, either counting from the leftmost or rightmost
-leaf under this node.'''
+leaf under this node. If a TreeIndex _index_ of the tree is given, the leaf is found through it.'''
+    if index is not None:
+        span = index.span(derivation)
+        if span is not None:
+            first, last = span
+            if not 0 <= token_index <= last - first: return None
+            return index.leaf(first + token_index if direction == "forwards" else last - token_index)
+            
     cur_index = 0
 
     if direction == "forwards":
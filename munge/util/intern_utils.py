@@ -0,0 +1,39 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''The parsers pass each tag, lexical item, category atom and feature they read through
+intern_string, so that each distinct string is held once however many nodes refer to it.'''
+
+import sys
+
+class InternTable(object):
+    '''Interns strings, keeping count of how many were found to duplicate one already held, and of
+the memory which sharing the existing copy saved.'''
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nrequests = self.nshared = self.bytes_saved = 0
+
+    def __call__(self, s):
+        # intern only accepts plain strings
+        if type(s) is not str: return s
+
+        self.nrequests += 1
+        canonical = intern(s)
+        if canonical is not s:
+            self.nshared += 1
+            self.bytes_saved += sys.getsizeof(s)
+        return canonical
+
+    def report(self):
+        return "%d of %d strings shared an existing copy, saving %.1f KB." % (
+            self.nshared, self.nrequests, self.bytes_saved / 1024.)
+
+intern_string = InternTable()
@@ -0,0 +1,63 @@
+# Chinese CCGbank conversion
+# ==========================
+# (c) 2008-2012 Daniel Tse <cncandc@gmail.com>
+# University of Sydney
+
+# Use of this software is governed by the attached "Chinese CCGbank converter Licence Agreement"
+# supplied in the Chinese CCGbank conversion distribution. If the LICENCE file is missing, please
+# notify the maintainer Daniel Tse <cncandc@gmail.com>.
+
+'''Times PARG generation (naive_label_derivation then mkdeps) on synthetic sentences which coordinate
+many verb phrases under one subject. Each coordination (X X[conj] -> X) unifies the subject slots of
+its conjuncts, so the subject slots of all N conjuncts end up in one set of unified slots, and the
+sentence yields 2N dependencies: the subject and the object of each verb. Run from the top-level
+directory (which holds config.yml):
+    python scripts/bench_mkdeps.py [NCONJUNCTS ...]'''
+
+import sys, os, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from apps.cn.mkdeps import mkdeps
+from apps.cn.mkmarked import naive_label_derivation
+from munge.ccg.parse import parse_tree
+
+def verb_phrase(i):
+    return (r'(<T S[dcl]\NP 0 2> (<L (S[dcl]\NP)/NP VV VV v%d (S[dcl]\NP)/NP>) '
+            r'(<T NP 0 1> (<L N NN NN n%d N>) ) )' % (i, i))
+
+def coordinated_verb_phrases(i, n):
+    if i == n-1: return verb_phrase(i)
+    return (r'(<T S[dcl]\NP 0 2> %s (<T (S[dcl]\NP)[conj] 1 2> (<L conj CC CC c%d conj>) %s ) )' %
+            (verb_phrase(i), i, coordinated_verb_phrases(i+1, n)))
+
+def coordinated_sentence(n):
+    '''Returns a CCGbank bracketing in which a subject takes _n_ coordinated verb phrases.'''
+    return r'(<T S[dcl] 1 2> (<T NP 0 1> (<L N NR NR subj N>) ) %s )' % coordinated_verb_phrases(0, n)
+
+def time_mkdeps(n, repeats=3):
+    '''Returns the best time over _repeats_ runs of PARG generation for a sentence of _n_ conjuncts,
+and the number of dependencies it generated.'''
+    bracketing = coordinated_sentence(n)
+    best = None
+    for _ in xrange(repeats):
+        start = time.time()
+        deps = mkdeps(naive_label_derivation(parse_tree(bracketing)))
+        elapsed = time.time() - start
+        if best is None or elapsed < best: best = elapsed
+    return best, deps
+
+def subject_dependents(deps):
+    '''Returns the heads which take the subject as an argument in _deps_.'''
+    return set(head for (head, arg, _, _) in deps if arg.startswith('subj'))
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    sizes = map(int, sys.argv[1:]) or [25, 50, 100, 200, 400]
+    print "%12s %12s %12s" % ('conjuncts', 'deps', 'seconds')
+    for n in sizes:
+        seconds, deps = time_mkdeps(n)
+        # every conjunct's verb must receive the subject, or the subject slots were never unified
+        assert len(subject_dependents(deps)) == n, "only %d of %d verbs take the subject" % (
+            len(subject_dependents(deps)), n)
+        assert len(deps) == 2*n
+        print "%12d %12d %12.3f" % (n, len(deps), seconds)